@@ -0,0 +1,6 @@
+"""Performance benchmarks for the Node Nanny application.
+
+Benchmarks are standalone scripts executed as modules from the project root
+(e.g., ``python -m benchmarks.bench_db_indexes``) and print their results
+as JSON.
+"""
@@ -0,0 +1,145 @@
+"""Load test the collector service with many simulated node agents.
+
+Starts a ``CollectorServer`` backed by a temporary SQLite database (or the
+database given by ``--db``) and simulates many nodes, each reporting the
+usage of several users at a fixed interval over its own persistent
+connection. Request latency is measured on the agent side, and the time
+needed to write any reports still queued when the agents stop is reported
+separately. Agents and the server share one interpreter, so results are a
+conservative estimate of a dedicated collector host.
+
+Usage:
+    python -m benchmarks.bench_collector [--nodes 1000] [--users 20] [--interval 5] [--duration 20]
+"""
+
+import json
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from threading import Thread
+from typing import List
+
+from sqlalchemy import func, select
+
+from node_nanny.collector import CollectorAgent, CollectorServer, UsageCollector
+from node_nanny.orm import DBConnection, UsageReport
+
+
+def run_agents(
+        agents: List[CollectorAgent], users: int, interval: float, stop: float,
+        latencies: List[float], failures: List[str]
+) -> None:
+    """Send reports from each agent once per interval until the stop time
+
+    Args:
+        agents: Agents sharing this thread
+        users: Number of users included in each report
+        interval: Seconds between reports from the same agent
+        stop: Monotonic time to stop sending reports
+        latencies: List to append the latency of successful reports to
+        failures: List to append the node name of failed reports to
+    """
+
+    usage = [dict(user=f'user{i}', cpu=12.5, memory=2048, percentage=6.25, processes=4) for i in range(users)]
+
+    # Spread the first report of each agent across the interval
+    start = time.monotonic()
+    next_report = [start + interval * i / len(agents) for i in range(len(agents))]
+    while True:
+        index = min(range(len(agents)), key=next_report.__getitem__)
+        delay = next_report[index] - time.monotonic()
+        if next_report[index] >= stop:
+            break
+
+        if delay > 0:
+            time.sleep(delay)
+
+        sent = time.perf_counter()
+        if agents[index].report(usage):
+            latencies.append(time.perf_counter() - sent)
+
+        else:
+            failures.append(agents[index].node)
+
+        next_report[index] += interval
+
+    for agent in agents:
+        agent.close()
+
+
+def main() -> None:
+    """Run the benchmark and print results as JSON"""
+
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--nodes', type=int, default=1_000, help='number of simulated nodes')
+    parser.add_argument('--users', type=int, default=20, help='number of users in each report')
+    parser.add_argument('--interval', type=float, default=5, help='seconds between reports from each node')
+    parser.add_argument('--duration', type=float, default=20, help='seconds to run the simulation for')
+    parser.add_argument('--threads', type=int, default=32, help='number of threads used to simulate nodes')
+    parser.add_argument('--batch-size', type=int, default=1_000, help='maximum reports written per transaction')
+    parser.add_argument('--db', type=str, default=None, help='database URL (defaults to a temporary SQLite file)')
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as temp_dir:
+        DBConnection.configure(args.db or f'sqlite:///{Path(temp_dir) / "bench.db"}')
+        collector = UsageCollector(batch_size=args.batch_size)
+        server = CollectorServer(('127.0.0.1', 0), collector)
+        collector.start()
+        Thread(target=server.serve_forever, daemon=True).start()
+
+        url = f'http://127.0.0.1:{server.server_port}'
+        agents = [CollectorAgent(url, node=f'node{i}', timeout=30) for i in range(args.nodes)]
+        stop = time.monotonic() + args.duration
+        latencies: List[float] = []
+        failures: List[str] = []
+        threads = [
+            Thread(
+                target=run_agents,
+                args=(agents[i::args.threads], args.users, args.interval, stop, latencies, failures)
+            )
+            for i in range(min(args.threads, args.nodes))
+        ]
+
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        elapsed = time.perf_counter() - started
+        queue_depth = collector.queue_depth()
+        server.shutdown()
+        server.server_close()
+
+        drain_start = time.perf_counter()
+        collector.stop()
+        drain_time = time.perf_counter() - drain_start
+
+        with DBConnection.session() as session:
+            rows = session.execute(select(func.count(UsageReport.id))).scalar()
+
+    metrics = collector.metrics()
+    latencies.sort()
+    print(json.dumps({
+        'nodes': args.nodes,
+        'users_per_report': args.users,
+        'interval_s': args.interval,
+        'offered_reports_per_s': args.nodes / args.interval,
+        'accepted_reports': len(latencies),
+        'failed_reports': len(failures),
+        'rejected_reports': metrics['rejected'],
+        'accepted_reports_per_s': len(latencies) / elapsed,
+        'rows_written': rows,
+        'rows_per_s': rows / (elapsed + drain_time),
+        'batches': metrics['batches'],
+        'queue_depth_at_stop': queue_depth,
+        'drain_s': drain_time,
+        'p50_ms': latencies[len(latencies) // 2] * 1000 if latencies else None,
+        'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000 if latencies else None,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""Benchmark notification and whitelist queries with and without table indexes.
+
+Seeds a temporary SQLite database with notification and whitelist records,
+then times the queries used by the application before and after the
+indexes defined in ``node_nanny.orm`` are created.
+
+Usage:
+    python -m benchmarks.bench_db_indexes [--notifications 1000000] [--users 5000]
+"""
+
+import json
+import random
+import time
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from sqlalchemy import insert, select, text
+
+from node_nanny.orm import DBConnection, Notification, User, Whitelist
+
+
+def seed(num_notifications: int, num_users: int, num_nodes: int = 200) -> None:
+    """Populate the application database with randomized records"""
+
+    start = datetime.now() - timedelta(days=365)
+    rng = random.Random(42)
+
+    with DBConnection.engine.begin() as connection:
+        connection.execute(insert(User), [{'name': f'user{i}'} for i in range(num_users)])
+
+        chunk = 100_000
+        for offset in range(0, num_notifications, chunk):
+            connection.execute(insert(Notification), [
+                dict(
+                    user_id=rng.randint(1, num_users),
+                    time=start + timedelta(seconds=rng.randint(0, 365 * 86400)),
+                    memory=rng.randint(1, 512_000),
+                    percentage=rng.randint(1, 100),
+                    node=f'node{rng.randrange(num_nodes)}',
+                    limit=20
+                ) for _ in range(min(chunk, num_notifications - offset))
+            ])
+
+        # Each user has at most one entry per node, as enforced by the ``ux_whitelist_user_node`` index
+        pairs = rng.sample(range(num_users * num_nodes), min(num_users * 10, num_users * num_nodes))
+        connection.execute(insert(Whitelist), [
+            dict(
+                user_id=pair // num_nodes + 1,
+                node=f'node{pair % num_nodes}',
+                start_time=start,
+                end_time=start + timedelta(days=rng.randint(1, 730)),
+                global_whitelist=False
+            ) for pair in pairs
+        ])
+
+
+def queries() -> dict:
+    """Return the application queries being benchmarked keyed by name"""
+
+    now = datetime.now()
+    history = select(Notification.node, Notification.time, Notification.memory).join(User) \
+        .where(User.name == 'user1') \
+        .order_by(Notification.time.desc())
+
+    whitelist_node = select(User.name, Whitelist.end_time).join(Whitelist) \
+        .where(Whitelist.node == 'node1') \
+        .where(Whitelist.end_time > now)
+
+    whitelist_user = select(Whitelist.id).join(User) \
+        .where(User.name == 'user1') \
+        .where(Whitelist.end_time > now)
+
+    return {'notification_history': history, 'whitelist_node': whitelist_node, 'whitelist_user': whitelist_user}
+
+
+def time_queries(repeat: int) -> dict:
+    """Return the mean latency in milliseconds of each benchmarked query"""
+
+    results = dict()
+    with DBConnection.engine.connect() as connection:
+        for name, query in queries().items():
+            start = time.perf_counter()
+            for _ in range(repeat):
+                connection.execute(query).all()
+
+            results[name] = (time.perf_counter() - start) / repeat * 1000
+
+    return results
+
+
+def query_plans() -> dict:
+    """Return the SQLite query plan of each benchmarked query"""
+
+    plans = dict()
+    with DBConnection.engine.connect() as connection:
+        for name, query in queries().items():
+            compiled = query.compile(DBConnection.engine, compile_kwargs={'literal_binds': True})
+            rows = connection.execute(text(f'EXPLAIN QUERY PLAN {compiled}')).all()
+            plans[name] = [row[-1] for row in rows]
+
+    return plans
+
+
+def main() -> None:
+    """Run the benchmark and print results as JSON"""
+
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notifications', type=int, default=1_000_000, help='number of notification records to seed')
+    parser.add_argument('--users', type=int, default=5_000, help='number of users to seed')
+    parser.add_argument('--repeat', type=int, default=20, help='number of times to execute each query')
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as temp_dir:
+        DBConnection.configure(f'sqlite:///{Path(temp_dir) / "bench.db"}')
+        indexes = [index for table in DBConnection.metadata.sorted_tables for index in table.indexes]
+        for index in indexes:
+            index.drop(DBConnection.engine)
+
+        seed(args.notifications, args.users)
+        before = time_queries(args.repeat)
+        plans_before = query_plans()
+
+        for index in indexes:
+            index.create(DBConnection.engine)
+
+        with DBConnection.engine.begin() as connection:
+            connection.execute(text('ANALYZE'))
+
+        after = time_queries(args.repeat)
+        plans_after = query_plans()
+
+    print(json.dumps({
+        'notifications': args.notifications,
+        'users': args.users,
+        'latency_ms': {'without_indexes': before, 'with_indexes': after},
+        'query_plans': {'without_indexes': plans_before, 'with_indexes': plans_after},
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Benchmark the cold start cost of the command line interface.
+
+Imports each entry point module in a fresh interpreter using
+``python -X importtime`` and reports the cumulative import time along with
+the slowest imported modules. A non-zero exit code is returned when the
+import time of the command line interface exceeds the given budget.
+
+Usage:
+    python -m benchmarks.bench_import_time [--repeat 5] [--budget-ms 100]
+"""
+
+import json
+import statistics
+import subprocess
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+MODULES = ('node_nanny.cli', 'node_nanny.app', 'node_nanny.utils')
+
+
+def import_times(module: str) -> List[Tuple[str, int]]:
+    """Return the cumulative import time in microseconds of every module loaded when importing ``module``"""
+
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=PROJECT_ROOT, check=True, stderr=subprocess.PIPE, universal_newlines=True)
+
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times.append((name.strip(), int(cumulative)))
+
+    return times
+
+
+def profile(module: str, repeat: int) -> Dict:
+    """Return import time statistics for a module over multiple runs"""
+
+    totals = []
+    slowest = []
+    for _ in range(repeat):
+        times = import_times(module)
+        totals.append(dict(times)[module] / 1000)
+        top_level = [(name, cumulative) for name, cumulative in times if '.' not in name]
+        slowest = sorted(top_level, key=lambda item: item[1], reverse=True)[:5]
+
+    return {
+        'median_ms': statistics.median(totals),
+        'min_ms': min(totals),
+        'slowest_top_level_ms': {name: cumulative / 1000 for name, cumulative in slowest},
+    }
+
+
+def main() -> None:
+    """Run the benchmark and print results as JSON"""
+
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='number of fresh interpreters to start per module')
+    parser.add_argument('--budget-ms', type=float, default=100,
+                        help='import time budget for the command line interface')
+    args = parser.parse_args()
+
+    results = {module: profile(module, args.repeat) for module in MODULES}
+    within_budget = results['node_nanny.cli']['median_ms'] <= args.budget_ms
+    print(json.dumps({'budget_ms': args.budget_ms, 'within_budget': within_budget, 'modules': results}, indent=2))
+    sys.exit(0 if within_budget else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Measure the overhead of recording metrics during a scan.
+
+Times the metric operations performed by a single scan (one timer per
+stage plus gauge and counter updates) and compares them to the time taken
+by the usage stage of a scan over a synthetic process table. Rendering the
+exported metrics happens in a background thread and is timed separately.
+
+Usage:
+    python -m benchmarks.bench_metrics [--processes 1000 10000] [--repeat 10000]
+"""
+
+import json
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+from benchmarks.bench_top_k import SyntheticReader
+from node_nanny.metrics import MetricsRegistry
+from node_nanny.utils import SystemUsage
+
+# Stages timed on each scan by ``MonitorUtility.scan`` and ``SystemUsage``
+STAGES = ('snapshot', 'usage', 'history', 'whitelist', 'policy', 'scan')
+
+
+def scan_metrics(registry: MetricsRegistry, repeat: int) -> float:
+    """Return the mean time in seconds spent recording the metrics of one scan"""
+
+    stages = registry.histogram('node_nanny_stage_seconds', 'Stage latency', ('stage',))
+    scans = registry.counter('node_nanny_scans_total', 'Scans')
+    processes = registry.gauge('node_nanny_processes', 'Processes')
+    users = registry.gauge('node_nanny_active_users', 'Users')
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for stage in STAGES:
+            with stages.time(stage=stage):
+                pass
+
+        processes.set(10_000)
+        users.set(10)
+        scans.inc()
+
+    return (time.perf_counter() - start) / repeat
+
+
+def main() -> None:
+    """Run the benchmark and print results as JSON"""
+
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, nargs='+', default=[1_000, 10_000],
+                        help='process table sizes to compare against')
+    parser.add_argument('--repeat', type=int, default=10_000, help='number of simulated scans to record metrics for')
+    args = parser.parse_args()
+
+    registry = MetricsRegistry()
+    per_scan = scan_metrics(registry, args.repeat)
+
+    start = time.perf_counter()
+    registry.render()
+    render = time.perf_counter() - start
+
+    results = []
+    for size in args.processes:
+        SystemUsage.configure()
+        SystemUsage._reader = SyntheticReader(size, max(1, size // 20))
+        SystemUsage.top_users()
+
+        timings = []
+        for _ in range(5):
+            tick_start = time.perf_counter()
+            SystemUsage.top_users()
+            timings.append(time.perf_counter() - tick_start)
+
+        usage_stage = float(np.median(timings))
+        results.append({
+            'processes': size,
+            'usage_stage_ms': usage_stage * 1000,
+            'metrics_per_scan_us': per_scan * 1e6,
+            'overhead_percent': per_scan / usage_stage * 100,
+        })
+
+    SystemUsage.configure()
+    print(json.dumps({'render_ms': render * 1000, 'scans': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Benchmark reading process tables sequentially against reading them with a pool of workers.
+
+Synthetic ``/proc`` directories of increasing size are read by a
+sequential ``ProcReader`` and by readers that shard the process IDs over
+pools of threads and of worker processes. Every configuration is timed in
+several interleaved rounds, and a speedup only counts if it holds in every
+round. For each executor the result reports the smallest table size at
+which some worker count is at least ``--threshold`` times faster than the
+sequential read in all rounds (the crossover point), together with the
+number of workers ``ProcReader`` would choose automatically for each size.
+Pools are created before timing starts, as they are reused between scans.
+
+Synthetic tables are regular files, so the kernel work of generating the
+content of real ``/proc`` files is not included. Use ``--proc-root /proc``
+to measure the process table of the current node instead.
+
+Usage:
+    python -m benchmarks.bench_parallel_collect [--processes 1000 10000 100000] [--workers 2 4 8]
+        [--repeat 5] [--rounds 3] [--threshold 1.2]
+"""
+
+import json
+import statistics
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Dict, List, Optional
+
+from benchmarks.synthetic_proc import generate_proc
+from node_nanny.proc import EXECUTORS, ProcReader, available_cpus
+
+
+def median_ms(reader: ProcReader, repeat: int) -> float:
+    """Return the median time in milliseconds taken by a reader to snapshot its process table"""
+
+    reader.snapshot()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        reader.snapshot()
+        timings.append(time.perf_counter() - start)
+
+    return statistics.median(timings) * 1000
+
+
+def benchmark_table(root: str, workers: List[int], repeat: int, rounds: int) -> Dict[str, object]:
+    """Time sequential and concurrent reads of a single process table
+
+    Configurations are timed in turn within each round, so slow drifts in
+    the speed of the machine affect every configuration alike.
+
+    Args:
+        root: Path of the process table
+        workers: Worker counts to time for each executor
+        repeat: Number of timed repetitions per round
+        rounds: Number of rounds to time every configuration in
+
+    Returns:
+        Median timings in milliseconds keyed by executor and worker count, with the
+        median and minimum speedup over all rounds of the fastest worker count
+    """
+
+    sequential = ProcReader(root)
+    processes = len(sequential.pids())
+    readers = {
+        (executor, count): ProcReader(root, workers=count, executor=executor)
+        for executor in EXECUTORS for count in workers
+    }
+
+    sequential_ms = []
+    timings = {key: [] for key in readers}
+    try:
+        for _ in range(rounds):
+            sequential_ms.append(median_ms(sequential, repeat))
+            for key, reader in readers.items():
+                timings[key].append(median_ms(reader, repeat))
+
+    finally:
+        for reader in readers.values():
+            reader.close()
+
+    result = {
+        'processes': processes,
+        'auto_workers': ProcReader(root, workers=None).worker_count(processes),
+        'sequential_ms': statistics.median(sequential_ms),
+    }
+
+    for executor in EXECUTORS:
+        speedups = {
+            count: [base / ms for base, ms in zip(sequential_ms, timings[executor, count])]
+            for count in workers
+        }
+
+        # Prefer the worker count whose worst round is fastest, rather than one that was fast once
+        best = max(speedups, key=lambda count: min(speedups[count]))
+        result[executor] = {
+            'ms': {count: statistics.median(timings[executor, count]) for count in workers},
+            'best_workers': best,
+            'speedup': statistics.median(speedups[best]),
+            'min_speedup': min(speedups[best]),
+        }
+
+    return result
+
+
+def main(argv: Optional[list] = None) -> None:
+    """Run the benchmark and print results as JSON"""
+
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, nargs='+', default=[1_000, 5_000, 10_000, 50_000, 100_000],
+                        help='synthetic process table sizes to benchmark')
+    parser.add_argument('--processes-per-user', type=int, default=20, help='average number of processes per user')
+    parser.add_argument('--workers', type=int, nargs='+', default=None,
+                        help='worker counts to time (defaults to powers of two up to the number of CPUs)')
+    parser.add_argument('--repeat', type=int, default=5, help='number of timed repetitions of each read per round')
+    parser.add_argument('--rounds', type=int, default=3, help='number of rounds to time every configuration in')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='minimum speedup in every round for a worker count to count as faster')
+    parser.add_argument('--proc-root', type=str, default=None, help='benchmark an existing process table instead')
+    args = parser.parse_args(argv)
+
+    workers = args.workers
+    if workers is None:
+        workers = [2 ** power for power in range(1, max(2, available_cpus()).bit_length())]
+
+    if args.proc_root:
+        results = [benchmark_table(args.proc_root, workers, args.repeat, args.rounds)]
+
+    else:
+        results = []
+        shm = Path('/dev/shm')
+        with TemporaryDirectory(dir=shm if shm.is_dir() else None) as temp_dir:
+            for size in args.processes:
+                root = Path(temp_dir) / f'proc-{size}'
+                generate_proc(root, size, max(1, size // args.processes_per_user))
+                results.append(benchmark_table(str(root), workers, args.repeat, args.rounds))
+
+    crossover = {
+        executor: next(
+            (result['processes'] for result in results if result[executor]['min_speedup'] >= args.threshold), None)
+        for executor in EXECUTORS
+    }
+
+    print(json.dumps(
+        {'cpus': available_cpus(), 'threshold': args.threshold, 'crossover': crossover, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
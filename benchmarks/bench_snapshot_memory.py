@@ -0,0 +1,196 @@
+"""Benchmark the memory used by process snapshots and the allocations made by each scan.
+
+Compares the compact ``ProcessSnapshot`` (fixed width arrays and category
+codes, converted to NumPy without copying) against the previous layout,
+which stored every column as a list of Python objects and built the usage
+``DataFrame`` from those lists. Both variants read the same synthetic
+``/proc`` directory and perform the same work as ``SystemUsage.current_usage``:
+take a snapshot, sample CPU usage, update per user totals, and build a
+``DataFrame`` of every process.
+
+Each variant runs in its own interpreter so the peak resident set size
+of one does not hide the other. Reported per variant are the bytes and
+memory blocks retained by a single snapshot, the peak traced memory of a
+scan, the number of garbage collector runs per scan (a proxy for the
+number of container objects allocated), the scan time, and the peak
+resident set size of the process above its size after imports.
+
+Usage:
+    python -m benchmarks.bench_snapshot_memory [--processes 10000 100000] [--scans 5]
+"""
+
+import gc
+import json
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+from pandas import DataFrame
+
+from benchmarks.synthetic_proc import generate_proc
+from node_nanny.proc import CPUSampler, ProcReader, UserAccumulator
+from node_nanny.utils import SystemUsage
+
+
+class ListSnapshot:
+    """Process snapshot storing each column as a list, as used before the compact layout"""
+
+    columns = ('pid', 'ppid', 'pgrp', 'session', 'uid', 'name', 'status', 'rss', 'ticks', 'start_time')
+
+    def __init__(self, uptime: float = 0, mem_total: int = 0) -> None:
+        self.uptime = uptime
+        self.mem_total = mem_total
+        for column in self.columns:
+            setattr(self, column, [])
+
+    def append(self, record: Tuple) -> None:
+        for column, value in zip(self.columns, record):
+            getattr(self, column).append(value)
+
+    def keys(self) -> Dict[Tuple[int, int], int]:
+        return dict(zip(zip(self.pid, self.start_time), range(len(self.pid))))
+
+    def __len__(self) -> int:
+        return len(self.pid)
+
+
+class ListReader(ProcReader):
+    """Read processes into a ``ListSnapshot``"""
+
+    def snapshot(self, pids=None) -> ListSnapshot:
+        snapshot = ListSnapshot(uptime=self.uptime(), mem_total=self.mem_total())
+        for pid in self.pids() if pids is None else pids:
+            snapshot.append(self.read_process(pid))
+
+        return snapshot
+
+
+def list_scan(reader: ListReader, sampler: CPUSampler, accumulator: UserAccumulator) -> DataFrame:
+    """Return the usage of every process, building the ``DataFrame`` from lists of Python objects"""
+
+    snapshot = reader.snapshot()
+    cpu = list(sampler.sample(snapshot))
+    accumulator.update(snapshot, cpu)
+    usernames = {uid: reader.username(uid) for uid in set(snapshot.uid)}
+    return DataFrame({
+        'USER': [usernames[uid] for uid in snapshot.uid],
+        'PID': snapshot.pid,
+        'PNAME': snapshot.name,
+        'STATUS': snapshot.status,
+        'CPU': np.array(cpu, dtype=float),
+        'MEM': np.array(snapshot.rss, dtype=float) / (snapshot.mem_total or 1) * 100,
+        'RSS': np.array(snapshot.rss, dtype=np.int64),
+    }).set_index(['USER', 'PID'])
+
+
+def traced(function: Callable[[], object]) -> Tuple[object, int, int, int]:
+    """Call a function while tracing allocations
+
+    Returns:
+        The return value, the bytes and memory blocks still allocated afterwards, and the peak bytes allocated
+    """
+
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    result = function()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, sys.getallocatedblocks() - blocks, peak
+
+
+def measure(variant: str, proc_root: str, scans: int) -> Dict[str, float]:
+    """Measure a single variant, returning results keyed by metric"""
+
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if variant == 'compact':
+        SystemUsage.configure(proc_root)
+        reader = SystemUsage._reader
+        scan = SystemUsage.current_usage
+
+    else:
+        reader, sampler, accumulator = ListReader(proc_root), CPUSampler(), UserAccumulator()
+        scan = lambda: list_scan(reader, sampler, accumulator)
+
+    # The first scan fills the username cache and the per user totals
+    scan()
+
+    collections = sum(stats['collections'] for stats in gc.get_stats())
+    start = time.perf_counter()
+    for _ in range(scans):
+        scan()
+
+    scan_ms = (time.perf_counter() - start) / scans * 1000
+    collections = sum(stats['collections'] for stats in gc.get_stats()) - collections
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    snapshot, snapshot_bytes, snapshot_blocks, _ = traced(reader.snapshot)
+    del snapshot
+    _, _, _, scan_peak = traced(scan)
+
+    return {
+        'processes': len(reader.pids()),
+        'snapshot_bytes': snapshot_bytes,
+        'snapshot_blocks': snapshot_blocks,
+        'scan_peak_bytes': scan_peak,
+        'gc_runs_per_scan': collections / scans,
+        'scan_ms': scan_ms,
+        # ``ru_maxrss`` is reported in kilobytes on Linux
+        'max_rss_increase_mb': (max_rss - baseline_rss) / 1024,
+    }
+
+
+def run_variant(variant: str, proc_root: Path, scans: int) -> Dict[str, float]:
+    """Measure a variant in a separate interpreter"""
+
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_snapshot_memory',
+         '--variant', variant, '--proc-root', str(proc_root), '--scans', str(scans)],
+        check=True, stdout=subprocess.PIPE, universal_newlines=True
+    ).stdout
+    return json.loads(output)
+
+
+def main(argv: Optional[list] = None) -> None:
+    """Run the benchmark and print results as JSON"""
+
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, nargs='+', default=[10_000, 100_000],
+                        help='process table sizes to benchmark')
+    parser.add_argument('--processes-per-user', type=int, default=20, help='average number of processes per user')
+    parser.add_argument('--scans', type=int, default=5, help='number of timed scans per variant')
+    parser.add_argument('--variant', choices=('list', 'compact'), default=None, help='measure a single variant')
+    parser.add_argument('--proc-root', type=str, default=None, help='process table to use with --variant')
+    args = parser.parse_args(argv)
+
+    if args.variant:
+        print(json.dumps(measure(args.variant, args.proc_root, args.scans)))
+        return
+
+    results = []
+    shm = Path('/dev/shm')
+    with TemporaryDirectory(dir=shm if shm.is_dir() else None) as temp_dir:
+        for size in args.processes:
+            proc_root = Path(temp_dir) / f'proc-{size}'
+            generate_proc(proc_root, size, max(1, size // args.processes_per_user))
+            lists, compact = (run_variant(variant, proc_root, args.scans) for variant in ('list', 'compact'))
+            results.append({
+                'processes': size,
+                'list': lists,
+                'compact': compact,
+                'snapshot_bytes_ratio': lists['snapshot_bytes'] / compact['snapshot_bytes'],
+                'scan_peak_ratio': lists['scan_peak_bytes'] / compact['scan_peak_bytes'],
+            })
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Benchmark reading system usage and the enforcement path over synthetic process tables.
+
+Generates fake ``/proc`` directories with many users and times each step
+of a scan against them: reading all processes (``current_usage``), per user
+totals, the processes of a single user (``user_usage``), whitelist checks,
+notification writes, and planning the signals needed to kill a user. The
+application database is a temporary SQLite file.
+
+Results are printed as JSON together with the current commit, so runs can
+be compared across commits. Use ``--output`` to append each run to a JSON
+lines file.
+
+Usage:
+    python -m benchmarks.bench_system_usage [--processes 1000 10000 100000] [--repeat 5] [--output results.jsonl]
+"""
+
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import redirect_stdout
+from argparse import ArgumentParser
+from datetime import datetime
+from pathlib import Path
+from socket import gethostname
+from tempfile import TemporaryDirectory
+from typing import Callable, Dict, Optional
+
+from benchmarks.synthetic_proc import generate_proc
+from node_nanny.app import MonitorUtility, WhitelistCache
+from node_nanny.kill import resolve_uid
+from node_nanny.utils import SystemUsage, UserNotifier
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def median_ms(function: Callable[[], object], repeat: int) -> float:
+    """Return the median runtime of a function in milliseconds"""
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    return statistics.median(timings) * 1000
+
+
+def current_commit() -> Optional[str]:
+    """Return the commit of the working tree, if it is a git repository"""
+
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=PROJECT_ROOT, check=True,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True
+        ).stdout.strip()
+
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark_size(processes: int, users: int, repeat: int, temp_dir: Path) -> Dict[str, float]:
+    """Time each step of a scan against a process table of the given size
+
+    Args:
+        processes: Number of processes in the table
+        users: Number of users owning the processes
+        repeat: Number of timed repetitions of each step
+        temp_dir: Directory to write the process table and database to
+
+    Returns:
+        Timings in milliseconds keyed by step
+    """
+
+    proc_root = temp_dir / f'proc-{processes}'
+    start = time.perf_counter()
+    generate_proc(proc_root, processes, users)
+    results = {'processes': processes, 'users': users, 'generate_s': time.perf_counter() - start}
+
+    app = MonitorUtility(f'sqlite:///{temp_dir / f"bench-{processes}.db"}')
+    SystemUsage.configure(str(proc_root))
+
+    start = time.perf_counter()
+    SystemUsage.current_usage()
+    results['current_usage_cold_ms'] = (time.perf_counter() - start) * 1000
+    results['current_usage_ms'] = median_ms(SystemUsage.current_usage, repeat)
+    results['user_totals_ms'] = median_ms(SystemUsage.user_totals, repeat)
+
+    totals = SystemUsage.user_totals()
+    heaviest = totals.RSS.idxmax()
+    results['user_usage_ms'] = median_ms(lambda: SystemUsage.user_usage(heaviest), repeat)
+
+    # One in ten users is whitelisted on this node
+    node = gethostname()
+    names = totals.index.tolist()
+    with redirect_stdout(sys.stderr):
+        app.add(names[::10], node=node)
+
+    whitelist = WhitelistCache(node)
+    results['whitelist_reload_ms'] = median_ms(whitelist.reload, repeat)
+    results['whitelist_check_ms'] = median_ms(lambda: [name for name in names if name not in whitelist], repeat)
+
+    notified = {name: SystemUsage.user_usage(name, refresh=False) for name in names[:10]}
+    results['notify_10_users_ms'] = median_ms(lambda: UserNotifier.notify_all(node, notified, 20), repeat)
+
+    killer = SystemUsage.killer()
+    uid = resolve_uid(heaviest)
+    results['kill_plan_ms'] = median_ms(lambda: killer.plan(uid), repeat)
+    results['kill_plan_targets'] = killer.plan(uid).targets
+    return results
+
+
+def main() -> None:
+    """Run the benchmark and print results as JSON"""
+
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, nargs='+', default=[1_000, 10_000, 100_000],
+                        help='process table sizes to benchmark')
+    parser.add_argument('--processes-per-user', type=int, default=20, help='average number of processes per user')
+    parser.add_argument('--repeat', type=int, default=5, help='number of timed repetitions of each step')
+    parser.add_argument('--output', type=str, default=None, help='append results to this JSON lines file')
+    args = parser.parse_args()
+
+    # Memory backed storage keeps file system overhead out of the results where available
+    shm = Path('/dev/shm')
+    with TemporaryDirectory(dir=shm if shm.is_dir() else None) as temp_dir:
+        results = [
+            benchmark_size(size, max(1, size // args.processes_per_user), args.repeat, Path(temp_dir))
+            for size in args.processes
+        ]
+
+    SystemUsage.configure()
+    run = {
+        'commit': current_commit(),
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'a') as outfile:
+            outfile.write(json.dumps(run) + '\n')
+
+    print(json.dumps(run, indent=2))
+
+
+if __name__ == '__main__':
+    main()
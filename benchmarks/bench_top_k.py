@@ -0,0 +1,144 @@
+"""Benchmark selecting the heaviest users and processes against full sorts.
+
+Builds a synthetic process table and times a single scan tick using two
+approaches. The baseline builds a ``DataFrame`` of every process, groups
+and sorts it with ``groupby().sum().sort_values()``, and sorts the
+processes of each selected user. The alternative uses
+``SystemUsage.top_users`` and ``SystemUsage.top_processes``, which rank
+incrementally maintained per user totals by partial selection and only
+convert the selected processes into a ``DataFrame``. A small fraction of
+processes change memory usage between ticks, and both approaches include
+the cost of taking the snapshot, which is also reported on its own.
+
+Usage:
+    python -m benchmarks.bench_top_k [--processes 1000 10000 100000] [--users-per-process 0.05] [--top 10]
+"""
+
+import json
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+from node_nanny.proc import ProcReader, ProcessSnapshot
+from node_nanny.utils import SystemUsage
+
+
+class SyntheticReader(ProcReader):
+    """Return randomized process snapshots instead of reading ``/proc``"""
+
+    def __init__(self, processes: int, users: int, churn: float = 0.01, seed: int = 42) -> None:
+        """Generate a process table of the given size
+
+        Args:
+            processes: Number of processes in each snapshot
+            users: Number of distinct users owning the processes
+            churn: Fraction of processes whose memory usage changes between snapshots
+            seed: Seed for the random number generator
+        """
+
+        super().__init__()
+        self._rng = np.random.default_rng(seed)
+        self._processes = processes
+        self._churn = churn
+        self._uid = (1000 + self._rng.integers(0, users, processes)).tolist()
+        self._rss = (self._rng.lognormal(17, 2, processes).astype(np.int64)).tolist()
+
+    def username(self, uid: int) -> str:
+        return f'user{uid}'
+
+    def snapshot(self, pids=None) -> ProcessSnapshot:
+        for row in self._rng.integers(0, self._processes, int(self._processes * self._churn)).tolist():
+            self._rss[row] += 4096
+
+        pids = range(1, self._processes + 1)
+        snapshot = ProcessSnapshot.from_columns(
+            uptime=1_000_000,
+            mem_total=sum(self._rss),
+            pid=pids,
+            ppid=[1] * self._processes,
+            pgrp=pids,
+            session=pids,
+            uid=self._uid,
+            name=['python'] * self._processes,
+            status=['sleeping'] * self._processes,
+            rss=self._rss,
+            ticks=[0] * self._processes,
+            start_time=pids
+        )
+        return snapshot
+
+
+def full_sort(top: int, processes: int) -> list:
+    """Rank users and their processes by sorting every row"""
+
+    SystemUsage._refresh()
+    frame = SystemUsage._usage_frame()
+    users = frame[['CPU', 'MEM', 'RSS']].groupby(level='USER').sum().sort_values('RSS', ascending=False).head(top)
+    return [frame.loc[user].sort_values('RSS', ascending=False).head(processes) for user in users.index]
+
+
+def partial_selection(top: int, processes: int) -> list:
+    """Rank users and their processes by partial selection"""
+
+    users = SystemUsage.top_users(top)
+    selected = SystemUsage.top_processes(users.index, processes)
+    return [selected.loc[user] for user in users.index]
+
+
+def time_tick(function, top: int, processes: int, repeat: int) -> float:
+    """Return the median runtime of a function in milliseconds"""
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(top, processes)
+        timings.append(time.perf_counter() - start)
+
+    return float(np.median(timings)) * 1000
+
+
+def main() -> None:
+    """Run the benchmark and print results as JSON"""
+
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, nargs='+', default=[1_000, 10_000, 100_000],
+                        help='process table sizes to benchmark')
+    parser.add_argument('--users-per-process', type=float, default=0.05, help='ratio of users to processes')
+    parser.add_argument('--top', type=int, default=10, help='number of users to select')
+    parser.add_argument('--top-processes', type=int, default=5, help='number of processes to select per user')
+    parser.add_argument('--churn', type=float, default=0.01, help='fraction of processes changing between ticks')
+    parser.add_argument('--repeat', type=int, default=7, help='number of timed ticks per approach')
+    args = parser.parse_args()
+
+    results = []
+    for size in args.processes:
+        SystemUsage.configure()
+        SystemUsage._reader = SyntheticReader(size, max(1, int(size * args.users_per_process)), args.churn)
+
+        # Prime CPU sampling and per user totals so both approaches time steady state ticks
+        SystemUsage.user_totals()
+        refresh_ms = time_tick(lambda top, processes: SystemUsage._refresh(), args.top, args.top_processes, args.repeat)
+        full_ms = time_tick(full_sort, args.top, args.top_processes, args.repeat)
+        partial_ms = time_tick(partial_selection, args.top, args.top_processes, args.repeat)
+
+        # Both approaches must agree on the selected processes when usage is unchanged
+        SystemUsage._reader._churn = 0
+        expected = [frame.RSS.sum() for frame in full_sort(args.top, args.top_processes)]
+        selected = partial_selection(args.top, args.top_processes)
+        results.append({
+            'processes': size,
+            'snapshot_refresh_ms': refresh_ms,
+            'full_sort_ms': full_ms,
+            'partial_selection_ms': partial_ms,
+            'speedup': full_ms / partial_ms,
+            'selection_speedup': (full_ms - refresh_ms) / max(partial_ms - refresh_ms, 1e-6),
+            'same_top_processes': expected == [frame.RSS.sum() for frame in selected],
+        })
+
+    SystemUsage.configure()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark whitelisting users with ``MonitorUtility.add``.
+
+Seeds a temporary SQLite database with thousands of active whitelist
+entries, then times a mix of calls that create new entries and extend
+existing ones. The number of rows per user and node is verified afterwards
+so regressions in correctness are reported alongside regressions in speed.
+
+Usage:
+    python -m benchmarks.bench_whitelist_add [--users 2000] [--nodes 20] [--calls 1000]
+"""
+
+import json
+import random
+import time
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from sqlalchemy import func, select
+
+from node_nanny.app import MonitorUtility, upsert_whitelists
+from node_nanny.orm import DBConnection, Whitelist, upsert_users
+
+
+def main() -> None:
+    """Run the benchmark and print results as JSON"""
+
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2_000, help='number of users to seed')
+    parser.add_argument('--nodes', type=int, default=20, help='number of nodes each user is whitelisted on')
+    parser.add_argument('--calls', type=int, default=1_000, help='number of calls to time')
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as temp_dir:
+        app = MonitorUtility(f'sqlite:///{Path(temp_dir) / "bench.db"}')
+
+        # Seed the database directly so seeding time is not included in the results
+        now = datetime.now()
+        users = [f'user{i}' for i in range(args.users)]
+        with DBConnection.session() as session:
+            upsert_users(session, users)
+            upsert_whitelists(session, [
+                dict(
+                    name=user, node=f'node{n}', global_whitelist=False,
+                    start_time=now, end_time=now + timedelta(days=1)
+                )
+                for user in users for n in range(args.nodes)
+            ])
+            session.commit()
+
+        rng = random.Random(42)
+        latencies = []
+        for _ in range(args.calls):
+            # Half of the calls extend an existing entry and half create a new one
+            user = rng.choice(users)
+            node = f'node{rng.randrange(args.nodes * 2)}'
+            start = time.perf_counter()
+            app.add(user, node=node, duration=timedelta(days=2))
+            latencies.append(time.perf_counter() - start)
+
+        with DBConnection.session() as session:
+            max_per_key = session.execute(
+                select(func.count(Whitelist.id)).group_by(Whitelist.user_id, Whitelist.node)
+                .order_by(func.count(Whitelist.id).desc()).limit(1)
+            ).scalar()
+            total_rows = session.execute(select(func.count(Whitelist.id))).scalar()
+
+    latencies.sort()
+    print(json.dumps({
+        'seeded_entries': args.users * args.nodes,
+        'calls': args.calls,
+        'total_rows': total_rows,
+        'max_rows_per_user_node': max_per_key,
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Generate synthetic ``/proc`` directories for benchmarks.
+
+Process tables are written in the same format as the fake directories used
+by the test suite, so benchmarks exercise the same parsing code that reads
+the real ``/proc`` filesystem.
+"""
+
+import random
+from pathlib import Path
+from typing import List
+
+from tests.fake_proc import write_process, write_system
+
+# User IDs are chosen above the range normally assigned to accounts
+FIRST_UID = 900_000
+
+
+def generate_proc(root: Path, processes: int, users: int, seed: int = 42) -> List[int]:
+    """Write a fake proc directory with randomized processes spread across many users
+
+    Memory usage follows a heavy tailed distribution so a few users dominate,
+    and processes of each user are arranged into small process trees.
+
+    Args:
+        root: Directory to write the process table to
+        processes: Number of processes to create
+        users: Number of distinct users owning the processes
+        seed: Seed for the random number generator
+
+    Returns:
+        The user IDs owning the processes
+    """
+
+    rng = random.Random(seed)
+    uids = [FIRST_UID + i for i in range(users)]
+    write_system(root, mem_total=1024 ** 4, uptime=1_000_000)
+
+    last_pid = {}
+    for pid in range(2, processes + 2):
+        uid = rng.choice(uids)
+        parent = last_pid.get(uid) if rng.random() < 0.7 else None
+        write_process(
+            root, pid,
+            uid=uid,
+            name=rng.choice(('python', 'bash', 'R', 'matlab', 'java')),
+            rss=int(rng.lognormvariate(17, 2)) // 4096 * 4096,
+            utime=rng.randrange(100_000),
+            stime=rng.randrange(10_000),
+            start_time=rng.randrange(1_000_000),
+            ppid=parent or 1,
+            pgrp=parent or pid,
+            session=parent or pid
+        )
+        last_pid[uid] = pid
+
+    return uids
@@ -0,0 +1,164 @@
+"""The ``accounts`` module resolves user IDs and usernames through a shared cache.
+
+Each lookup through ``pwd`` goes through the system name service, which
+may query a remote directory such as LDAP or SSSD. Lookups are cached
+process wide so repeated scans reuse earlier results. Cached entries
+expire after a configurable time so account changes are eventually
+picked up, and failed lookups are cached separately (usually for a
+shorter time) so unknown IDs do not trigger a directory query on every
+scan.
+"""
+
+import pwd
+import time
+from typing import Dict, Optional, Tuple
+
+# Marks a lookup that found no matching account
+_MISSING = None
+
+
+class UserCache:
+    """Process wide cache of user account lookups
+
+    Following the convention used by ``psutil``, IDs without a matching
+    account resolve to the ID itself as a string.
+    """
+
+    ttl: float = 3600
+    negative_ttl: float = 300
+    hits: int = 0
+    misses: int = 0
+    negative_hits: int = 0
+    preloaded: int = 0
+    _names: Dict[int, Tuple[Optional[str], float]] = dict()
+    _uids: Dict[str, Tuple[Optional[int], float]] = dict()
+
+    @classmethod
+    def configure(cls, ttl: float = 3600, negative_ttl: float = 300, preload: bool = False) -> None:
+        """Clear the cache and update how long lookups are cached for
+
+        Changes made here will affect the entire running application
+
+        Args:
+            ttl: Seconds to cache successful lookups for
+            negative_ttl: Seconds to cache lookups that found no matching account
+            preload: Load every account returned by ``pwd.getpwall`` up front
+        """
+
+        cls.ttl = ttl
+        cls.negative_ttl = negative_ttl
+        cls.hits = cls.misses = cls.negative_hits = cls.preloaded = 0
+        cls._names = dict()
+        cls._uids = dict()
+        if preload:
+            cls.preload()
+
+    @classmethod
+    def preload(cls) -> int:
+        """Cache every account known to the system in a single bulk request
+
+        Directory backed name services may be configured not to enumerate
+        accounts, in which case only local accounts are loaded and any
+        others are still resolved individually on first use.
+
+        Returns:
+            The number of accounts loaded
+        """
+
+        expires = time.monotonic() + cls.ttl
+        entries = pwd.getpwall()
+        for entry in entries:
+            cls._names[entry.pw_uid] = (entry.pw_name, expires)
+            cls._uids[entry.pw_name] = (entry.pw_uid, expires)
+
+        cls.preloaded += len(entries)
+        return len(entries)
+
+    @classmethod
+    def _store(cls, cache: dict, key, value) -> None:
+        """Cache the result of a lookup using the expiry time for its outcome"""
+
+        ttl = cls.negative_ttl if value is _MISSING else cls.ttl
+        cache[key] = (value, time.monotonic() + ttl)
+
+    @classmethod
+    def _cached(cls, cache: dict, key) -> Tuple[bool, Optional[object]]:
+        """Return whether a key has an unexpired entry and the cached value"""
+
+        entry = cache.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            cls.misses += 1
+            return False, None
+
+        cls.hits += 1
+        if entry[0] is _MISSING:
+            cls.negative_hits += 1
+
+        return True, entry[0]
+
+    @classmethod
+    def username(cls, uid: int) -> str:
+        """Return the username for a given user ID
+
+        Args:
+            uid: The user ID to resolve
+
+        Returns:
+            The corresponding username, or the ID as a string if there is no matching account
+        """
+
+        found, name = cls._cached(cls._names, uid)
+        if not found:
+            try:
+                entry = pwd.getpwuid(uid)
+                name = entry.pw_name
+                cls._store(cls._uids, name, uid)
+
+            except KeyError:
+                name = _MISSING
+
+            cls._store(cls._names, uid, name)
+
+        return str(uid) if name is _MISSING else name
+
+    @classmethod
+    def uid(cls, username: str) -> Optional[int]:
+        """Return the user ID for a given username
+
+        Args:
+            username: The name of the user
+
+        Returns:
+            The corresponding user ID, or ``None`` if there is no matching account
+        """
+
+        found, uid = cls._cached(cls._uids, username)
+        if not found:
+            try:
+                uid = pwd.getpwnam(username).pw_uid
+                cls._store(cls._names, uid, username)
+
+            except KeyError:
+                uid = _MISSING
+
+            cls._store(cls._uids, username, uid)
+
+        return uid
+
+    @classmethod
+    def stats(cls) -> Dict[str, int]:
+        """Return counters describing how effective the cache is
+
+        Returns:
+            A dictionary with the number of cache hits (including hits on
+            failed lookups), misses, hits on failed lookups, preloaded
+            accounts, and cached entries
+        """
+
+        return dict(
+            hits=cls.hits,
+            misses=cls.misses,
+            negative_hits=cls.negative_hits,
+            preloaded=cls.preloaded,
+            entries=len(cls._names) + len(cls._uids)
+        )
@@ -1,21 +1,264 @@
 """The ``app`` module defines the core application logic."""
 
-import os
-import signal
+import heapq
+import logging
+import sys
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional
+from socket import gethostname
+from typing import TYPE_CHECKING, Callable, Collection, Dict, Iterable, List, Optional, Tuple, Type, Union
 
-import pandas as pd
-from sqlalchemy import select
+from sqlalchemy import bindparam, case, insert, or_, select, update
+from sqlalchemy.orm import Session
 
-from .orm import User, Whitelist, DBConnection
-from .utils import SystemUsage
+from .metrics import REGISTRY, STAGE_SECONDS, MetricsExporter
+from .orm import Revision, User, Whitelist, DBConnection, upsert_construct, upsert_users
+from .outbox import OutboxSender
+from .report import RowRenderer, notification_query, whitelist_query
+
+# The utils module depends on pandas and is only imported by commands that inspect system usage
+if TYPE_CHECKING:  # pragma: no cover
+    from pandas import DataFrame
+
+    from .collector import CollectorAgent
+    from .kill import KillResult
+    from .proc import ProcessSnapshot
+    from .utils import SystemUsage
+
+logger = logging.getLogger(__name__)
+
+SCANS = REGISTRY.counter('node_nanny_scans_total', 'Number of completed scans')
+SCAN_ERRORS = REGISTRY.counter('node_nanny_scan_errors_total', 'Number of scans that failed with an error')
+USERS_ACTIVE = REGISTRY.gauge('node_nanny_active_users', 'Number of users above the minimum memory usage')
+KILLS = REGISTRY.counter('node_nanny_kills_total', 'Number of users whose processes were terminated', ('method',))
+KILLED_PROCESSES = REGISTRY.counter('node_nanny_killed_processes_total', 'Number of processes terminated')
+PRESSURE_WAKEUPS = REGISTRY.counter(
+    'node_nanny_pressure_wakeups_total', 'Number of idle waits ended early by memory pressure')
+KILL_SECONDS = REGISTRY.histogram(
+    'node_nanny_kill_seconds', 'Time from the start of a kill until no processes remained in seconds')
+
+
+class PollScheduler:
+    """Determine how long to wait between consecutive system scans
+
+    Scans are repeated at the minimum interval while the system is active
+    and the interval grows geometrically, up to a maximum, while it is idle.
+    """
+
+    def __init__(self, min_interval: float = 1, max_interval: float = 60, backoff: float = 2) -> None:
+        """Configure the polling intervals
+
+        Args:
+            min_interval: Seconds to wait between scans while the system is active
+            max_interval: Maximum seconds to wait between scans while the system is idle
+            backoff: Factor to increase the interval by after each idle scan
+        """
+
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.interval = min_interval
+
+    def update(self, active: bool) -> float:
+        """Update and return the polling interval using the result of the latest scan
+
+        Args:
+            active: Whether the latest scan found any users near the memory limit
+
+        Returns:
+            The number of seconds to wait before the next scan
+        """
+
+        if active:
+            self.interval = self.min_interval
+
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+
+        return self.interval
+
+
+def bump_revision(session: Session, name: str) -> None:
+    """Increment the revision counter for the given data within an open session
+
+    Args:
+        session: The database session to execute within
+        name: Name of the revision counter
+    """
+
+    result = session.execute(update(Revision).where(Revision.name == name).values(value=Revision.value + 1))
+    if not result.rowcount:
+        session.execute(insert(Revision).values(name=name, value=1))
+
+
+def upsert_whitelists(session: Session, records: List[dict]) -> None:
+    """Create or update whitelist records
+
+    Each user has at most one global whitelist entry and one entry per
+    node. Existing entries are updated to use the new end time. The
+    start time of an existing entry is only replaced if the entry had
+    already expired. User records must exist before calling this function.
+
+    Args:
+        session: The database session to execute within
+        records: Dictionaries with the keys ``name``, ``node``, ``global_whitelist``,
+            ``start_time``, and ``end_time``
+    """
+
+    user_id = select(User.id).where(User.name == bindparam('name')).scalar_subquery()
+    upsert = upsert_construct(session)
+    if upsert is None:
+        _update_whitelists(session, records)
+        return
+
+    for is_global in (False, True):
+        subset = [record for record in records if record['global_whitelist'] == is_global]
+        if not subset:
+            continue
+
+        statement = upsert(Whitelist).values(user_id=user_id)
+        statement = statement.on_conflict_do_update(
+            index_elements=[Whitelist.user_id] if is_global else [Whitelist.user_id, Whitelist.node],
+            index_where=Whitelist.global_whitelist.is_(is_global),
+            set_={
+                'start_time': case(
+                    (Whitelist.end_time > statement.excluded.start_time, Whitelist.start_time),
+                    else_=statement.excluded.start_time),
+                'end_time': statement.excluded.end_time
+            })
+
+        session.execute(statement, subset)
+
+
+def _update_whitelists(session: Session, records: List[dict]) -> None:
+    """Create or update whitelist records on databases without ``ON CONFLICT`` support
+
+    See the ``upsert_whitelists`` function for a description of arguments.
+    """
+
+    for record in records:
+        query = select(Whitelist).join(User) \
+            .where(User.name == record['name']) \
+            .where(Whitelist.global_whitelist.is_(record['global_whitelist']))
+
+        if not record['global_whitelist']:
+            query = query.where(Whitelist.node == record['node'])
+
+        whitelist_record = session.execute(query).scalars().first()
+        if whitelist_record is None:
+            user_record = session.execute(select(User).where(User.name == record['name'])).scalars().one()
+            whitelist_record = Whitelist(
+                user=user_record,
+                node=record['node'],
+                global_whitelist=record['global_whitelist'],
+                start_time=record['start_time'])
+
+        elif whitelist_record.end_time <= record['start_time']:
+            whitelist_record.start_time = record['start_time']
+
+        whitelist_record.end_time = record['end_time']
+        session.add(whitelist_record)
+
+
+class WhitelistCache:
+    """In memory index of the users currently whitelisted on a single node
+
+    Entries are reloaded from the database only when the ``whitelist``
+    revision counter changes. Expired entries are removed in order of
+    their end time without querying the database.
+    """
+
+    def __init__(self, node: str) -> None:
+        """Cache whitelist entries for the given node
+
+        Args:
+            node: The name of the node
+        """
+
+        self.node = node
+        self._revision: Optional[int] = None
+        self._end_times: Dict[str, datetime] = dict()
+        self._expiry: List[Tuple[datetime, str]] = []
+
+    def refresh(self) -> bool:
+        """Reload whitelist entries if the whitelist has changed since the last load
+
+        Returns:
+            Whether the entries were reloaded
+        """
+
+        with DBConnection.session() as session:
+            revision = session.execute(select(Revision.value).where(Revision.name == 'whitelist')).scalar()
+
+        if self._revision is not None and revision == self._revision:
+            return False
+
+        self.reload()
+        return True
+
+    def reload(self) -> None:
+        """Load all whitelist entries currently active on the node"""
+
+        now = datetime.now()
+        query = select(User.name, Whitelist.end_time).join(Whitelist) \
+            .where(or_(Whitelist.global_whitelist, Whitelist.node == self.node)) \
+            .where(Whitelist.start_time <= now) \
+            .where(Whitelist.end_time > now)
+
+        with DBConnection.session() as session:
+            self._revision = session.execute(select(Revision.value).where(Revision.name == 'whitelist')).scalar()
+            records = session.execute(query).all()
+
+        # Users with multiple active entries are whitelisted until the latest end time
+        end_times = dict()
+        for user, end_time in records:
+            end_times[user] = max(end_time, end_times.get(user, end_time))
+
+        self._end_times = end_times
+        self._expiry = [(end_time, user) for user, end_time in end_times.items()]
+        heapq.heapify(self._expiry)
+
+    def _expire(self, now: datetime) -> None:
+        """Remove entries that have expired by the given time"""
+
+        while self._expiry and self._expiry[0][0] <= now:
+            end_time, user = heapq.heappop(self._expiry)
+            if self._end_times.get(user) == end_time:
+                del self._end_times[user]
+
+    def __contains__(self, user: str) -> bool:
+        self._expire(datetime.now())
+        return user in self._end_times
+
+    def __len__(self) -> int:
+        self._expire(datetime.now())
+        return len(self._end_times)
 
 
 class MonitorUtility:
     """Monitor system resource usage and manage currently running processes"""
 
+    # Users whose processes are never terminated by a scan
+    protected_users = ('root',)
+
+    # Available sources of system usage information mapped to class names in the ``utils`` module
+    usage_sources = {'proc': 'SystemUsage', 'cgroup': 'CgroupUsage'}
+
+    @classmethod
+    def _usage_source(cls, source: str) -> Type['SystemUsage']:
+        """Return the class used to read system usage from the given source
+
+        Args:
+            source: Name of the source to read usage information from (see ``usage_sources``)
+
+        Returns:
+            ``SystemUsage`` or a subclass with the same interface
+        """
+
+        from . import utils
+        return getattr(utils, cls.usage_sources[source])
+
     def __init__(self, url: Optional[str] = None) -> None:
         """Configure the parent application
 
@@ -24,6 +267,7 @@ class MonitorUtility:
         """
 
         self._db = DBConnection
+        self._sender = OutboxSender()
         if url:
             self._db.configure(url)
 
@@ -31,108 +275,490 @@ class MonitorUtility:
             db_path = Path(__file__).resolve().parent / 'monitor.db'
             self._db.configure(f'sqlite:///{db_path}')
 
-    def whitelist(self) -> None:
-        """Print out the current user whitelist including user and node names."""
+    def whitelist(self, output_format: str = 'table', limit: Optional[int] = None, page_size: int = 50) -> None:
+        """Print out the current user whitelist including user and node names
+
+        Args:
+            output_format: Print entries as a ``table``, ``jsonl`` or ``csv``
+            limit: Optionally print at most this many entries
+            page_size: Number of entries per page in the ``table`` format
+        """
+
+        query = whitelist_query(datetime.now(), limit=limit)
+        RowRenderer(output_format, page_size).render_query(self._db.engine, query)
+
+    def history(
+            self, user: Optional[str] = None, since: Optional[datetime] = None, limit: Optional[int] = None,
+            output_format: str = 'table', page_size: int = 50
+    ) -> None:
+        """Print out previous user notifications, newest first
 
-        query = select([
-            User.name.label('User'),
-            Whitelist.global_whitelist.label('Global'),
-            Whitelist.start_time.label('Start'),
-            Whitelist.end_time.label('End')
-        ]) \
-            .select_from(User).join(Whitelist) \
-            .where(Whitelist.end_time > datetime.now())
+        Args:
+            user: Only print notifications for the given user
+            since: Only print notifications sent at or after this time
+            limit: Optionally print at most this many notifications
+            output_format: Print notifications as a ``table``, ``jsonl`` or ``csv``
+            page_size: Number of notifications per page in the ``table`` format
+        """
 
-        # Execute the query with pandas and rely on the default DataFrame string representation
-        whitelist_df = pd.read_sql(query, con=self._db.engine).set_index(['User', 'Global'])
-        whitelist_df.Start = whitelist_df.Start.dt.round('1s')
-        whitelist_df.End = whitelist_df.Start.dt.round('1s')
+        query = notification_query(user, since=since, limit=limit)
+        RowRenderer(output_format, page_size).render_query(self._db.engine, query)
 
-        print(whitelist_df)
+    @staticmethod
+    def _as_list(values: Union[None, str, Iterable[str]]) -> List[str]:
+        """Return a single value or collection of values as a list without duplicates"""
+
+        if values is None:
+            return []
+
+        if isinstance(values, str):
+            return [values]
+
+        return list(dict.fromkeys(values))
+
+    @staticmethod
+    def _report_throughput(action: str, count: int, start: float) -> None:
+        """Print the number of records processed per second since the given start time"""
+
+        elapsed = time.perf_counter() - start
+        rate = count / elapsed if elapsed else float('inf')
+        print(f'{action} {count} user/node pairs in {elapsed:.3f} seconds ({rate:,.0f} per second)')
 
     def add(
             self,
-            user: str,
+            user: Union[str, Collection[str]],
             duration: Optional[timedelta] = None,
-            node: Optional[str] = None,
+            node: Union[None, str, Collection[str]] = None,
             _global: bool = False
     ) -> None:
-        """Whitelist a user to prevent their processes from being killed
+        """Whitelist users to prevent their processes from being killed
+
+        Multiple users and nodes may be given, in which case every user is
+        whitelisted on every node in a single transaction.
 
         Args:
-            user: The name of the user
+            user: The name of the user, or a collection of names
             duration: How long to whitelist the user for
-            node: The name of the node
+            node: The name of the node, or a collection of names
             _global: Whitelist the user on all nodes
         """
 
-        if node is None and not _global:
+        users = self._as_list(user)
+        if not users:
+            raise ValueError('Must specify at least one user.')
+
+        nodes = [None] if _global else self._as_list(node)
+        if not nodes:
             raise ValueError('Must either specify a node name or set global to True.')
 
+        start = time.perf_counter()
         now = datetime.now()
         one_hundred_years_in_days = 36_500
         duration = duration or timedelta(days=one_hundred_years_in_days)
 
+        records = [
+            dict(name=name, node=node_name, global_whitelist=_global, start_time=now, end_time=now + duration)
+            for name in users for node_name in nodes
+        ]
+
         with self._db.session() as session:
-            # Create a record for the user if it doesn't not already exist
-            user_query = select(User).where(User.name == user)
-            user_record = session.execute(user_query).scalars().first()
-            if user_record is None:
-                user_record = User(name=user)
-
-            # Create a whitelist record if it doesn't already exist
-            whitelist_query = select(Whitelist).join(User) \
-                .where(User.id == User.id) \
-                .where(Whitelist.node == node) \
-                .where(Whitelist.start_time < now) \
-                .where(Whitelist.end_time > now)
-
-            whitelist_record = session.execute(whitelist_query).scalars().first()
-            if whitelist_record is None:
-                whitelist_record = Whitelist(
-                    node=node,
-                    start_time=now,
-                    global_whitelist=_global
-                )
-
-            # Add a whitelist to the user record
-            whitelist_record.end_time = now + duration
-            user_record.whitelists.append(whitelist_record)
-            session.add(user_record)
+            upsert_users(session, users)
+            upsert_whitelists(session, records)
+            bump_revision(session, 'whitelist')
             session.commit()
 
-    def remove(self, user: str, node: Optional[str], _global: bool = False) -> None:
-        """Remove a user from the application whitelist
+        if len(records) > 1:
+            self._report_throughput('Whitelisted', len(records), start)
+
+    def remove(
+            self,
+            user: Union[str, Collection[str]],
+            node: Union[None, str, Collection[str]] = None,
+            _global: bool = False
+    ) -> None:
+        """Remove users from the application whitelist
+
+        Multiple users and nodes may be given, in which case every user is
+        removed from every node using a single update statement.
 
         Args:
-            user: The name of the user
-            node: The name of the node
-            _global: Whitelist the user on all nodes
+            user: The name of the user, or a collection of names
+            node: The name of the node, or a collection of names
+            _global: Remove the user from the whitelist on all nodes, including global entries
         """
 
-        if node is None and not _global:
-            raise ValueError('Must either specify a node name or set global to True.')
+        users = self._as_list(user)
+        if not users:
+            raise ValueError('Must specify at least one user.')
 
-        query = select(Whitelist).join(User).where(User.name == user)
-        if node:
-            query = query.where(Whitelist.node == node)
+        nodes = self._as_list(node)
+        if not (nodes or _global):
+            raise ValueError('Must either specify a node name or set global to True.')
 
+        start = time.perf_counter()
         now = datetime.now()
-        with self._db.session() as session:
-            for record in session.execute(query).scalars().all():
-                record.end_time = now
-                session.add(record)
+        query = update(Whitelist) \
+            .where(Whitelist.user_id.in_(select(User.id).where(User.name.in_(users)))) \
+            .where(Whitelist.end_time > now) \
+            .values(end_time=now)
+
+        if not _global:
+            query = query.where(Whitelist.node.in_(nodes))
 
+        with self._db.session() as session:
+            session.execute(query)
+            bump_revision(session, 'whitelist')
             session.commit()
 
+        if len(users) * max(len(nodes), 1) > 1:
+            self._report_throughput('Removed', len(users) * max(len(nodes), 1), start)
+
+    def scan(
+            self,
+            max_mem: float = 20,
+            min_mem: float = 5,
+            wait: float = 5,
+            max_interval: float = 60,
+            source: str = 'proc',
+            iterations: Optional[int] = None,
+            collector: Optional[str] = None,
+            record_history: bool = True,
+            rules: Optional[str] = None,
+            top: Optional[int] = None,
+            preload_users: bool = False,
+            metrics_file: Optional[str] = None,
+            metrics_port: Optional[int] = None,
+            psi: Optional[str] = None,
+            psi_threshold: float = 10,
+            memory_events: Optional[Collection[str]] = None,
+            max_spawn_rate: Optional[float] = None,
+            workers: Optional[int] = 1,
+            executor: str = 'process'
+    ) -> None:
+        """Repeatedly scan for and terminate users exceeding the memory limit
+
+        The scan runs in a single long-lived process so database connections
+        and process history are reused between iterations. Scans repeat
+        quickly while any user is above ``min_mem`` and back off while the
+        node is idle. When a pressure file is given, idle waits end early as
+        soon as the node comes under memory pressure (see the ``pressure``
+        module), so ``max_interval`` only acts as a fallback. Users starting
+        processes faster than ``max_spawn_rate`` are treated as active, even
+        below ``min_mem``, and are reniced once they exceed the rate for
+        ``wait`` seconds. Scans failing with an error are logged and retried
+        after the next interval, so transient failures do not stop the service.
+
+        Args:
+            max_mem: Memory limit as a percentage of system memory
+            min_mem: Users below this percentage of system memory are ignored
+            wait: Seconds a user may exceed the memory limit before being terminated
+            max_interval: Maximum number of seconds to wait between scans
+            source: Name of the source to read usage information from (see ``usage_sources``)
+            iterations: Stop after the given number of scans instead of running indefinitely
+            collector: Optionally push usage of users above ``min_mem`` and terminations to this collector URL
+            record_history: Record the usage of users above ``min_mem`` in the usage history table
+            rules: Optional path of a JSON file with additional enforcement rules (see the ``policy`` module)
+            top: Only consider the given number of users with the largest memory usage on each scan
+            preload_users: Resolve every account known to the system before the first scan
+            metrics_file: Periodically write metrics to this file for the node exporter textfile collector
+            metrics_port: Serve metrics over HTTP on this local port
+            psi: Path of a memory pressure file, usually ``/proc/pressure/memory``, used to end idle waits early
+            psi_threshold: Percentage of time tasks stall on memory that ends an idle wait
+            memory_events: Paths of cgroup ``memory.events`` files whose new events end an idle wait
+            max_spawn_rate: Number of processes a user may start per second before being reniced
+            workers: Number of workers reading processes concurrently, or ``None`` to choose automatically
+            executor: Read processes concurrently in a pool of ``thread`` or ``process`` workers
+        """
+
+        from .policy import PolicyActions, PolicyEngine
+
+        from .accounts import UserCache
+        if preload_users:
+            UserCache.preload()
+
+        agent = None
+        if collector:
+            from .collector import CollectorAgent
+            agent = CollectorAgent(collector)
+            agent.start()
+
+        usage_source = self._usage_source(source)
+        usage_source.set_workers(workers, executor)
+        node = gethostname()
+        scheduler = PollScheduler(max_interval=max_interval)
+        policy = PolicyEngine.from_scan(max_mem, wait, rules, max_spawn_rate)
+        actions = PolicyActions(usage_source, usage_source.cgroup_reader())
+        whitelist = WhitelistCache(node)
+
+        recorder = None
+        if record_history:
+            from .history import HistoryRecorder
+            recorder = HistoryRecorder(node)
+
+        trigger = None
+        if psi:
+            from .pressure import PressureTrigger
+            trigger = PressureTrigger(psi, threshold=psi_threshold, events=memory_events or ())
+            trigger.open()
+
+        exporter = self._start_exporter(metrics_file, metrics_port, {
+            'node_nanny_outbox': self._sender.metrics,
+            'node_nanny_user_cache': UserCache.stats
+        })
+
+        self._sender.start()
+        try:
+            completed = 0
+            while True:
+                scan_start = time.perf_counter()
+                is_active = False
+                try:
+                    # Users are ranked by partial selection, heaviest first, so kills start with the worst offender
+                    with STAGE_SECONDS.time(stage='usage'):
+                        active = usage_source.top_users(top, min_mem, max_spawn_rate)
+                        user_mem = active.MEM.drop(list(self.protected_users), errors='ignore')
+
+                    USERS_ACTIVE.set(len(active))
+                    if recorder is not None:
+                        with STAGE_SECONDS.time(stage='history'):
+                            recorder.record(zip(
+                                active.index, active.CPU.tolist(),
+                                (active.RSS // 1024 ** 2).tolist(), active.MEM.tolist()
+                            ), datetime.now())
+
+                    with STAGE_SECONDS.time(stage='whitelist'):
+                        whitelist.refresh()
+                        candidates = active.loc[[user for user in user_mem.index if user not in whitelist]]
+
+                    with STAGE_SECONDS.time(stage='policy'):
+                        decisions = policy.update(candidates, time.monotonic())
+                        for decision in decisions:
+                            if decision.rule.action != 'kill':
+                                actions.apply(decision, candidates)
+
+                    killed = dict()
+                    expired = [
+                        decision.user for decision in decisions
+                        if decision.rule.action == 'kill' and not decision.release
+                    ]
+                    if expired:
+                        with STAGE_SECONDS.time(stage='kill'):
+                            killed = self._terminate(expired, node, max_mem, source)
+
+                    if agent is not None:
+                        with STAGE_SECONDS.time(stage='report'):
+                            self._report(agent, active, killed, max_mem)
+
+                    is_active = not user_mem.empty
+                    STAGE_SECONDS.observe(time.perf_counter() - scan_start, stage='scan')
+                    SCANS.inc()
+
+                except Exception:
+                    # A failed scan must not stop the service, so the error is logged and the scan is retried
+                    SCAN_ERRORS.inc()
+                    logger.error('Scan failed, retrying after the next interval', exc_info=True)
+
+                completed += 1
+                if iterations is not None and completed >= iterations:
+                    return
+
+                interval = scheduler.update(active=is_active)
+                remaining = policy.time_remaining(time.monotonic())
+                if remaining is not None:
+                    interval = min(interval, remaining)
+
+                # Scans never repeat faster than while the node is active, even under sustained pressure
+                if trigger is not None and interval > scheduler.min_interval:
+                    time.sleep(scheduler.min_interval)
+                    if trigger.wait(interval - scheduler.min_interval):
+                        PRESSURE_WAKEUPS.inc()
+
+                else:
+                    time.sleep(interval)
+
+        finally:
+            self._sender.stop()
+            usage_source.close()
+            if agent is not None:
+                agent.stop(timeout=2 * agent.timeout)
+
+            if recorder is not None:
+                recorder.flush()
+
+            if exporter is not None:
+                exporter.stop()
+
+            if trigger is not None:
+                trigger.close()
+
     @staticmethod
-    def kill(user: str) -> None:
-        """Terminate all processes launched by a given user"""
+    def _start_exporter(
+            metrics_file: Optional[str], metrics_port: Optional[int], callbacks: Dict[str, Callable[[], dict]]
+    ) -> Optional[MetricsExporter]:
+        """Start exporting application metrics if a destination is given
 
-        user_processes = SystemUsage.user_usage(user)
-        for pid in user_processes.index:
+        Args:
+            metrics_file: Periodically write metrics to this file
+            metrics_port: Serve metrics over HTTP on this local port
+            callbacks: Statistics of other components to export, keyed by metric name prefix
+
+        Returns:
+            The running exporter, or ``None`` if metrics are not exported
+        """
+
+        if metrics_file is None and metrics_port is None:
+            return None
+
+        exporter = MetricsExporter(path=metrics_file, port=metrics_port, callbacks=callbacks)
+        exporter.start()
+        if exporter.server is not None:
+            print(f'Serving metrics on http://{exporter.host}:{exporter.server.server_port}/metrics')
+
+        return exporter
+
+    @staticmethod
+    def _report(agent: 'CollectorAgent', totals: 'DataFrame', killed: Dict[str, 'DataFrame'], limit: float) -> None:
+        """Queue per user usage totals and terminations to be pushed to a collector
+
+        Args:
+            agent: The agent used to reach the collector
+            totals: Per user usage totals as returned by ``SystemUsage.user_totals``
+            killed: Process usage of terminated users keyed by username
+            limit: The memory limit that was exceeded by terminated users
+        """
+
+        for user, usage in killed.items():
+            agent.add_event(user, int(usage.RSS.sum() // 1024 ** 2), float(usage.MEM.sum()), limit)
+
+        agent.submit(
+            dict(user=user, cpu=cpu, memory=rss // 1024 ** 2, percentage=mem, processes=procs)
+            for user, cpu, mem, rss, procs in zip(
+                totals.index, totals.CPU.tolist(), totals.MEM.tolist(), totals.RSS.tolist(), totals.PROCS.tolist())
+        )
+
+    def _terminate(self, users: List[str], node: str, limit: float, source: str) -> Dict[str, 'DataFrame']:
+        """Terminate and notify users exceeding the memory limit
+
+        Args:
+            users: The names of the users
+            node: The name of the current node
+            limit: The memory limit that was exceeded
+            source: Name of the source to read usage information from
+
+        Returns:
+            Process usage of the terminated users keyed by username
+        """
+
+        usage = dict()
+        for user in users:
             try:
-                os.kill(pid, signal.SIGKILL)
+                usage[user] = self._usage_source(source).user_usage(user, refresh=False)
+
+            # The user's processes may have exited on their own since the scan
+            except ValueError:  # pragma: no cover
+                continue
+
+            self.terminate(user, source)
+
+        # Emails are queued in the database and delivered by the background sender
+        from .utils import UserNotifier
+        UserNotifier.notify_all(node, usage, limit)
+        self._sender.wake()
+        return usage
+
+    @classmethod
+    def terminate(cls, user: str, source: str = 'proc', snapshot: Optional['ProcessSnapshot'] = None) -> 'KillResult':
+        """Terminate all processes launched by a given user and wait for them to exit
+
+        Args:
+            user: The name of the user
+            source: Name of the source to read process information from (see ``usage_sources``)
+            snapshot: A recent snapshot of the whole process table, read again if not given
+
+        Returns:
+            A summary of the terminated processes and how long they took to exit
+        """
+
+        from .kill import resolve_uid
+
+        result = cls._usage_source(source).killer().kill(resolve_uid(user), snapshot=snapshot)
+        KILLS.inc(method=result.method)
+        KILLED_PROCESSES.inc(result.signalled)
+        KILL_SECONDS.observe(result.latency)
+        if result.remaining:
+            print(f'{result.remaining} processes of user {user} still running after kill', file=sys.stderr)
+
+        return result
+
+    def kill(self, user: str, source: str = 'proc', quiet: bool = False) -> None:
+        """Terminate all processes launched by a given user and notify them via email
+
+        The notification is delivered before returning. Messages that could
+        not be sent remain in the outbox and are retried by the ``scan`` service.
+
+        Args:
+            user: The name of the user
+            source: Name of the source to read process information from (see ``usage_sources``)
+            quiet: Do not notify the user their processes were terminated
+        """
+
+        # The snapshot read for the notification is reused to plan the kill, so the process table is only read once
+        usage_source = self._usage_source(source)
+        usage = None if quiet else usage_source.user_usage(user)
+        result = self.terminate(user, source, None if quiet else usage_source.latest_snapshot())
+        print(
+            f'Terminated {result.signalled} processes of user {user} in {result.latency * 1000:.1f} ms '
+            f'using {result.method} ({result.rounds} re-scans)'
+        )
+
+        if usage is not None:
+            # A limit of zero records a manual termination
+            from .utils import UserNotifier
+            UserNotifier.notify_all(gethostname(), {user: usage}, limit=0)
+            if not self._sender.flush():
+                print(f'Could not deliver notification to user {user}, it will be retried by the scan service',
+                      file=sys.stderr)
+
+    def collect(
+            self,
+            host: str = '0.0.0.0',
+            port: int = 8650,
+            batch_size: int = 1000,
+            max_queue: int = 100_000,
+            retention: timedelta = timedelta(days=30),
+            metrics_file: Optional[str] = None,
+            metrics_port: Optional[int] = None
+    ) -> None:
+        """Receive usage reports from node agents and write them to the application database
+
+        Runs until interrupted. Reports that are still queued when the
+        collector is interrupted are written before returning.
+
+        Args:
+            host: Address to listen on
+            port: Port to listen on
+            batch_size: Maximum number of reports written in a single transaction
+            max_queue: Maximum number of reports waiting to be written before new reports are rejected
+            retention: How long usage reports are kept before being deleted
+            metrics_file: Periodically write metrics to this file for the node exporter textfile collector
+            metrics_port: Serve metrics in the Prometheus text format over HTTP on this local port
+        """
+
+        from .collector import CollectorServer, UsageCollector
+
+        collector = UsageCollector(batch_size=batch_size, max_queue=max_queue, retention=retention)
+        server = CollectorServer((host, port), collector)
+        collector.start()
+        exporter = self._start_exporter(metrics_file, metrics_port, {'node_nanny_collector': collector.metrics})
+        print(f'Collecting usage reports on {host}:{server.server_port}')
+        try:
+            server.serve_forever()
+
+        except KeyboardInterrupt:
+            pass
 
-            except ProcessLookupError:
-                pass
+        finally:
+            server.server_close()
+            collector.stop()
+            if exporter is not None:
+                exporter.stop()
@@ -0,0 +1,311 @@
+"""The ``cgroup`` module reads per user resource accounting from the cgroup v2
+filesystem.
+
+On systemd managed nodes every logged in user is assigned a
+``user-<uid>.slice`` cgroup. The kernel already tracks the memory and CPU
+usage of each slice, so reading a handful of files per user is both cheaper
+and more accurate than summing over individual processes.
+"""
+
+import os
+import re
+import time
+from typing import Collection, Dict, List, Optional, Set, Tuple
+
+SLICE_PATTERN = re.compile(r'^user-(\d+)\.slice$')
+
+
+class SliceSnapshot:
+    """Column oriented record of user slice usage at a single point in time"""
+
+    columns = ('uid', 'memory', 'working_set', 'cpu_usec')
+
+    def __init__(self, timestamp: float = 0) -> None:
+        """Create an empty snapshot
+
+        Args:
+            timestamp: Monotonic time in seconds when the snapshot was taken
+        """
+
+        self.timestamp = timestamp
+        self.uid: List[int] = []
+        self.memory: List[int] = []
+        self.working_set: List[int] = []
+        self.cpu_usec: List[int] = []
+
+    def append(self, record: Tuple) -> None:
+        """Add a single user slice record to the snapshot
+
+        Args:
+            record: Slice values ordered to match the ``columns`` attribute
+        """
+
+        for column, value in zip(self.columns, record):
+            getattr(self, column).append(value)
+
+    def __len__(self) -> int:
+        return len(self.uid)
+
+
+class CgroupReader:
+    """Reads user slice accounting from a cgroup v2 style directory"""
+
+    def __init__(self, root: str = '/sys/fs/cgroup') -> None:
+        """Read user slice information from the given directory
+
+        Args:
+            root: Path of the cgroup v2 filesystem, or a directory mimicking it
+        """
+
+        self.root = root
+        self.user_slice = os.path.join(root, 'user.slice')
+
+    @staticmethod
+    def _read(path: str) -> str:
+        """Return the content of a file as a string"""
+
+        with open(path, 'rb') as infile:
+            return infile.read().decode()
+
+    @staticmethod
+    def _read_keyed(content: str) -> Dict[str, int]:
+        """Parse the content of a flat keyed file such as ``memory.stat``"""
+
+        values = dict()
+        for line in content.splitlines():
+            key, _, value = line.partition(' ')
+            if value:
+                values[key] = int(value)
+
+        return values
+
+    def slices(self) -> Dict[int, str]:
+        """Return the path of each user slice keyed by user ID"""
+
+        try:
+            names = os.listdir(self.user_slice)
+
+        except FileNotFoundError:
+            return dict()
+
+        slices = dict()
+        for name in names:
+            match = SLICE_PATTERN.match(name)
+            if match:
+                slices[int(match.group(1))] = os.path.join(self.user_slice, name)
+
+        return slices
+
+    def slice_path(self, uid: int) -> str:
+        """Return the path of the slice for a given user ID"""
+
+        return os.path.join(self.user_slice, f'user-{uid}.slice')
+
+    def read_slice(self, uid: int) -> Tuple:
+        """Return usage information for a single user slice
+
+        Args:
+            uid: The ID of the user owning the slice
+
+        Returns:
+            A tuple of slice values ordered to match ``SliceSnapshot.columns``
+
+        Raises:
+            FileNotFoundError: If the slice does not exist
+        """
+
+        path = self.slice_path(uid)
+        memory = int(self._read(os.path.join(path, 'memory.current')))
+        memory_stat = self._read_keyed(self._read(os.path.join(path, 'memory.stat')))
+        cpu_stat = self._read_keyed(self._read(os.path.join(path, 'cpu.stat')))
+
+        # Exclude reclaimable page cache in the same way as the kernel's own working set estimate
+        working_set = max(0, memory - memory_stat.get('inactive_file', 0))
+        return uid, memory, working_set, cpu_stat.get('usage_usec', 0)
+
+    def snapshot(self) -> SliceSnapshot:
+        """Return a snapshot of all current user slices"""
+
+        snapshot = SliceSnapshot(timestamp=time.monotonic())
+        for uid in self.slices():
+            try:
+                snapshot.append(self.read_slice(uid))
+
+            # Slices are removed when a user logs out
+            except FileNotFoundError:  # pragma: no cover
+                pass
+
+        return snapshot
+
+    def pids(self, uid: Optional[int] = None) -> List[int]:
+        """Return the IDs of processes running inside user slices
+
+        Args:
+            uid: Optionally restrict results to the slice of a single user
+
+        Returns:
+            A list of process IDs
+        """
+
+        paths = self.slices().values() if uid is None else [self.slice_path(uid)]
+
+        pids = []
+        for path in paths:
+            for directory, _, files in os.walk(path):
+                if 'cgroup.procs' not in files:
+                    continue
+
+                try:
+                    pids.extend(int(pid) for pid in self._read(os.path.join(directory, 'cgroup.procs')).split())
+
+                except FileNotFoundError:  # pragma: no cover
+                    pass
+
+        return pids
+
+    def _write_control(self, uid: int, name: str, value: str) -> bool:
+        """Write a value to an existing control file of a user slice
+
+        Returns:
+            Whether the value was written, or ``False`` if the control file is unavailable
+        """
+
+        path = os.path.join(self.slice_path(uid), name)
+        if not os.path.isfile(path):
+            return False
+
+        try:
+            with open(path, 'w') as outfile:
+                outfile.write(value)
+
+        except OSError:
+            return False
+
+        return True
+
+    def set_memory_high(self, uid: int, limit: Optional[int]) -> bool:
+        """Set the memory usage above which a user slice is throttled and reclaimed
+
+        Args:
+            uid: The ID of the user owning the slice
+            limit: Memory limit in bytes, or ``None`` to remove the limit
+
+        Returns:
+            Whether the limit was applied
+        """
+
+        return self._write_control(uid, 'memory.high', 'max' if limit is None else str(int(limit)))
+
+    def set_cpu_max(self, uid: int, percent: Optional[float], period: int = 100_000) -> bool:
+        """Set the maximum CPU bandwidth available to a user slice
+
+        Args:
+            uid: The ID of the user owning the slice
+            percent: CPU limit as a percentage of a single CPU, or ``None`` to remove the limit
+            period: Length of the accounting period in microseconds
+
+        Returns:
+            Whether the limit was applied
+        """
+
+        quota = 'max' if percent is None else str(max(1000, int(period * percent / 100)))
+        return self._write_control(uid, 'cpu.max', f'{quota} {period}')
+
+    def kill(self, uid: int) -> bool:
+        """Kill every process in a user's slice using the ``cgroup.kill`` interface
+
+        The kernel signals every process in the slice and its descendant
+        cgroups at once, including processes forked while the kill is in
+        progress. The interface is only available on Linux 5.14 and later.
+
+        Args:
+            uid: The ID of the user owning the slice
+
+        Returns:
+            Whether the slice was killed, or ``False`` if the interface is unavailable
+        """
+
+        return self._write_control(uid, 'cgroup.kill', '1')
+
+
+class SliceCPUSampler:
+    """Calculate user slice CPU usage from the change in CPU time between snapshots"""
+
+    def __init__(self) -> None:
+        """Create a sampler with no prior snapshot history"""
+
+        self._previous: Dict[int, int] = dict()
+        self._timestamp: Optional[float] = None
+
+    def sample(self, snapshot: SliceSnapshot) -> List[float]:
+        """Return the CPU usage of each user slice in a snapshot
+
+        Slices without a previous sample, or whose counters were reset by the
+        slice being recreated, report zero usage.
+
+        Args:
+            snapshot: The snapshot to calculate CPU usage for
+
+        Returns:
+            A list of CPU percentages ordered to match the snapshot
+        """
+
+        elapsed = snapshot.timestamp - self._timestamp if self._timestamp is not None else 0
+        previous = self._previous
+
+        percentages = []
+        for uid, usage in zip(snapshot.uid, snapshot.cpu_usec):
+            last_usage = previous.get(uid)
+            if last_usage is None or usage < last_usage or elapsed <= 0:
+                percentages.append(0.0)
+
+            else:
+                percentages.append(100 * (usage - last_usage) / 1e6 / elapsed)
+
+        self._previous = dict(zip(snapshot.uid, snapshot.cpu_usec))
+        self._timestamp = snapshot.timestamp
+        return percentages
+
+
+class SliceSpawnCounter:
+    """Estimate how quickly processes are started in each user slice from changes in slice membership
+
+    Processes are identified by process ID only, so a process ID reused
+    within the same slice between two samples is not counted.
+    """
+
+    def __init__(self) -> None:
+        """Create a counter with no prior snapshot history"""
+
+        self._previous: Dict[int, Set[int]] = dict()
+        self._timestamp: Optional[float] = None
+
+    def sample(self, snapshot: SliceSnapshot, pids: List[Collection[int]]) -> List[float]:
+        """Return the number of processes started per second in each user slice of a snapshot
+
+        Slices without a previous sample report zero.
+
+        Args:
+            snapshot: The snapshot to calculate spawn rates for
+            pids: IDs of the processes in each slice, ordered to match the snapshot
+
+        Returns:
+            A list of rates ordered to match the snapshot
+        """
+
+        elapsed = snapshot.timestamp - self._timestamp if self._timestamp is not None else 0
+        previous = self._previous
+        current = {uid: set(members) for uid, members in zip(snapshot.uid, pids)}
+
+        rates = []
+        for uid, members in current.items():
+            last_members = previous.get(uid)
+            if last_members is None or elapsed <= 0:
+                rates.append(0.0)
+
+            else:
+                rates.append(len(members - last_members) / elapsed)
+
+        self._previous = current
+        self._timestamp = snapshot.timestamp
+        return rates
@@ -1,10 +1,174 @@
 """Command line argument parser for node usage monitor"""
 
-from argparse import ArgumentParser
+from argparse import ArgumentParser, ArgumentTypeError
+from datetime import datetime, timedelta
 from socket import gethostname
+from typing import List, Optional
 import sys
 
-from node_nanny.app import MonitorUtility
+
+def read_lines(path: str) -> List[str]:
+    """Return the non-empty lines of a text file, ignoring comments
+
+    Args:
+        path: Path of the file to read
+
+    Returns:
+        A list of stripped lines
+
+    Raises:
+        ArgumentTypeError: If the file cannot be read or contains no values
+    """
+
+    try:
+        with open(path) as infile:
+            lines = (line.split('#', 1)[0].strip() for line in infile)
+            values = [line for line in lines if line]
+
+    except OSError as exception:
+        raise ArgumentTypeError(f'could not read file {path}: {exception.strerror}')
+
+    if not values:
+        raise ArgumentTypeError(f'file {path} does not contain any values')
+
+    return values
+
+
+def days(value: str) -> timedelta:
+    """Return a number of days as a ``timedelta`` object
+
+    Args:
+        value: The number of days as a string
+
+    Returns:
+        A ``timedelta`` instance
+    """
+
+    return timedelta(days=int(value))
+
+
+def timestamp(value: str) -> datetime:
+    """Return a date or date and time as a ``datetime`` object
+
+    Args:
+        value: A date formatted as ``YYYY-MM-DD`` with an optional ``HH:MM[:SS]`` time
+
+    Returns:
+        A ``datetime`` instance
+    """
+
+    for date_format in ('%Y-%m-%d', '%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M', '%Y-%m-%dT%H:%M:%S'):
+        try:
+            return datetime.strptime(value, date_format)
+
+        except ValueError:
+            pass
+
+    raise ArgumentTypeError(f'invalid date {value}, expected YYYY-MM-DD[ HH:MM[:SS]]')
+
+
+def positive_int(value: str) -> int:
+    """Return a string as an integer greater than zero
+
+    Args:
+        value: The integer as a string
+
+    Returns:
+        The integer value
+    """
+
+    try:
+        number = int(value)
+
+    except ValueError:
+        number = 0
+
+    if number < 1:
+        raise ArgumentTypeError(f'invalid value {value}, expected a positive integer')
+
+    return number
+
+
+def worker_count(value: str) -> Optional[int]:
+    """Return a number of workers, where ``auto`` selects the number automatically
+
+    Args:
+        value: A positive integer or ``auto`` as a string
+
+    Returns:
+        The number of workers, or ``None`` for ``auto``
+    """
+
+    if value == 'auto':
+        return None
+
+    return positive_int(value)
+
+
+def add_output_arguments(parser: ArgumentParser) -> None:
+    """Add arguments controlling the output of tabular reports to a parser
+
+    Args:
+        parser: The parser to add arguments to
+    """
+
+    parser.add_argument(
+        '-f',
+        '--format',
+        action='store',
+        type=str,
+        required=False,
+        default='table',
+        choices=('table', 'jsonl', 'csv'),
+        dest='output_format',
+        help='print results as a text table, JSON lines or CSV'
+    )
+
+    parser.add_argument(
+        '-l',
+        '--limit',
+        action='store',
+        type=positive_int,
+        required=False,
+        default=None,
+        help='maximum number of records to print'
+    )
+
+    parser.add_argument(
+        '-p',
+        '--page-size',
+        action='store',
+        type=positive_int,
+        required=False,
+        default=50,
+        help='number of records per page when printing a text table'
+    )
+
+
+def add_metrics_arguments(parser: ArgumentParser) -> None:
+    """Add arguments controlling the export of application metrics to a parser
+
+    Args:
+        parser: The parser to add arguments to
+    """
+
+    parser.add_argument(
+        '--metrics-file',
+        action='store',
+        type=str,
+        required=False,
+        default=None,
+        help='periodically write metrics to this file for the node exporter textfile collector, e.g. node_nanny.prom'
+    )
+
+    parser.add_argument(
+        '--metrics-port',
+        action='store',
+        type=positive_int,
+        required=False,
+        default=None,
+        help='serve metrics in the Prometheus text format on this local port'
+    )
 
 
 class CLIParser(ArgumentParser):
@@ -20,6 +184,17 @@ class CLIParser(ArgumentParser):
 
     def setup_commands(self):
 
+        self.add_argument(
+            '--db',
+            action='store',
+            type=str,
+            required=False,
+            default=None,
+            dest='url',
+            help=('URL of the application database, e.g. a PostgreSQL server shared by all nodes '
+                  '(defaults to a SQLite file in the installation directory)')
+        )
+
         # Command subparser
         command = self.add_subparsers(
             dest='command',
@@ -62,11 +237,195 @@ class CLIParser(ArgumentParser):
             type=int,
             required=False,
             default=5,
-            help=('duration that a process found to be above '
+            help=('duration in seconds that a process found to be above '
                   'the memory limit is allowed to continue before '
                   'being killed')
         )
 
+        scan.add_argument(
+            '-i',
+            '--max-interval',
+            action='store',
+            type=int,
+            required=False,
+            default=60,
+            help='maximum number of seconds to wait between scans while the node is idle'
+        )
+
+        scan.add_argument(
+            '-s',
+            '--source',
+            action='store',
+            type=str,
+            required=False,
+            default='proc',
+            choices=('proc', 'cgroup'),
+            help='read usage from individual processes or from cgroup user slices'
+        )
+
+        scan.add_argument(
+            '-c',
+            '--collector',
+            action='store',
+            type=str,
+            required=False,
+            default=None,
+            help='URL of a collector to report usage and terminated users to, e.g. http://collector:8650'
+        )
+
+        scan.add_argument(
+            '-r',
+            '--rules',
+            action='store',
+            type=str,
+            required=False,
+            default=None,
+            help=('JSON file of additional rules for throttling, renicing, stopping, or killing users '
+                  'before they reach the memory limit')
+        )
+
+        scan.add_argument(
+            '-k',
+            '--top',
+            action='store',
+            type=positive_int,
+            required=False,
+            default=None,
+            help='only consider this many users with the largest memory usage on each scan (defaults to all users)'
+        )
+
+        scan.add_argument(
+            '--preload-users',
+            action='store_true',
+            help='load all user accounts from the system name service in one request before scanning'
+        )
+
+        scan.add_argument(
+            '--no-history',
+            action='store_false',
+            dest='record_history',
+            help='do not record user memory and CPU usage over time in the application database'
+        )
+
+        scan.add_argument(
+            '--psi',
+            action='store',
+            type=str,
+            nargs='?',
+            const='/proc/pressure/memory',
+            default=None,
+            help=('start a scan as soon as the node comes under memory pressure instead of waiting for the idle '
+                  'interval, optionally reading pressure from the given file (default /proc/pressure/memory)')
+        )
+
+        scan.add_argument(
+            '--psi-threshold',
+            action='store',
+            type=float,
+            required=False,
+            default=10,
+            help='percentage of time tasks stall waiting for memory that counts as memory pressure'
+        )
+
+        scan.add_argument(
+            '--memory-events',
+            action='append',
+            type=str,
+            required=False,
+            default=None,
+            help='cgroup memory.events file whose new high, max, or OOM events start a scan (may be repeated)'
+        )
+
+        scan.add_argument(
+            '--max-spawn-rate',
+            action='store',
+            type=float,
+            required=False,
+            default=None,
+            help=('number of processes a user may start per second before their processes are reniced, '
+                  'users above this rate are scanned even when below the lower memory limit')
+        )
+
+        scan.add_argument(
+            '--workers',
+            action='store',
+            type=worker_count,
+            required=False,
+            default=1,
+            help=('number of workers reading /proc concurrently on nodes with very large process tables, '
+                  'or "auto" to choose based on the number of processes and CPUs (defaults to 1)')
+        )
+
+        scan.add_argument(
+            '--executor',
+            action='store',
+            type=str,
+            required=False,
+            default='process',
+            choices=('thread', 'process'),
+            help='read /proc concurrently using a pool of processes or threads (threads share the interpreter lock)'
+        )
+
+        add_metrics_arguments(scan)
+
+        # Collect subcommand
+        collect = command.add_parser(
+            'collect',
+            help='receive usage reports from other nodes and write them to the application database'
+        )
+
+        collect.add_argument(
+            '-H',
+            '--host',
+            action='store',
+            type=str,
+            required=False,
+            default='0.0.0.0',
+            help='address to listen on for usage reports'
+        )
+
+        collect.add_argument(
+            '-p',
+            '--port',
+            action='store',
+            type=int,
+            required=False,
+            default=8650,
+            help='port to listen on for usage reports'
+        )
+
+        collect.add_argument(
+            '-b',
+            '--batch-size',
+            action='store',
+            type=positive_int,
+            required=False,
+            default=1000,
+            help='maximum number of reports written to the database in a single transaction'
+        )
+
+        collect.add_argument(
+            '-q',
+            '--max-queue',
+            action='store',
+            type=positive_int,
+            required=False,
+            default=100_000,
+            help='maximum number of reports waiting to be written before new reports are rejected'
+        )
+
+        collect.add_argument(
+            '-r',
+            '--retention',
+            action='store',
+            type=days,
+            required=False,
+            default=timedelta(days=30),
+            help='number of days usage reports are kept before being deleted'
+        )
+
+        add_metrics_arguments(collect)
+
         # Kill subcommand
         kill = command.add_parser(
             'kill',
@@ -84,11 +443,20 @@ class CLIParser(ArgumentParser):
         )
 
         kill.add_argument(
-            '-q',
-            '--quiet',
+            '-s',
+            '--source',
             action='store',
-            type=bool,
+            type=str,
             required=False,
+            default='proc',
+            choices=('proc', 'cgroup'),
+            help='find processes by scanning the process table or from cgroup user slices'
+        )
+
+        kill.add_argument(
+            '-q',
+            '--quiet',
+            action='store_true',
             help='suppress outgoing email notifications'
         )
 
@@ -108,36 +476,61 @@ class CLIParser(ArgumentParser):
             help='username of the notification history to show'
         )
 
+        history.add_argument(
+            '-S',
+            '--since',
+            action='store',
+            type=timestamp,
+            required=False,
+            default=None,
+            help='only show notifications sent on or after the given date (YYYY-MM-DD[ HH:MM[:SS]])'
+        )
+
+        add_output_arguments(history)
+
         # Whitelist subcommand
-        command.add_parser(
+        whitelist = command.add_parser(
             'whitelist',
             help='display current whitelist, user and node names'
         )
 
+        add_output_arguments(whitelist)
+
         add = command.add_parser(
             'add',
             help=('whitelist the given user so their jobs are '
                   'never killed on the current node')
         )
 
-        add.add_argument(
+        add_user_opts = add.add_mutually_exclusive_group(required=True)
+
+        add_user_opts.add_argument(
             '-u',
             '--user',
             action='store',
             type=str,
-            required=True,
-            help=('username of the user who should be added to '
+            nargs='+',
+            help=('username of the user(s) who should be added to '
                   'the whitelist')
         )
 
+        add_user_opts.add_argument(
+            '-U',
+            '--user-file',
+            action='store',
+            type=read_lines,
+            dest='user',
+            help='file listing usernames to add to the whitelist, one per line'
+        )
+
         add.add_argument(
             '-d',
             '--duration',
             action='store',
-            type=int,
+            type=days,
             required=False,
-            default=100000000,
-            help='how long to whitelist a user for'
+            default=None,
+            help='number of days to whitelist a user for (defaults to indefinitely)'
         )
 
         whitelist_node_opts = add.add_mutually_exclusive_group()
@@ -147,15 +540,26 @@ class CLIParser(ArgumentParser):
             '--node',
             action='store',
             type=str,
+            nargs='+',
             required=False,
             default=gethostname(),
             help='node or list of nodes to whitelist the user on'
         )
 
+        whitelist_node_opts.add_argument(
+            '-N',
+            '--node-file',
+            action='store',
+            type=read_lines,
+            dest='node',
+            help='file listing nodes to whitelist the user on, one per line'
+        )
+
         whitelist_node_opts.add_argument(
             '-g',
             '--global',
             action='store_true',
+            dest='_global',
             help='whitelist user on all nodes'
         )
 
@@ -165,31 +569,53 @@ class CLIParser(ArgumentParser):
             help='remove a user from the whitelist on the current node'
         )
 
-        remove.add_argument(
+        remove_user_opts = remove.add_mutually_exclusive_group(required=True)
+
+        remove_user_opts.add_argument(
             '-u',
             '--user',
             action='store',
             type=str,
-            required=True,
-            help=('username of the user who should be removed from '
+            nargs='+',
+            help=('username of the user(s) who should be removed from '
                   'the whitelist')
         )
 
+        remove_user_opts.add_argument(
+            '-U',
+            '--user-file',
+            action='store',
+            type=read_lines,
+            dest='user',
+            help='file listing usernames to remove from the whitelist, one per line'
+        )
+
         node_opts = remove.add_mutually_exclusive_group()
         node_opts.add_argument(
             '-n',
             '--node',
             action='store',
             type=str,
+            nargs='+',
             required=False,
             default=gethostname(),
             help='node or list of nodes to Un-whitelist the user on'
         )
 
+        node_opts.add_argument(
+            '-N',
+            '--node-file',
+            action='store',
+            type=read_lines,
+            dest='node',
+            help='file listing nodes to un-whitelist the user on, one per line'
+        )
+
         node_opts.add_argument(
             '-g',
             '--global',
             action='store_true',
+            dest='_global',
             help='un-whitelist user on all nodes'
         )
 
@@ -211,5 +637,8 @@ class CLIParser(ArgumentParser):
         """Parse command line arguments and execute usage monitor"""
 
         args = vars(self.parse_args())
-        app = MonitorUtility()
+
+        # Delay loading the application (and its database dependencies) until arguments are validated
+        from node_nanny.app import MonitorUtility
+        app = MonitorUtility(args.pop('url'))
         getattr(app, args.pop('command'))(**args)
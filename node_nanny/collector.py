@@ -0,0 +1,592 @@
+"""The ``collector`` module aggregates usage reports from many nodes into a
+single shared database.
+
+Each monitored node runs a ``CollectorAgent`` that pushes a compact summary
+of per user usage, plus any enforcement events, to a central
+``CollectorServer`` over HTTP from a background thread, so an unreachable
+collector never delays the next system scan. The server only validates and queues incoming
+reports, so a slow database never blocks other nodes. Queued reports are
+written by a single ``UsageCollector`` thread in batches, with one
+transaction per batch.
+"""
+
+import json
+import sys
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from queue import Empty, Full, Queue
+from socket import gethostname
+from socketserver import ThreadingMixIn
+from threading import Lock, Thread
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from node_nanny.orm import DBConnection, Notification, UsageReport, User, upsert_users
+
+# Requests larger than this many bytes are rejected
+MAX_REQUEST_SIZE = 1024 ** 2
+
+
+def parse_report(payload: dict) -> dict:
+    """Validate a usage report and convert it to the format used by ``UsageCollector``
+
+    Reports are dictionaries with a ``node`` name, a ``time`` in seconds since
+    the epoch, a list of ``usage`` records with the keys ``user``, ``cpu``,
+    ``memory``, ``percentage``, and ``processes``, and an optional list of
+    ``events`` with the keys ``user``, ``memory``, ``percentage``, ``limit``,
+    and optionally ``time``.
+
+    Args:
+        payload: The decoded report
+
+    Returns:
+        A dictionary with the node name, report time, usage tuples, and event tuples
+
+    Raises:
+        ValueError: If the report is missing values or values have the wrong type
+    """
+
+    try:
+        node = str(payload['node'])
+        report_time = float(payload['time'])
+        usage = [
+            (str(r['user']), float(r['cpu']), int(r['memory']), float(r['percentage']), int(r['processes']))
+            for r in payload.get('usage', ())
+        ]
+        events = [
+            (
+                str(e['user']), int(e['memory']), float(e['percentage']), int(e['limit']),
+                datetime.fromtimestamp(float(e.get('time', report_time)))
+            )
+            for e in payload.get('events', ())
+        ]
+
+    except (AttributeError, KeyError, TypeError, ValueError, OverflowError, OSError) as exception:
+        raise ValueError(f'Invalid usage report: {exception!r}')
+
+    return dict(node=node, time=datetime.fromtimestamp(report_time), usage=usage, events=events)
+
+
+class UsageCollector:
+    """Write queued usage reports to the application database from a background thread"""
+
+    def __init__(
+            self,
+            batch_size: int = 1000,
+            max_queue: int = 100_000,
+            retention: timedelta = timedelta(days=30),
+            prune_interval: timedelta = timedelta(hours=1)
+    ) -> None:
+        """Configure the report queue
+
+        Args:
+            batch_size: Maximum number of reports written in a single transaction
+            max_queue: Maximum number of reports waiting to be written before new reports are rejected
+            retention: How long usage reports are kept before being deleted
+            prune_interval: Minimum time between deleting expired reports
+        """
+
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.retention = retention
+        self.prune_interval = prune_interval
+
+        self.received = 0
+        self.rejected = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.pruned = 0
+        self.last_latency = 0.0
+
+        self._queue: Queue = Queue(max_queue)
+        self._lock = Lock()
+        self._user_ids: Dict[str, int] = dict()
+        self._thread: Optional[Thread] = None
+        self._last_pruned: Optional[datetime] = None
+
+    def submit(self, report: dict) -> bool:
+        """Queue a parsed usage report without waiting for it to be written
+
+        Args:
+            report: A report as returned by ``parse_report``
+
+        Returns:
+            Whether the report was queued, or ``False`` if the queue is full
+        """
+
+        try:
+            self._queue.put_nowait(report)
+
+        except Full:
+            with self._lock:
+                self.rejected += 1
+
+            return False
+
+        with self._lock:
+            self.received += 1
+
+        return True
+
+    def queue_depth(self) -> int:
+        """Return the number of reports waiting to be written"""
+
+        return self._queue.qsize()
+
+    def metrics(self) -> Dict[str, float]:
+        """Return statistics for reports handled by this collector
+
+        Returns:
+            A dictionary with the queue depth, report counts, and the latency of the last batch in seconds
+        """
+
+        return {
+            'queue_depth': self.queue_depth(),
+            'received': self.received,
+            'rejected': self.rejected,
+            'written': self.written,
+            'failed': self.failed,
+            'batches': self.batches,
+            'pruned': self.pruned,
+            'last_latency': self.last_latency
+        }
+
+    def _resolve_users(self, session: Session, names: Iterable[str]) -> Dict[str, int]:
+        """Return database IDs for the given usernames, creating users as necessary
+
+        IDs of previously seen users are cached, so only new usernames are
+        looked up. Newly created IDs are not cached until the caller commits.
+        """
+
+        missing = set(names).difference(self._user_ids)
+        if not missing:
+            return self._user_ids
+
+        upsert_users(session, missing)
+        query = select(User.name, User.id).where(User.name.in_(missing))
+        return {**self._user_ids, **dict(session.execute(query).all())}
+
+    def write(self, reports: List[dict]) -> int:
+        """Write a batch of usage reports to the database in a single transaction
+
+        Args:
+            reports: Reports as returned by ``parse_report``
+
+        Returns:
+            The number of reports written
+        """
+
+        start = time.perf_counter()
+        names = {record[0] for report in reports for record in report['usage'] + report['events']}
+        with DBConnection.session() as session:
+            user_ids = self._resolve_users(session, names)
+
+            usage = [
+                dict(
+                    user_id=user_ids[user], node=report['node'], time=report['time'],
+                    cpu=cpu, memory=memory, percentage=percentage, processes=processes
+                )
+                for report in reports for user, cpu, memory, percentage, processes in report['usage']
+            ]
+
+            events = [
+                dict(
+                    user_id=user_ids[user], node=report['node'], time=event_time,
+                    memory=memory, percentage=percentage, limit=limit
+                )
+                for report in reports for user, memory, percentage, limit, event_time in report['events']
+            ]
+
+            if usage:
+                session.execute(insert(UsageReport), usage)
+
+            if events:
+                session.execute(insert(Notification), events)
+
+            session.commit()
+
+        self._user_ids = user_ids
+        self.written += len(reports)
+        self.batches += 1
+        self.last_latency = time.perf_counter() - start
+        return len(reports)
+
+    def prune(self, now: datetime) -> int:
+        """Delete usage reports older than the retention period
+
+        Args:
+            now: The current time
+
+        Returns:
+            The number of deleted reports
+        """
+
+        with DBConnection.session() as session:
+            result = session.execute(delete(UsageReport).where(UsageReport.time < now - self.retention))
+            session.commit()
+
+        self._last_pruned = now
+        self.pruned += result.rowcount
+        return result.rowcount
+
+    def _next_batch(self, timeout: float) -> List[dict]:
+        """Wait for at least one queued report and return up to ``batch_size`` reports"""
+
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+
+        except Empty:
+            return []
+
+        # Reports that arrived while the previous batch was being written are combined into one transaction
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+
+            except Empty:
+                break
+
+        # Discard the wake up signal sent when the collector is stopped
+        return [report for report in batch if report is not None]
+
+    def _run(self) -> None:
+        """Write queued reports until the collector is stopped and the queue is empty"""
+
+        while True:
+            now = datetime.now()
+            if self._last_pruned is None or now - self._last_pruned >= self.prune_interval:
+                try:
+                    self.prune(now)
+
+                except Exception as exception:  # pragma: no cover
+                    self._last_pruned = now
+                    print(f'Error pruning usage reports: {exception}', file=sys.stderr)
+
+            batch = self._next_batch(timeout=0.5)
+            if not batch:
+                if self._thread is None:
+                    return
+
+                continue
+
+            try:
+                self.write(batch)
+
+            except Exception as exception:  # pragma: no cover
+                self.failed += len(batch)
+                print(f'Error writing usage reports: {exception}', file=sys.stderr)
+
+    def start(self) -> None:
+        """Start writing reports from a background thread"""
+
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._thread = Thread(target=self._run, name='usage-collector', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Write any remaining reports and stop the background thread
+
+        Args:
+            timeout: Maximum number of seconds to wait for queued reports to be written
+        """
+
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return
+
+        # Wake the writer thread so it notices the collector has stopped without waiting for a timeout
+        try:
+            self._queue.put_nowait(None)
+
+        except Full:
+            pass
+
+        thread.join(timeout)
+
+
+class CollectorRequestHandler(BaseHTTPRequestHandler):
+    """Accept usage reports posted to ``/report`` and serve statistics from ``/metrics``"""
+
+    # Persistent connections let agents reuse a single connection for every report
+    protocol_version = 'HTTP/1.1'
+
+    def _respond(self, status: int, body: dict) -> None:
+        """Send a JSON response"""
+
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_POST(self) -> None:
+        """Validate and queue a usage report"""
+
+        if self.path != '/report':
+            self._respond(404, {'error': 'not found'})
+            return
+
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_REQUEST_SIZE:
+            self.close_connection = True
+            self._respond(413, {'error': 'report too large'})
+            return
+
+        try:
+            report = parse_report(json.loads(self.rfile.read(length)))
+
+        except ValueError as exception:
+            self._respond(400, {'error': str(exception)})
+            return
+
+        if not self.server.collector.submit(report):
+            self._respond(503, {'error': 'collector queue is full'})
+            return
+
+        self._respond(202, {'queued': True})
+
+    def do_GET(self) -> None:
+        """Return collector statistics"""
+
+        if self.path != '/metrics':
+            self._respond(404, {'error': 'not found'})
+            return
+
+        self._respond(200, self.server.collector.metrics())
+
+    def log_message(self, format: str, *args) -> None:
+        """Suppress per request logging"""
+
+
+class CollectorServer(ThreadingMixIn, HTTPServer):
+    """HTTP server handling each agent connection in a separate thread"""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address: Tuple[str, int], collector: UsageCollector) -> None:
+        """Listen for usage reports on the given address
+
+        Args:
+            address: Host and port to listen on (port zero selects a free port)
+            collector: The collector used to write received reports
+        """
+
+        self.collector = collector
+        super().__init__(address, CollectorRequestHandler)
+
+
+class CollectorAgent:
+    """Push usage reports from a single node to a collector server
+
+    Reports are sent over a single persistent connection. Enforcement events
+    are retained until a report containing them is accepted, so events are
+    not lost while the collector is briefly unavailable. Reports can be sent
+    directly with ``report``, or queued with ``submit`` and sent from a
+    background thread.
+    """
+
+    def __init__(
+            self,
+            url: str,
+            node: Optional[str] = None,
+            timeout: float = 2,
+            max_pending_events: int = 1000,
+            max_pending_reports: int = 10
+    ) -> None:
+        """Configure the collector to report to
+
+        Args:
+            url: Base URL of the collector server, e.g. ``http://collector:8650``
+            node: Name of the reporting node (defaults to the current hostname)
+            timeout: Seconds to wait for the collector before giving up on a report
+            max_pending_events: Maximum number of unsent events retained between reports
+            max_pending_reports: Maximum number of queued reports before new reports are dropped
+        """
+
+        parsed = urlsplit(url)
+        self._connection_class = HTTPSConnection if parsed.scheme == 'https' else HTTPConnection
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.path = parsed.path.rstrip('/') + '/report'
+        self.node = node or gethostname()
+        self.timeout = timeout
+
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+
+        self._events: deque = deque(maxlen=max_pending_events)
+        self._events_lock = Lock()
+        self._connection: Optional[HTTPConnection] = None
+        self._queue: Queue = Queue(max_pending_reports)
+        self._thread: Optional[Thread] = None
+
+    def add_event(
+            self, user: str, memory: int, percentage: float, limit: float, event_time: Optional[float] = None
+    ) -> None:
+        """Queue an enforcement event to include in the next report
+
+        Args:
+            user: Name of the user whose processes were terminated
+            memory: Memory usage of the user in megabytes
+            percentage: Memory usage as a percentage of system memory
+            limit: The memory limit that was exceeded
+            event_time: When the event occurred in seconds since the epoch (defaults to now)
+        """
+
+        with self._events_lock:
+            self._events.append(dict(
+                user=user, memory=memory, percentage=percentage, limit=limit,
+                time=time.time() if event_time is None else event_time
+            ))
+
+    def report(self, usage: Iterable[dict]) -> bool:
+        """Send per user usage and any pending events to the collector
+
+        Args:
+            usage: Dictionaries with the keys ``user``, ``cpu``, ``memory``, ``percentage``, and ``processes``
+
+        Returns:
+            Whether the collector accepted the report
+        """
+
+        with self._events_lock:
+            events = list(self._events)
+
+        body = json.dumps(dict(node=self.node, time=time.time(), usage=list(usage), events=events)).encode()
+        headers = {'Content-Type': 'application/json'}
+
+        status = None
+        for attempt in range(2):
+            try:
+                if self._connection is None:
+                    self._connection = self._connection_class(self.host, self.port, timeout=self.timeout)
+
+                self._connection.request('POST', self.path, body, headers)
+                response = self._connection.getresponse()
+                response.read()
+                status = response.status
+                break
+
+            # The server may have closed an idle persistent connection, so reconnect and retry once
+            except (OSError, HTTPException) as exception:
+                self.close()
+                if attempt:
+                    self._record_failure(f'Could not reach collector: {exception}')
+                    return False
+
+        if status != 202:
+            self._record_failure(f'Collector rejected usage report with status {status}')
+            return False
+
+        with self._events_lock:
+            for _ in events:
+                self._events.popleft()
+
+        self.sent += 1
+        self.failed = 0
+        return True
+
+    def _record_failure(self, message: str) -> None:
+        """Count a failed report, only printing the first in a series of consecutive failures"""
+
+        if not self.failed:
+            print(message, file=sys.stderr)
+
+        self.failed += 1
+
+    def close(self) -> None:
+        """Close the connection to the collector"""
+
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def submit(self, usage: Iterable[dict]) -> bool:
+        """Queue a report to be sent by the background thread without waiting for the collector
+
+        Pending events are attached when the report is sent rather than when it is queued.
+
+        Args:
+            usage: Dictionaries with the keys ``user``, ``cpu``, ``memory``, ``percentage``, and ``processes``
+
+        Returns:
+            Whether the report was queued, or ``False`` if too many reports are already waiting
+        """
+
+        try:
+            self._queue.put_nowait(list(usage))
+
+        except Full:
+            self.dropped += 1
+            return False
+
+        return True
+
+    def _run(self) -> None:
+        """Send queued reports until the agent is stopped and the queue is empty"""
+
+        while True:
+            try:
+                usage = self._queue.get(timeout=0.5)
+
+            except Empty:
+                if self._thread is None:
+                    break
+
+                continue
+
+            # Reports queued before the agent was stopped are sent before the wake up signal
+            if usage is None:
+                if self._thread is None:
+                    break
+
+                continue
+
+            try:
+                self.report(usage)
+
+            except Exception as exception:  # pragma: no cover
+                self._record_failure(f'Error sending usage report: {exception}')
+
+        self.close()
+
+    def start(self) -> None:
+        """Start sending queued reports from a background thread"""
+
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._thread = Thread(target=self._run, name='collector-agent', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Send any remaining reports and stop the background thread
+
+        Args:
+            timeout: Maximum number of seconds to wait for queued reports to be sent
+        """
+
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return
+
+        # Wake the sender thread so it notices the agent has stopped without waiting for a timeout
+        try:
+            self._queue.put_nowait(None)
+
+        except Full:
+            pass
+
+        thread.join(timeout)
@@ -0,0 +1,283 @@
+"""The ``history`` module records per user usage over time.
+
+Usage from successive scans is summarized in memory into fixed width time
+intervals at several resolutions. Only completed intervals are written to
+the ``usage_history`` table, so the number of database writes depends on the
+resolutions rather than the scan frequency. Each resolution has its own
+retention period, after which records are pruned so storage stays bounded.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.sql import Select
+
+from node_nanny.orm import DBConnection, UsageHistory, User, upsert_users
+
+# Supported resolutions in seconds mapped to how long records are retained
+RETENTION: Dict[int, timedelta] = {
+    10: timedelta(days=2),
+    60: timedelta(days=30),
+    3600: timedelta(days=730),
+}
+
+
+class _Interval:
+    """Running summary of the usage of a single user within one time interval"""
+
+    __slots__ = ('start', 'samples', 'cpu', 'memory', 'percentage')
+
+    def __init__(self, start: float) -> None:
+        self.start = start
+        self.samples = 0
+        self.cpu = 0.0
+        self.memory = 0
+        self.percentage = 0.0
+
+    def add(self, cpu: float, memory: int, percentage: float) -> None:
+        self.samples += 1
+        self.cpu += cpu
+        self.memory = max(self.memory, memory)
+        self.percentage = max(self.percentage, percentage)
+
+
+class UsageRollup:
+    """Downsample per user usage into fixed width time intervals
+
+    Intervals are aligned to multiples of their resolution since the epoch.
+    Each completed interval records the mean CPU usage and the peak memory
+    usage of a user over all samples within it.
+    """
+
+    def __init__(self, node: str, resolutions: Iterable[int] = tuple(RETENTION)) -> None:
+        """Summarize usage on the given node
+
+        Args:
+            node: Name of the node the usage was measured on
+            resolutions: Interval lengths in seconds
+        """
+
+        self.node = node
+        self._intervals: Dict[int, Dict[str, _Interval]] = {resolution: dict() for resolution in resolutions}
+        self._current: Dict[int, float] = dict()
+
+    def _close(self, resolution: int, user: str, interval: _Interval) -> dict:
+        """Return a completed interval as a ``usage_history`` record"""
+
+        return dict(
+            name=user,
+            node=self.node,
+            resolution=resolution,
+            time=datetime.fromtimestamp(interval.start),
+            samples=interval.samples,
+            cpu=interval.cpu / interval.samples,
+            memory=interval.memory,
+            percentage=interval.percentage
+        )
+
+    def add(self, usage: Iterable[Tuple[str, float, int, float]], now: datetime) -> List[dict]:
+        """Add a usage sample and return any intervals completed before it
+
+        Args:
+            usage: Tuples of username, CPU percentage, memory in megabytes, and memory percentage
+            now: When the sample was taken
+
+        Returns:
+            Completed intervals as dictionaries with the ``usage_history`` columns and a ``name`` key
+        """
+
+        usage = list(usage)
+        timestamp = now.timestamp()
+        completed = []
+        for resolution, intervals in self._intervals.items():
+            start = timestamp - timestamp % resolution
+
+            # Every open interval started at the same time, so they are only checked once the interval changes
+            if self._current.get(resolution) != start:
+                for user, interval in intervals.items():
+                    completed.append(self._close(resolution, user, interval))
+
+                intervals.clear()
+                self._current[resolution] = start
+
+            for user, cpu, memory, percentage in usage:
+                interval = intervals.get(user)
+                if interval is None:
+                    interval = intervals[user] = _Interval(start)
+
+                interval.add(cpu, memory, percentage)
+
+        return completed
+
+    def flush(self) -> List[dict]:
+        """Close and return all open intervals, including those that are not yet complete"""
+
+        completed = [
+            self._close(resolution, user, interval)
+            for resolution, intervals in self._intervals.items() for user, interval in intervals.items()
+        ]
+
+        for intervals in self._intervals.values():
+            intervals.clear()
+
+        self._current.clear()
+        return completed
+
+
+class HistoryRecorder:
+    """Write downsampled usage history to the application database and prune old records"""
+
+    def __init__(
+            self,
+            node: str,
+            retention: Optional[Dict[int, timedelta]] = None,
+            prune_interval: timedelta = timedelta(hours=1)
+    ) -> None:
+        """Record usage history for the given node
+
+        Args:
+            node: Name of the node the usage was measured on
+            retention: How long records are kept, keyed by resolution in seconds
+            prune_interval: Minimum time between deleting expired records
+        """
+
+        self.retention = RETENTION if retention is None else retention
+        self.prune_interval = prune_interval
+        self._rollup = UsageRollup(node, self.retention)
+        self._last_pruned: Optional[datetime] = None
+
+    @staticmethod
+    def write(records: List[dict]) -> None:
+        """Write completed intervals to the database in a single transaction
+
+        Args:
+            records: Intervals as returned by ``UsageRollup``
+        """
+
+        if not records:
+            return
+
+        with DBConnection.session() as session:
+            names = {record['name'] for record in records}
+            upsert_users(session, names)
+            user_ids = dict(session.execute(select(User.name, User.id).where(User.name.in_(names))).all())
+            session.execute(insert(UsageHistory), [
+                {**{key: value for key, value in record.items() if key != 'name'}, 'user_id': user_ids[record['name']]}
+                for record in records
+            ])
+            session.commit()
+
+    def prune(self, now: datetime) -> int:
+        """Delete records older than the retention period of their resolution
+
+        Args:
+            now: The current time
+
+        Returns:
+            The number of deleted records
+        """
+
+        deleted = 0
+        with DBConnection.session() as session:
+            for resolution, retention in self.retention.items():
+                result = session.execute(
+                    delete(UsageHistory)
+                    .where(UsageHistory.resolution == resolution)
+                    .where(UsageHistory.time < now - retention)
+                )
+                deleted += result.rowcount
+
+            session.commit()
+
+        self._last_pruned = now
+        return deleted
+
+    def record(self, usage: Iterable[Tuple[str, float, int, float]], now: datetime) -> int:
+        """Add a usage sample, writing completed intervals and pruning expired records as needed
+
+        Args:
+            usage: Tuples of username, CPU percentage, memory in megabytes, and memory percentage
+            now: When the sample was taken
+
+        Returns:
+            The number of records written
+        """
+
+        completed = self._rollup.add(usage, now)
+        self.write(completed)
+        if self._last_pruned is None or now - self._last_pruned >= self.prune_interval:
+            self.prune(now)
+
+        return len(completed)
+
+    def flush(self) -> int:
+        """Write all open intervals, including those that are not yet complete
+
+        Returns:
+            The number of records written
+        """
+
+        completed = self._rollup.flush()
+        self.write(completed)
+        return len(completed)
+
+
+def select_resolution(since: Optional[datetime], now: datetime, retention: Dict[int, timedelta] = RETENTION) -> int:
+    """Return the finest resolution whose records cover the period since the given time
+
+    Args:
+        since: Start of the period of interest, or ``None`` for all available history
+        now: The current time
+        retention: How long records are kept, keyed by resolution in seconds
+
+    Returns:
+        A resolution in seconds
+    """
+
+    if since is not None:
+        for resolution in sorted(retention):
+            if now - retention[resolution] <= since:
+                return resolution
+
+    return max(retention, key=retention.get)
+
+
+def usage_history_query(
+        username: str,
+        resolution: int,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        node: Optional[str] = None
+) -> Select:
+    """Return a query for the usage history of a user at a single resolution, oldest first
+
+    Args:
+        username: Name of the user
+        resolution: Interval length in seconds
+        since: Only include intervals starting at or after this time
+        until: Only include intervals starting before this time
+        node: Only include usage on the given node
+
+    Returns:
+        A select statement with ``node``, ``time``, ``samples``, ``cpu``, ``memory`` and ``percentage`` columns
+    """
+
+    query = select(
+        UsageHistory.node, UsageHistory.time, UsageHistory.samples,
+        UsageHistory.cpu, UsageHistory.memory, UsageHistory.percentage
+    ).join(User) \
+        .where(User.name == username) \
+        .where(UsageHistory.resolution == resolution) \
+        .order_by(UsageHistory.time, UsageHistory.node)
+
+    if since is not None:
+        query = query.where(UsageHistory.time >= since)
+
+    if until is not None:
+        query = query.where(UsageHistory.time < until)
+
+    if node is not None:
+        query = query.where(UsageHistory.node == node)
+
+    return query
@@ -0,0 +1,269 @@
+"""The ``kill`` module terminates every process owned by a user.
+
+Signalling processes one at a time in an arbitrary order races against
+jobs that fork rapidly, since children created during the loop are never
+signalled. Instead, the user's processes are identified from a single
+``/proc`` snapshot and stopped before they are killed, whole process groups
+are signalled at once, and a user slice is killed through ``cgroup.kill``
+when available. The user's processes are then re-scanned until none remain.
+"""
+
+import os
+import signal
+import time
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Set
+
+from node_nanny.accounts import UserCache
+from node_nanny.cgroup import CgroupReader
+from node_nanny.proc import ProcReader, ProcessSnapshot
+
+
+class KillResult(NamedTuple):
+    """Summary of an attempt to terminate a user's processes
+
+    Attributes:
+        uid: The ID of the user whose processes were terminated
+        method: ``cgroup`` if the user slice was killed, otherwise ``signal``
+        signalled: Number of processes found and signalled
+        rounds: Number of re-scans needed before no processes remained
+        remaining: Number of processes still running when the timeout expired
+        latency: Seconds from the start of the kill until no processes remained
+    """
+
+    uid: int
+    method: str
+    signalled: int
+    rounds: int
+    remaining: int
+    latency: float
+
+
+class KillPlan(NamedTuple):
+    """The signals needed to terminate a user's processes
+
+    Attributes:
+        groups: IDs of process groups owned entirely by the user, signalled as a whole
+        individual: IDs of the remaining processes, ordered with parents before their children
+        targets: Number of live processes owned by the user
+    """
+
+    groups: List[int]
+    individual: List[int]
+    targets: int
+
+
+def resolve_uid(username: str) -> int:
+    """Return the user ID for a given username
+
+    Following the convention used by ``ProcReader.username``, users without
+    a matching account are identified by their ID as a string.
+
+    Args:
+        username: The name of the user
+
+    Returns:
+        The corresponding user ID
+
+    Raises:
+        ValueError: If the username does not match an account or a numeric ID
+    """
+
+    uid = UserCache.uid(username)
+    if uid is not None:
+        return uid
+
+    if username.isdigit():
+        return int(username)
+
+    raise ValueError(f'No such user {username}')
+
+
+def process_tree(snapshot: ProcessSnapshot, pids: Set[int]) -> List[int]:
+    """Order a set of processes so parents are always listed before their children
+
+    Args:
+        snapshot: Snapshot containing the processes
+        pids: IDs of the processes to order
+
+    Returns:
+        Process IDs in breadth first order from the roots of the tree
+    """
+
+    children: Dict[int, List[int]] = defaultdict(list)
+    roots = []
+    for pid, ppid in zip(snapshot.pid, snapshot.ppid):
+        if pid not in pids:
+            continue
+
+        if ppid in pids:
+            children[ppid].append(pid)
+
+        else:
+            roots.append(pid)
+
+    ordered = roots
+    for pid in ordered:
+        ordered.extend(children.pop(pid, ()))
+
+    return ordered
+
+
+class ProcessKiller:
+    """Terminate all processes owned by a user and verify they have exited"""
+
+    def __init__(
+            self,
+            reader: Optional[ProcReader] = None,
+            cgroups: Optional[CgroupReader] = None,
+            timeout: float = 5,
+            poll_interval: float = 0.01
+    ) -> None:
+        """Configure how processes are found and terminated
+
+        Args:
+            reader: Reader used to find processes (defaults to reading ``/proc``)
+            cgroups: Optionally kill user slices through this cgroup reader where supported
+            timeout: Maximum number of seconds to spend waiting for processes to exit
+            poll_interval: Seconds between re-scans of the user's processes
+        """
+
+        self.reader = reader or ProcReader()
+        self.cgroups = cgroups
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+
+    @staticmethod
+    def _signal(pid: int, signum: int, group: bool = False) -> None:
+        """Send a signal to a process or process group, ignoring processes that have already exited"""
+
+        try:
+            if group:
+                os.killpg(pid, signum)
+
+            else:
+                os.kill(pid, signum)
+
+        except ProcessLookupError:
+            pass
+
+    def _targets(self, uid: int, session: Optional[int]) -> List[int]:
+        """Return the IDs of live processes owned by the user, optionally within a single session"""
+
+        own_pid = os.getpid()
+        pids = [pid for pid in self.reader.user_pids(uid) if pid != own_pid]
+        if session is None:
+            return pids
+
+        targets = []
+        for pid in pids:
+            try:
+                if self.reader.read_process(pid)[3] == session:
+                    targets.append(pid)
+
+            except (FileNotFoundError, ProcessLookupError):  # pragma: no cover
+                pass
+
+        return targets
+
+    def plan(self, uid: int, session: Optional[int] = None, snapshot: Optional[ProcessSnapshot] = None) -> KillPlan:
+        """Decide how to signal the user's processes found in a single snapshot
+
+        Process groups containing only the user's processes are signalled as
+        a whole, which also reaches children forked into the group after the
+        snapshot was taken. Remaining processes are signalled individually
+        with parents ahead of their children.
+
+        Args:
+            uid: The ID of the user
+            session: Optionally only include processes in the given session
+            snapshot: A recent snapshot of the whole process table, taken from ``reader`` if not given
+
+        Returns:
+            The process groups and individual processes to signal
+        """
+
+        if snapshot is None:
+            snapshot = self.reader.snapshot()
+
+        own_pid = os.getpid()
+        rows = [
+            row for row, (pid, owner) in enumerate(zip(snapshot.pid, snapshot.uid))
+            if owner == uid and pid != own_pid and (session is None or snapshot.session[row] == session)
+        ]
+        targets = {snapshot.pid[row] for row in rows if snapshot.status[row] not in ('zombie', 'dead')}
+
+        members: Dict[int, Set[int]] = defaultdict(set)
+        for pid, pgrp in zip(snapshot.pid, snapshot.pgrp):
+            members[pgrp].add(pid)
+
+        # Processes of other users, including zombies, never share a group that is signalled as a whole
+        owned_pids = {snapshot.pid[row] for row in rows}
+        groups = {snapshot.pgrp[row] for row in rows}
+        groups = [pgrp for pgrp in groups if pgrp > 1 and members[pgrp] <= owned_pids]
+        grouped = set().union(*(members[pgrp] for pgrp in groups))
+        individual = [pid for pid in process_tree(snapshot, targets) if pid not in grouped]
+        return KillPlan(groups=groups, individual=individual, targets=len(targets))
+
+    def _signal_tree(self, uid: int, session: Optional[int], snapshot: Optional[ProcessSnapshot]) -> int:
+        """Stop and then kill the user's processes as planned by the ``plan`` method
+
+        Returns:
+            The number of processes signalled
+        """
+
+        plan = self.plan(uid, session, snapshot)
+
+        # Stopped processes cannot fork, so nothing escapes between signalling one process and the next
+        for signum in (signal.SIGSTOP, signal.SIGKILL):
+            for pgrp in plan.groups:
+                self._signal(pgrp, signum, group=True)
+
+            for pid in plan.individual:
+                self._signal(pid, signum)
+
+        return plan.targets
+
+    def kill(self, uid: int, session: Optional[int] = None, snapshot: Optional[ProcessSnapshot] = None) -> KillResult:
+        """Terminate all processes owned by a user and wait for them to exit
+
+        Args:
+            uid: The ID of the user
+            session: Optionally only terminate processes in the given session
+            snapshot: A recent snapshot of the whole process table to plan signals from (see ``plan``)
+
+        Returns:
+            A summary of the terminated processes and how long they took to exit
+        """
+
+        start = time.perf_counter()
+        method, signalled = 'signal', 0
+        if session is None and self.cgroups is not None:
+            slice_pids = self.cgroups.pids(uid)
+            if self.cgroups.kill(uid):
+                method, signalled = 'cgroup', len(slice_pids)
+
+        if method == 'signal':
+            signalled = self._signal_tree(uid, session, snapshot)
+
+        # Only the target user's processes are re-scanned, catching any that were forked during the kill
+        rounds = 0
+        deadline = start + self.timeout
+        remaining = self._targets(uid, session)
+        while remaining and time.perf_counter() < deadline:
+            rounds += 1
+            for signum in (signal.SIGSTOP, signal.SIGKILL):
+                for pid in remaining:
+                    self._signal(pid, signum)
+
+            time.sleep(self.poll_interval)
+            remaining = self._targets(uid, session)
+
+        return KillResult(
+            uid=uid,
+            method=method,
+            signalled=signalled,
+            rounds=rounds,
+            remaining=len(remaining),
+            latency=time.perf_counter() - start
+        )
@@ -0,0 +1,445 @@
+"""The ``metrics`` module records application metrics and exports them in the
+Prometheus text format.
+
+Metrics are held in memory by a ``MetricsRegistry`` and updated in place,
+so recording a value costs a dictionary lookup and, for histograms, a
+binary search over the bucket boundaries. Metrics are exported by a
+``MetricsExporter``, which periodically writes a file for the node exporter
+textfile collector, serves a local HTTP endpoint, or both. Components that
+already keep their own statistics, such as the ``OutboxSender``, are
+included by registering a callback that is only evaluated on export.
+"""
+
+import os
+import sys
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Upper bounds of the default histogram buckets in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    """Return label names and values in the Prometheus text format"""
+
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    """Return a sample value in the Prometheus text format"""
+
+    if value == float('inf'):
+        return '+Inf'
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base class for metrics with values for each combination of label values"""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()) -> None:
+        """Create a metric
+
+        Args:
+            name: Name of the metric
+            documentation: Description included in the exported metrics
+            labels: Names of the labels distinguishing values of the metric
+        """
+
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], object] = dict()
+        self._lock = Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        """Return the label values for the given keyword arguments in a consistent order"""
+
+        return tuple([str(labels[name]) for name in self.labels]) if self.labels else ()
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        """Yield the name suffix, formatted labels, and value of each sample"""
+
+        with self._lock:
+            items = list(self._values.items())
+
+        for key, value in items:
+            yield '', _format_labels(self.labels, key), value
+
+    def render(self) -> List[str]:
+        """Return the metric in the Prometheus text format"""
+
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for suffix, labels, value in self.samples():
+            lines.append(f'{self.name}{suffix}{labels} {_format_value(value)}')
+
+        return lines
+
+
+class Counter(_Metric):
+    """A value that only increases, such as the number of processes killed"""
+
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """Increase the counter
+
+        Args:
+            amount: Amount to increase the counter by
+            **labels: Values for each of the metric's labels
+        """
+
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        """Return the current value of the counter"""
+
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """A value that may go up or down, such as the number of running processes"""
+
+    kind = 'gauge'
+
+    def set(self, value: float, **labels: str) -> None:
+        """Set the gauge to a given value
+
+        Args:
+            value: The new value
+            **labels: Values for each of the metric's labels
+        """
+
+        self._values[self._key(labels)] = value
+
+    def value(self, **labels: str) -> float:
+        """Return the current value of the gauge"""
+
+        return self._values.get(self._key(labels), 0)
+
+
+class _Timer:
+    """Context manager recording the time spent within it in a histogram"""
+
+    __slots__ = ('_histogram', '_key', '_start')
+
+    def __init__(self, histogram: 'Histogram', key: Tuple[str, ...]) -> None:
+        self._histogram = histogram
+        self._key = key
+
+    def __enter__(self) -> '_Timer':
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._histogram._observe(self._key, time.perf_counter() - self._start)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values, such as the duration of each scan stage"""
+
+    kind = 'histogram'
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labels: Tuple[str, ...] = (),
+            buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> None:
+        """Create a histogram
+
+        Args:
+            name: Name of the metric
+            documentation: Description included in the exported metrics
+            labels: Names of the labels distinguishing values of the metric
+            buckets: Upper bounds of the histogram buckets in increasing order
+        """
+
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Record a single observation
+
+        Args:
+            value: The observed value
+            **labels: Values for each of the metric's labels
+        """
+
+        self._observe(self._key(labels), value)
+
+    def _observe(self, key: Tuple[str, ...], value: float) -> None:
+        """Record a single observation for the given label values"""
+
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per bucket counts (plus one for values above every bucket), total, and count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels: str) -> _Timer:
+        """Return a context manager that records the time spent within it
+
+        Args:
+            **labels: Values for each of the metric's labels
+        """
+
+        return _Timer(self, self._key(labels))
+
+    def count(self, **labels: str) -> int:
+        """Return the number of observations"""
+
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                yield '_bucket', _format_labels(self.labels, key, f'le="{_format_value(bound)}"'), cumulative
+
+            yield '_sum', _format_labels(self.labels, key), total
+            yield '_count', _format_labels(self.labels, key), count
+
+
+class MetricsRegistry:
+    """Collection of metrics exported together"""
+
+    def __init__(self) -> None:
+        """Create an empty registry"""
+
+        self._metrics: Dict[str, _Metric] = dict()
+        self._callbacks: Dict[str, Callable[[], Dict[str, float]]] = dict()
+
+    def _add(self, metric: _Metric) -> _Metric:
+        """Register a metric, returning the existing metric if one is already registered with the same name"""
+
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labels: Tuple[str, ...] = ()) -> Counter:
+        """Return a new or existing counter (see the ``Counter`` class for arguments)"""
+
+        return self._add(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Tuple[str, ...] = ()) -> Gauge:
+        """Return a new or existing gauge (see the ``Gauge`` class for arguments)"""
+
+        return self._add(Gauge(name, documentation, labels))
+
+    def histogram(
+            self,
+            name: str,
+            documentation: str,
+            labels: Tuple[str, ...] = (),
+            buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        """Return a new or existing histogram (see the ``Histogram`` class for arguments)"""
+
+        return self._add(Histogram(name, documentation, labels, buckets))
+
+    def register_callback(self, prefix: str, callback: Callable[[], Dict[str, float]]) -> None:
+        """Export statistics returned by a callback as gauges
+
+        The callback is only evaluated when metrics are exported.
+
+        Args:
+            prefix: Prefix added to each key returned by the callback to form a metric name
+            callback: Function returning a dictionary of numeric statistics
+        """
+
+        self._callbacks[prefix] = callback
+
+    def unregister_callback(self, prefix: str) -> None:
+        """Stop exporting statistics registered under the given prefix"""
+
+        self._callbacks.pop(prefix, None)
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text format"""
+
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+
+        for prefix, callback in list(self._callbacks.items()):
+            try:
+                values = callback()
+
+            # Exporting the remaining metrics is more useful than failing outright
+            except Exception as exception:
+                print(f'Could not collect {prefix} metrics: {exception}', file=sys.stderr)
+                continue
+
+            for key, value in values.items():
+                lines.append(f'# TYPE {prefix}_{key} gauge')
+                lines.append(f'{prefix}_{key} {_format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path: str) -> None:
+        """Write all metrics to a file for the node exporter textfile collector
+
+        The file is replaced atomically so partially written files are never read.
+
+        Args:
+            path: Path of the output file, which should end in ``.prom``
+        """
+
+        temporary_path = f'{path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'w') as outfile:
+            outfile.write(self.render())
+
+        os.replace(temporary_path, path)
+
+
+# Registry used throughout the application
+REGISTRY = MetricsRegistry()
+
+# Shared by every component that times part of a scan
+STAGE_SECONDS = REGISTRY.histogram(
+    'node_nanny_stage_seconds', 'Time spent in each stage of a scan in seconds', ('stage',))
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Serve the metrics of a registry from ``/metrics``"""
+
+    def do_GET(self) -> None:
+        """Return all metrics in the Prometheus text format"""
+
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+
+        content = self.server.registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format: str, *args) -> None:
+        """Suppress per request logging"""
+
+
+class MetricsServer(ThreadingMixIn, HTTPServer):
+    """HTTP server exposing the metrics of a registry"""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], registry: MetricsRegistry = REGISTRY) -> None:
+        """Serve metrics on the given address
+
+        Args:
+            address: Host and port to listen on (port zero selects a free port)
+            registry: The registry to export
+        """
+
+        self.registry = registry
+        super().__init__(address, MetricsRequestHandler)
+
+
+class MetricsExporter:
+    """Export metrics to a textfile collector file and/or a local HTTP endpoint in the background"""
+
+    def __init__(
+            self,
+            path: Optional[str] = None,
+            port: Optional[int] = None,
+            host: str = '127.0.0.1',
+            interval: float = 15,
+            callbacks: Optional[Dict[str, Callable[[], Dict[str, float]]]] = None,
+            registry: MetricsRegistry = REGISTRY
+    ) -> None:
+        """Configure where metrics are exported to
+
+        Args:
+            path: Write metrics to this file every ``interval`` seconds
+            port: Serve metrics over HTTP on this port
+            host: Address the HTTP endpoint listens on
+            interval: Seconds between writes of the metrics file
+            callbacks: Statistics of other components exported while running, keyed by metric name prefix
+            registry: The registry to export
+        """
+
+        self.path = path
+        self.port = port
+        self.host = host
+        self.interval = interval
+        self.callbacks = callbacks or dict()
+        self.registry = registry
+        self.server: Optional[MetricsServer] = None
+        self._stop = Event()
+        self._threads: List[Thread] = []
+
+    def _write(self) -> None:
+        """Write the metrics file, reporting rather than raising errors"""
+
+        try:
+            self.registry.write_textfile(self.path)
+
+        except OSError as exception:
+            print(f'Could not write metrics to {self.path}: {exception}', file=sys.stderr)
+
+    def _run(self) -> None:
+        """Write the metrics file until the exporter is stopped"""
+
+        while not self._stop.wait(self.interval):
+            self._write()
+
+    def start(self) -> None:
+        """Start exporting metrics in background threads"""
+
+        self._stop.clear()
+        for prefix, callback in self.callbacks.items():
+            self.registry.register_callback(prefix, callback)
+
+        if self.port is not None:
+            self.server = MetricsServer((self.host, self.port), self.registry)
+            self._threads.append(Thread(target=self.server.serve_forever, name='metrics-server', daemon=True))
+
+        if self.path is not None:
+            self._threads.append(Thread(target=self._run, name='metrics-writer', daemon=True))
+
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        """Stop exporting metrics, writing the metrics file a final time"""
+
+        self._stop.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+        for thread in self._threads:
+            thread.join()
+
+        self._threads = []
+        if self.path is not None:
+            self._write()
+
+        for prefix in self.callbacks:
+            self.registry.unregister_callback(prefix)
@@ -1,14 +1,24 @@
 """Object relational mapper for dealing with the application database."""
 
-from typing import Callable
+from importlib import import_module
+from threading import RLock
+from typing import Callable, Collection, Optional
 
-from sqlalchemy import Boolean, Column, Integer, String, DateTime, create_engine, ForeignKey, MetaData
+from sqlalchemy import (
+    Boolean, Column, Float, Integer, String, DateTime, ForeignKey, Index, MetaData,
+    create_engine, delete, func, insert, inspect, select
+)
 from sqlalchemy.engine import Engine, Connection
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker, Session
+from sqlalchemy.pool import StaticPool
 
 Base = declarative_base()
 
+# Increment whenever table or index definitions change so existing databases are upgraded on connection
+SCHEMA_VERSION = 3
+
 
 class User(Base):
     """User account data
@@ -20,6 +30,8 @@ class User(Base):
     Relationships:
       - notifications (Notifications): One to many
       - whitelists        (Whitelist): One to many
+      - usage_reports   (UsageReport): One to many
+      - usage_history  (UsageHistory): One to many
     """
 
     __tablename__ = 'user'
@@ -29,6 +41,8 @@ class User(Base):
 
     notifications = relationship('Notification', back_populates='user', cascade="all,delete")
     whitelists = relationship('Whitelist', back_populates='user', cascade="all,delete")
+    usage_reports = relationship('UsageReport', back_populates='user', cascade="all,delete")
+    usage_history = relationship('UsageHistory', back_populates='user', cascade="all,delete")
 
 
 class Notification(Base):
@@ -37,7 +51,7 @@ class Notification(Base):
     Table Fields:
       - id         (Integer): Primary key for this table
       - time      (Datetime): Date and time of the notification
-      - memory     (Integer): Total memory usage
+      - memory     (Integer): Total memory usage in megabytes
       - percentage (Integer): Memory usage as a percentage of system memory
       - user_id    (Integer): Foreign key for the ``User.id`` table
       - node        (String): The name of the node
@@ -59,6 +73,10 @@ class Notification(Base):
 
     user = relationship('User', back_populates='notifications')
 
+    __table_args__ = (
+        Index('ix_notification_user_time', user_id, time),
+    )
+
 
 class Whitelist(Base):
     """Whitelist of users whose jobs should not be killed
@@ -84,6 +102,165 @@ class Whitelist(Base):
 
     user = relationship('User', back_populates='whitelists')
 
+    __table_args__ = (
+        Index('ix_whitelist_node_end_user', node, end_time, user_id),
+        Index('ix_whitelist_user_end', user_id, end_time),
+
+        # Each user has at most one global entry and one entry per node
+        Index(
+            'ux_whitelist_user_node', user_id, node, unique=True,
+            sqlite_where=global_whitelist.is_(False), postgresql_where=global_whitelist.is_(False)),
+        Index(
+            'ux_whitelist_user_global', user_id, unique=True,
+            sqlite_where=global_whitelist.is_(True), postgresql_where=global_whitelist.is_(True)),
+    )
+
+
+class OutboxMessage(Base):
+    """Queue of outgoing email messages waiting to be sent
+
+    Table Fields:
+      - id               (Integer): Primary key for this table
+      - sender            (String): Email address the message is sent from
+      - recipient         (String): Email address the message is sent to
+      - subject           (String): Subject line of the message
+      - body              (String): Body text of the message
+      - created         (Datetime): When the message was queued
+      - next_attempt    (Datetime): Earliest time to attempt sending the message
+      - attempts         (Integer): Number of failed attempts to send the message
+      - sent_time       (Datetime): When the message was sent, or null if not yet sent
+      - error             (String): Error from the most recent failed attempt
+    """
+
+    __tablename__ = 'outbox'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    sender = Column(String, nullable=False)
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(String, nullable=False)
+    created = Column(DateTime, nullable=False)
+    next_attempt = Column(DateTime, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    sent_time = Column(DateTime)
+    error = Column(String)
+
+    __table_args__ = (
+        Index('ix_outbox_pending', sent_time, next_attempt),
+        Index('ix_outbox_recipient_created', recipient, created),
+    )
+
+
+class UsageReport(Base):
+    """Per user usage summaries reported by monitored nodes
+
+    Table Fields:
+      - id          (Integer): Primary key for this table
+      - user_id     (Integer): Foreign key for the ``User.id`` table
+      - node         (String): The name of the reporting node
+      - time       (Datetime): When the usage was measured on the node
+      - cpu           (Float): Total CPU usage as a percentage of a single CPU
+      - memory      (Integer): Total memory usage in megabytes
+      - percentage    (Float): Memory usage as a percentage of system memory
+      - processes   (Integer): Number of running processes
+
+    Relationships:
+      - user (User): Many to one
+    """
+
+    __tablename__ = 'usage_report'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey(User.id))
+    node = Column(String, nullable=False)
+    time = Column(DateTime, nullable=False)
+    cpu = Column(Float, nullable=False)
+    memory = Column(Integer, nullable=False)
+    percentage = Column(Float, nullable=False)
+    processes = Column(Integer, nullable=False)
+
+    user = relationship('User', back_populates='usage_reports')
+
+    __table_args__ = (
+        Index('ix_usage_report_node_time', node, time),
+        Index('ix_usage_report_user_time', user_id, time),
+    )
+
+
+class UsageHistory(Base):
+    """Per user usage on each node, downsampled to fixed time resolutions
+
+    Table Fields:
+      - id          (Integer): Primary key for this table
+      - user_id     (Integer): Foreign key for the ``User.id`` table
+      - node         (String): The name of the node
+      - resolution  (Integer): Length of the sampling interval in seconds
+      - time       (Datetime): Start of the sampling interval
+      - samples     (Integer): Number of scans summarized by the record
+      - cpu           (Float): Mean CPU usage as a percentage of a single CPU
+      - memory      (Integer): Peak memory usage in megabytes
+      - percentage    (Float): Peak memory usage as a percentage of system memory
+
+    Relationships:
+      - user (User): Many to one
+    """
+
+    __tablename__ = 'usage_history'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey(User.id))
+    node = Column(String, nullable=False)
+    resolution = Column(Integer, nullable=False)
+    time = Column(DateTime, nullable=False)
+    samples = Column(Integer, nullable=False)
+    cpu = Column(Float, nullable=False)
+    memory = Column(Integer, nullable=False)
+    percentage = Column(Float, nullable=False)
+
+    user = relationship('User', back_populates='usage_history')
+
+    __table_args__ = (
+        Index('ix_usage_history_user_resolution_time', user_id, resolution, time),
+        Index('ix_usage_history_resolution_time', resolution, time),
+    )
+
+
+class Revision(Base):
+    """Version counters used to detect changes to other tables
+
+    Table Fields:
+      - name   (String): Primary key for this table, the name of the tracked data
+      - value (Integer): Incremented whenever the tracked data changes
+    """
+
+    __tablename__ = 'revision'
+
+    name = Column(String, primary_key=True)
+    value = Column(Integer, default=0, nullable=False)
+
+
+class SerializedSession(Session):
+    """Session that holds a process wide lock while open
+
+    Used for in memory databases, where every thread shares a single DBAPI
+    connection. Holding the lock for the lifetime of the session stops
+    transactions from different threads interleaving on that connection.
+    Sessions must be opened as context managers for the lock to be taken.
+    """
+
+    lock = RLock()
+
+    def __enter__(self) -> 'SerializedSession':
+        self.lock.acquire()
+        return super().__enter__()
+
+    def __exit__(self, type_, value, traceback) -> None:
+        try:
+            super().__exit__(type_, value, traceback)
+
+        finally:
+            self.lock.release()
+
 
 class DBConnection:
     """A configurable connection to the application database"""
@@ -105,7 +282,129 @@ class DBConnection:
         """
 
         cls.url = url
-        cls.engine = create_engine(cls.url)
-        cls.metadata.create_all(cls.engine)
+
+        # In memory databases are private to a single connection, so share that connection between threads
+        # and serialize sessions so their transactions do not interleave
+        session_class = Session
+        if url in ('sqlite://', 'sqlite:///:memory:'):
+            cls.engine = create_engine(cls.url, poolclass=StaticPool, connect_args={'check_same_thread': False})
+            session_class = SerializedSession
+
+        else:
+            cls.engine = create_engine(cls.url)
+
+        # Checking the recorded schema version is a single query, compared to inspecting every table
+        if cls.schema_version() != SCHEMA_VERSION:
+            cls.metadata.create_all(cls.engine)
+            cls.migrate()
+
         cls.connection = cls.engine.connect()
-        cls.session = sessionmaker(cls.engine)
+        cls.session = sessionmaker(cls.engine, class_=session_class)
+
+    @classmethod
+    def schema_version(cls) -> Optional[int]:
+        """Return the schema version recorded in the application database
+
+        Returns:
+            The version number, or ``None`` if no version has been recorded
+        """
+
+        query = select(Revision.value).where(Revision.name == 'schema')
+        try:
+            with cls.engine.connect() as connection:
+                return connection.execute(query).scalar()
+
+        # Databases created before the revision table existed
+        except DBAPIError:
+            return None
+
+    @classmethod
+    def migrate(cls) -> None:
+        """Upgrade an existing database schema to match the current table definitions
+
+        Creating tables does not add new indexes to tables that already
+        exist, so any indexes missing from databases created by older
+        versions of the application are created here.
+        """
+
+        inspector = inspect(cls.engine)
+        for table in cls.metadata.sorted_tables:
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing:
+                    continue
+
+                if index.unique:
+                    cls._remove_duplicates(index)
+
+                index.create(cls.engine)
+
+        with cls.engine.begin() as connection:
+            connection.execute(delete(Revision).where(Revision.name == 'schema'))
+            connection.execute(insert(Revision).values(name='schema', value=SCHEMA_VERSION))
+
+    @classmethod
+    def _remove_duplicates(cls, index: Index) -> None:
+        """Delete rows that would violate a unique index, keeping the most recently created row
+
+        Args:
+            index: The unique index to enforce
+        """
+
+        table = index.table
+        primary_key = list(table.primary_key.columns)[0]
+        keep = select(func.max(primary_key)).group_by(*index.columns)
+        duplicates = delete(table).where(primary_key.not_in(keep))
+
+        # Partial indexes only need to be enforced over the rows they cover
+        dialect = cls.engine.dialect.name
+        where = index.dialect_options[dialect]['where'] if dialect in ('sqlite', 'postgresql') else None
+        if where is not None:
+            keep = keep.where(where)
+            duplicates = delete(table).where(where).where(primary_key.not_in(keep))
+
+        with cls.engine.begin() as connection:
+            connection.execute(duplicates)
+
+
+# Dialects supporting ``INSERT ... ON CONFLICT``
+UPSERT_DIALECTS = ('sqlite', 'postgresql')
+
+
+def upsert_construct(session: Session) -> Optional[Callable]:
+    """Return the dialect specific ``insert`` construct supporting ``ON CONFLICT`` clauses
+
+    Dialect modules are imported on first use to keep application start up fast.
+
+    Args:
+        session: The database session the statement will be executed within
+
+    Returns:
+        The ``insert`` function, or ``None`` if the database does not support ``ON CONFLICT``
+    """
+
+    dialect = session.get_bind().dialect.name
+    if dialect not in UPSERT_DIALECTS:
+        return None
+
+    return import_module(f'sqlalchemy.dialects.{dialect}').insert
+
+
+def upsert_users(session: Session, names: Collection[str]) -> None:
+    """Create user records for any of the given usernames that do not already exist
+
+    Args:
+        session: The database session to execute within
+        names: Usernames to create records for
+    """
+
+    upsert = upsert_construct(session)
+    if upsert is not None:
+        statement = upsert(User).on_conflict_do_nothing(index_elements=[User.name])
+        session.execute(statement, [{'name': name} for name in names])
+        return
+
+    existing = set(session.execute(select(User.name).where(User.name.in_(names))).scalars())
+    missing = [{'name': name} for name in set(names) - existing]
+    if missing:
+        session.execute(insert(User), missing)
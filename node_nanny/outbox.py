@@ -0,0 +1,245 @@
+"""The ``outbox`` module sends queued email notifications in the background.
+
+Notifications are written to the ``outbox`` database table by
+``UserNotifier`` and delivered by an ``OutboxSender`` running in a separate
+thread. A slow or unavailable mail server therefore never delays process
+termination or the next system scan.
+"""
+
+import sys
+import time
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from smtplib import SMTP, SMTPException
+from threading import Event, Lock, Thread
+from typing import Dict, Optional
+
+from sqlalchemy import func, select, update
+
+from node_nanny.orm import DBConnection, OutboxMessage
+
+
+class OutboxSender:
+    """Deliver messages from the outbox table, retrying failures with exponential backoff"""
+
+    def __init__(
+            self,
+            smtp_host: str = 'localhost',
+            smtp_port: int = 0,
+            max_attempts: int = 10,
+            retry_delay: timedelta = timedelta(seconds=30),
+            max_retry_delay: timedelta = timedelta(hours=1),
+            poll_interval: float = 5,
+            batch_size: int = 100
+    ) -> None:
+        """Configure message delivery
+
+        Args:
+            smtp_host: Hostname of the mail server
+            smtp_port: Port of the mail server (zero uses the default SMTP port)
+            max_attempts: Give up on a message after this many failed attempts
+            retry_delay: Delay before the first retry of a failed message
+            max_retry_delay: Upper limit on the delay between retries
+            poll_interval: Seconds between checks for new messages when running in the background
+            batch_size: Maximum number of messages to send over a single connection
+        """
+
+        self.smtp_host = smtp_host
+        self.smtp_port = smtp_port
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+
+        self.sent = 0
+        self.failed = 0
+        self.last_latency = 0.0
+        self.total_latency = 0.0
+
+        self._lock = Lock()
+        self._wake = Event()
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+
+    def _pending_query(self):
+        """Return a query selecting messages that have not been sent or abandoned"""
+
+        return select(OutboxMessage) \
+            .where(OutboxMessage.sent_time.is_(None)) \
+            .where(OutboxMessage.attempts < self.max_attempts)
+
+    def queue_depth(self) -> int:
+        """Return the number of messages waiting to be sent"""
+
+        query = self._pending_query().with_only_columns(func.count(OutboxMessage.id))
+        with DBConnection.session() as session:
+            return session.execute(query).scalar()
+
+    def metrics(self) -> Dict[str, float]:
+        """Return delivery statistics for messages handled by this sender
+
+        Returns:
+            A dictionary with the queue depth, message counts, and send latency in seconds
+        """
+
+        return {
+            'queue_depth': self.queue_depth(),
+            'sent': self.sent,
+            'failed': self.failed,
+            'last_latency': self.last_latency,
+            'mean_latency': self.total_latency / self.sent if self.sent else 0.0
+        }
+
+    def _retry_time(self, attempts: int, now: datetime) -> datetime:
+        """Return when to retry a message after the given number of failed attempts"""
+
+        delay = min(self.retry_delay * 2 ** (attempts - 1), self.max_retry_delay)
+        return now + delay
+
+    def send_pending(self) -> int:
+        """Send all messages that are currently due
+
+        Messages are read from the database before connecting to the mail
+        server so no database locks are held while waiting on the network.
+
+        Returns:
+            The number of messages sent successfully
+        """
+
+        with self._lock:
+            now = datetime.now()
+            query = self._pending_query() \
+                .where(OutboxMessage.next_attempt <= now) \
+                .order_by(OutboxMessage.id) \
+                .limit(self.batch_size)
+
+            with DBConnection.session() as session:
+                messages = session.execute(query).scalars().all()
+                session.expunge_all()
+
+            if not messages:
+                return 0
+
+            results = dict()
+            try:
+                with SMTP(self.smtp_host, self.smtp_port) as smtp:
+                    for message in messages:
+                        email = EmailMessage()
+                        email.set_content(message.body)
+                        email['Subject'] = message.subject
+                        email['From'] = message.sender
+                        email['To'] = message.recipient
+
+                        try:
+                            smtp.send_message(email)
+                            results[message.id] = None
+
+                        except SMTPException as exception:
+                            results[message.id] = exception
+
+            except (OSError, SMTPException) as exception:
+                # Any messages not attempted before the connection failed are treated as failures
+                for message in messages:
+                    results.setdefault(message.id, exception)
+
+            return self._record_results(messages, results)
+
+    def _record_results(self, messages: list, results: Dict[int, Optional[Exception]]) -> int:
+        """Update the outbox table with the outcome of each delivery attempt
+
+        Args:
+            messages: The messages that delivery was attempted for
+            results: The exception raised for each message ID, or ``None`` on success
+
+        Returns:
+            The number of messages sent successfully
+        """
+
+        now = datetime.now()
+        sent = 0
+        with DBConnection.session() as session:
+            for message in messages:
+                exception = results[message.id]
+                if exception is None:
+                    values = dict(sent_time=now, error=None)
+                    latency = (now - message.created).total_seconds()
+                    self.last_latency = latency
+                    self.total_latency += latency
+                    sent += 1
+
+                else:
+                    attempts = message.attempts + 1
+                    values = dict(attempts=attempts, next_attempt=self._retry_time(attempts, now), error=str(exception))
+                    if attempts >= self.max_attempts:
+                        self.failed += 1
+
+                session.execute(update(OutboxMessage).where(OutboxMessage.id == message.id).values(**values))
+
+            session.commit()
+
+        self.sent += sent
+        return sent
+
+    def wake(self) -> None:
+        """Signal the background thread to check for new messages immediately"""
+
+        self._wake.set()
+
+    def _run(self) -> None:
+        """Repeatedly send pending messages until the sender is stopped"""
+
+        while not self._stop.is_set():
+            try:
+                self.send_pending()
+
+            except Exception as exception:  # pragma: no cover
+                print(f'Error sending notifications: {exception}', file=sys.stderr)
+
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def start(self) -> None:
+        """Start sending messages from a background thread"""
+
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name='outbox-sender', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the background thread
+
+        Args:
+            timeout: Maximum number of seconds to wait for an in progress delivery to finish
+        """
+
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def flush(self, timeout: float = 30) -> bool:
+        """Send due messages until the queue is empty or the timeout expires
+
+        Args:
+            timeout: Maximum number of seconds to spend sending messages
+
+        Returns:
+            Whether all due messages were sent
+        """
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not self.send_pending():
+                break
+
+        query = self._pending_query() \
+            .with_only_columns(func.count(OutboxMessage.id)) \
+            .where(OutboxMessage.next_attempt <= datetime.now())
+
+        with DBConnection.session() as session:
+            return session.execute(query).scalar() == 0
@@ -0,0 +1,363 @@
+"""The ``policy`` module decides how to respond to users exceeding resource limits.
+
+A policy is a list of rules. Each rule matches users whose usage falls
+within a range of values for one or more columns of the per user usage
+table, and names an action to take once a user has matched the rule for a
+grace period. Actions are ordered by severity:
+
+  - ``throttle``: Lower ``memory.high`` and ``cpu.max`` of the user's cgroup slice
+  - ``renice``: Lower the scheduling priority of every process owned by the user
+  - ``stop``: Send ``SIGSTOP`` to the user's process with the largest memory usage
+  - ``kill``: Terminate every process owned by the user
+
+Throttling and stopped processes are reverted once a user no longer matches
+the rule. Rules are compiled into arrays of lower and upper bounds, so every
+rule is evaluated against every user with a single vectorized comparison.
+
+Additional rules are read from a JSON file of the form::
+
+    {"rules": [
+        {"name": "throttle", "action": "throttle", "when": {"MEM": {"min": 10}}, "memory_high": 0.9},
+        {"name": "renice", "action": "renice", "when": {"CPU": {"min": 400}}, "wait": 60, "nice": 10}
+    ]}
+
+Conditions are given for the ``CPU``, ``MEM``, ``RSS``, ``PROCS`` and
+``SPAWNS`` (processes started per second) columns with an inclusive ``min``
+and an exclusive ``max``. The optional ``wait`` is the grace period in
+seconds.
+"""
+
+import json
+import os
+import signal
+import sys
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Type
+
+import numpy as np
+from pandas import DataFrame, Index
+
+from node_nanny.cgroup import CgroupReader
+from node_nanny.kill import resolve_uid
+
+if TYPE_CHECKING:  # pragma: no cover
+    from node_nanny.utils import SystemUsage
+
+# Available actions ordered from least to most severe
+ACTIONS = ('throttle', 'renice', 'stop', 'kill')
+
+# Usage columns that rule conditions may refer to
+COLUMNS = ('CPU', 'MEM', 'RSS', 'PROCS', 'SPAWNS')
+
+
+class Rule(NamedTuple):
+    """A condition on per user usage and the action to take when it is met
+
+    Attributes:
+        name: Name used to identify the rule in messages
+        action: One of the values in ``ACTIONS``
+        bounds: Inclusive lower and exclusive upper bounds keyed by column name
+        wait: Seconds a user must continuously match the rule before the action is taken
+        options: Additional action specific settings
+    """
+
+    name: str
+    action: str
+    bounds: Dict[str, tuple]
+    wait: float = 0
+    options: Dict[str, float] = {}
+
+    @classmethod
+    def from_dict(cls, definition: dict) -> 'Rule':
+        """Create a rule from its definition in a rules file
+
+        Args:
+            definition: Dictionary with ``name``, ``action``, ``when``, and optionally ``wait`` and action options
+
+        Returns:
+            A ``Rule`` instance
+
+        Raises:
+            ValueError: If the definition is incomplete or refers to unknown actions or columns
+        """
+
+        definition = dict(definition)
+        try:
+            name = str(definition.pop('name'))
+            action = definition.pop('action')
+            conditions = definition.pop('when')
+            wait = float(definition.pop('wait', 0))
+            bounds = {
+                column: (float(limits.get('min', -np.inf)), float(limits.get('max', np.inf)))
+                for column, limits in conditions.items()
+            }
+
+        except (AttributeError, KeyError, TypeError, ValueError) as exception:
+            raise ValueError(f'Invalid rule definition {definition}: {exception!r}') from exception
+
+        if action not in ACTIONS:
+            raise ValueError(f'Unknown action {action} in rule {name}, must be one of {ACTIONS}')
+
+        unknown = set(bounds) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f'Unknown columns {sorted(unknown)} in rule {name}, must be one of {COLUMNS}')
+
+        return cls(name, action, bounds, wait, {key: float(value) for key, value in definition.items()})
+
+
+def load_rules(path: str) -> List[Rule]:
+    """Read rules from a JSON rules file
+
+    Args:
+        path: Path of the rules file
+
+    Returns:
+        A list of rules
+
+    Raises:
+        ValueError: If the file is not valid JSON or contains invalid rules
+    """
+
+    with open(path) as infile:
+        content = json.load(infile)
+
+    if isinstance(content, dict):
+        content = content.get('rules', [])
+
+    return [Rule.from_dict(definition) for definition in content]
+
+
+class Decision(NamedTuple):
+    """An action to take, or revert, for a single user
+
+    Attributes:
+        user: The name of the user
+        rule: The rule that triggered the decision
+        release: Whether the action should be reverted because the user no longer matches the rule
+    """
+
+    user: str
+    rule: Rule
+    release: bool = False
+
+
+class PolicyEngine:
+    """Evaluate rules against per user usage and track how long each rule has been matched"""
+
+    def __init__(self, rules: List[Rule]) -> None:
+        """Compile the given rules
+
+        Args:
+            rules: The rules to evaluate, in any order
+        """
+
+        self.rules = sorted(rules, key=lambda rule: ACTIONS.index(rule.action))
+        self.lower = np.array(
+            [[rule.bounds.get(column, (-np.inf, np.inf))[0] for column in COLUMNS] for rule in self.rules],
+            dtype=float
+        ).reshape(len(self.rules), len(COLUMNS))
+        self.upper = np.array(
+            [[rule.bounds.get(column, (-np.inf, np.inf))[1] for column in COLUMNS] for rule in self.rules],
+            dtype=float
+        ).reshape(len(self.rules), len(COLUMNS))
+        self.wait = np.array([rule.wait for rule in self.rules], dtype=float)
+        self.kill = np.array([rule.action == 'kill' for rule in self.rules], dtype=bool)
+
+        # Time each user first matched each rule (NaN if not matching) and whether the action was taken
+        self._users = Index([], dtype=object)
+        self._since = np.empty((0, len(self.rules)))
+        self._applied = np.empty((0, len(self.rules)), dtype=bool)
+
+    @classmethod
+    def from_scan(
+            cls, max_mem: float, wait: float, path: Optional[str] = None, max_spawn_rate: Optional[float] = None
+    ) -> 'PolicyEngine':
+        """Create the policy used by a scan
+
+        Users exceeding ``max_mem`` for ``wait`` seconds are always killed.
+        When ``max_spawn_rate`` is given, users starting processes faster
+        than the given rate for ``wait`` seconds are reniced. Rules from the
+        given file are evaluated in addition to these rules.
+
+        Args:
+            max_mem: Memory limit as a percentage of system memory
+            wait: Seconds a user may exceed the memory limit before being killed
+            path: Optional path of a JSON rules file
+            max_spawn_rate: Optional limit on the number of processes a user may start per second
+
+        Returns:
+            A ``PolicyEngine`` instance
+        """
+
+        rules = [Rule('max-mem', 'kill', {'MEM': (max_mem, np.inf)}, wait)]
+        if max_spawn_rate is not None:
+            rules.append(Rule('max-spawn-rate', 'renice', {'SPAWNS': (max_spawn_rate, np.inf)}, wait))
+
+        if path:
+            rules.extend(load_rules(path))
+
+        return cls(rules)
+
+    def evaluate(self, usage: DataFrame) -> np.ndarray:
+        """Return which rules match each user
+
+        Args:
+            usage: Per user usage indexed by username with the columns in ``COLUMNS`` (missing columns are zero)
+
+        Returns:
+            A boolean array with one row per user and one column per rule
+        """
+
+        values = usage.reindex(columns=list(COLUMNS), fill_value=0).to_numpy(dtype=float)[:, None, :]
+        return ((values >= self.lower) & (values < self.upper)).all(axis=2)
+
+    def update(self, usage: DataFrame, now: float) -> List[Decision]:
+        """Evaluate the current usage and return the actions that are now due
+
+        Each action is taken once per user for as long as the user
+        continuously matches the rule. When a kill is due, no other
+        action is taken for that user. Kills are never considered to be in
+        effect: the grace period restarts when a kill is taken, and a user
+        who still matches the rule once it expires (for example because
+        processes survived or were respawned) is killed again.
+
+        Args:
+            usage: Per user usage indexed by username with the columns in ``COLUMNS``
+            now: The current time in seconds
+
+        Returns:
+            Decisions to take or revert actions, ordered by user and severity
+        """
+
+        users = Index(usage.index)
+        matches = self.evaluate(usage)
+
+        # Carry state over for users seen in the previous update
+        since = np.full(matches.shape, np.nan)
+        applied = np.zeros(matches.shape, dtype=bool)
+        previous = self._users.get_indexer(users) if len(self._users) else np.full(len(users), -1)
+        known = previous >= 0
+        since[known] = self._since[previous[known]]
+        applied[known] = self._applied[previous[known]]
+
+        decisions = []
+        for row in np.flatnonzero(self._applied.any(axis=1)):
+            user = self._users[row]
+            if user not in users:
+                decisions.extend(Decision(user, self.rules[i], True) for i in np.flatnonzero(self._applied[row]))
+
+        since = np.where(matches, np.where(np.isnan(since), now, since), np.nan)
+        released = applied & ~matches
+        due = matches & ~applied & (now - since >= self.wait)
+
+        killed = (due & self.kill).any(axis=1)
+        due[killed] &= self.kill
+        applied = (applied & matches) | due
+
+        for row, rule in zip(*np.nonzero(released | due)):
+            decisions.append(Decision(users[row], self.rules[rule], bool(released[row, rule])))
+
+        # Re-arm kills that were just taken, restarting the grace period for users who remain over the limit
+        rearmed = due & self.kill
+        applied[rearmed] = False
+        since[rearmed] = now
+
+        self._users, self._since, self._applied = users, since, applied
+        return decisions
+
+    def time_remaining(self, now: float) -> Optional[float]:
+        """Return the seconds until the next pending action is due
+
+        Args:
+            now: The current time in seconds
+
+        Returns:
+            The number of seconds, or ``None`` if no actions are pending
+        """
+
+        pending = ~np.isnan(self._since) & ~self._applied
+        if not pending.any():
+            return None
+
+        return max(0.0, float(np.min((self._since + self.wait)[pending])) - now)
+
+
+class PolicyActions:
+    """Apply and revert the non-lethal actions chosen by a ``PolicyEngine``
+
+    Kills are handled by ``MonitorUtility`` so users are notified.
+    """
+
+    def __init__(self, usage_source: Type['SystemUsage'], cgroups: Optional[CgroupReader] = None) -> None:
+        """Apply actions to processes found by the given usage source
+
+        Args:
+            usage_source: ``SystemUsage`` or a subclass with the same interface
+            cgroups: Reader for the cgroup slices that are throttled (defaults to ``/sys/fs/cgroup``)
+        """
+
+        self.usage_source = usage_source
+        self.cgroups = cgroups or CgroupReader()
+        self._stopped: Dict[str, int] = dict()
+
+    def apply(self, decision: Decision, usage: DataFrame) -> None:
+        """Take, or revert, the action of a single decision
+
+        Args:
+            decision: The decision to act on
+            usage: Per user usage indexed by username, used to size throttling limits
+        """
+
+        action = decision.rule.action
+        if action == 'kill':
+            raise ValueError('Kills must be handled by the caller')
+
+        try:
+            uid = resolve_uid(decision.user)
+            method = getattr(self, f'_{"release" if decision.release else "apply"}_{action}')
+            method(decision.user, uid, decision.rule, usage)
+
+        except (OSError, ValueError) as exception:
+            print(f'Could not {action} user {decision.user} ({decision.rule.name}): {exception}', file=sys.stderr)
+
+    def _apply_throttle(self, user: str, uid: int, rule: Rule, usage: DataFrame) -> None:
+        """Limit the memory and CPU usage of the user's slice relative to its current usage"""
+
+        memory_high = rule.options.get('memory_high', 1.0)
+        self.cgroups.set_memory_high(uid, int(usage.RSS.get(user, 0) * memory_high))
+        if 'cpu_max' in rule.options:
+            self.cgroups.set_cpu_max(uid, rule.options['cpu_max'])
+
+    def _release_throttle(self, user: str, uid: int, rule: Rule, usage: DataFrame) -> None:
+        """Remove memory and CPU limits from the user's slice"""
+
+        self.cgroups.set_memory_high(uid, None)
+        if 'cpu_max' in rule.options:
+            self.cgroups.set_cpu_max(uid, None)
+
+    @staticmethod
+    def _apply_renice(user: str, uid: int, rule: Rule, usage: DataFrame) -> None:
+        """Lower the priority of every process owned by the user with a single system call"""
+
+        os.setpriority(os.PRIO_USER, uid, int(rule.options.get('nice', 10)))
+
+    @staticmethod
+    def _release_renice(user: str, uid: int, rule: Rule, usage: DataFrame) -> None:
+        """Leave process priorities unchanged since users may have lowered them on their own"""
+
+    def _apply_stop(self, user: str, uid: int, rule: Rule, usage: DataFrame) -> None:
+        """Suspend the user's process with the largest memory usage"""
+
+        pid = int(self.usage_source.top_processes([user], 1).index.get_level_values('PID')[0])
+        os.kill(pid, signal.SIGSTOP)
+        self._stopped[user] = pid
+
+    def _release_stop(self, user: str, uid: int, rule: Rule, usage: DataFrame) -> None:
+        """Resume the process suspended for the user"""
+
+        pid = self._stopped.pop(user, None)
+        if pid is not None:
+            try:
+                os.kill(pid, signal.SIGCONT)
+
+            except ProcessLookupError:
+                pass
@@ -0,0 +1,240 @@
+"""The ``pressure`` module wakes the scan loop when the node comes under memory pressure.
+
+The kernel reports memory pressure stall information (PSI) in
+``/proc/pressure/memory``. Writing a trigger such as ``some 200000 2000000``
+to that file asks the kernel to signal ``POLLPRI`` whenever tasks stall on
+memory for more than 200 ms within any two second window, so the scan loop
+can sleep until memory becomes scarce instead of polling on a timer.
+Optionally, cgroup ``memory.events`` files are watched for new ``high``,
+``max``, ``oom`` and ``oom_kill`` events.
+
+Where triggers are unavailable, for example on older kernels, without
+sufficient privileges, or when reading from a fake pressure file, the
+``avg10`` value of the pressure file and the event counters are instead
+checked at a fixed interval.
+"""
+
+import os
+import select
+import sys
+import time
+from typing import Dict, Iterable, Optional
+
+# Events in ``memory.events`` that indicate a cgroup is running out of memory
+MEMORY_EVENTS = ('high', 'max', 'oom', 'oom_kill')
+
+
+def read_pressure(path: str = '/proc/pressure/memory') -> Dict[str, Dict[str, float]]:
+    """Return the content of a pressure stall information file
+
+    Args:
+        path: Path of the pressure file
+
+    Returns:
+        Values such as ``avg10`` keyed by line (``some`` or ``full``) and field name
+    """
+
+    with open(path) as infile:
+        content = infile.read()
+
+    pressure = dict()
+    for line in content.splitlines():
+        kind, *fields = line.split()
+        pressure[kind] = {key: float(value) for key, value in (field.split('=') for field in fields)}
+
+    return pressure
+
+
+def count_memory_events(content: str) -> int:
+    """Return the total number of memory events indicating a cgroup is running out of memory
+
+    Args:
+        content: Content of a cgroup ``memory.events`` file
+
+    Returns:
+        The sum of the counters named in ``MEMORY_EVENTS``
+    """
+
+    total = 0
+    for line in content.splitlines():
+        key, _, value = line.partition(' ')
+        if key in MEMORY_EVENTS:
+            total += int(value)
+
+    return total
+
+
+class PressureTrigger:
+    """Wait until memory pressure crosses a threshold or a timeout expires"""
+
+    def __init__(
+            self,
+            path: str = '/proc/pressure/memory',
+            threshold: float = 10,
+            window: float = 2,
+            kind: str = 'some',
+            events: Iterable[str] = (),
+            poll_interval: float = 1
+    ) -> None:
+        """Configure when the trigger fires
+
+        Args:
+            path: Path of the pressure file
+            threshold: Percentage of the window tasks must stall on memory for the trigger to fire
+            window: Length of the kernel trigger window in seconds (unprivileged triggers need multiples of 2)
+            kind: Fire on stalls of ``some`` tasks or of ``full`` (all non-idle tasks)
+            events: Paths of cgroup ``memory.events`` files to watch
+            poll_interval: Seconds between checks when kernel notifications are unavailable
+        """
+
+        self.path = path
+        self.threshold = threshold
+        self.window = window
+        self.kind = kind
+        self.events = list(events)
+        self.poll_interval = poll_interval
+
+        self.notifications = False
+        self._trigger: Optional[int] = None
+        self._event_files: Dict[str, int] = dict()
+        self._event_counts: Dict[str, int] = dict()
+        self._poll = select.poll()
+
+    def open(self) -> bool:
+        """Register a kernel trigger and start watching memory event files
+
+        Returns:
+            Whether the kernel will notify the trigger, instead of the trigger polling on an interval
+        """
+
+        self.notifications = self._register_trigger()
+        for path in self.events:
+            try:
+                if self.notifications:
+                    fd = self._event_files[path] = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+                    self._poll.register(fd, select.POLLPRI)
+
+                self._event_counts[path] = self._read_events(path)
+
+            except OSError as exception:
+                print(f'Could not watch memory events in {path}: {exception}', file=sys.stderr)
+
+        return self.notifications
+
+    def _register_trigger(self) -> bool:
+        """Write a trigger to the pressure file, returning whether it was accepted"""
+
+        stall = int(self.window * self.threshold / 100 * 1_000_000)
+        trigger = f'{self.kind} {stall} {int(self.window * 1_000_000)}'
+        try:
+            # Pressure files report a size of zero, so a non-empty file is a regular file that must not be overwritten
+            if os.stat(self.path).st_size:
+                return False
+
+            fd = os.open(self.path, os.O_RDWR | os.O_NONBLOCK)
+
+        except OSError as exception:
+            print(f'Could not open {self.path}, checking pressure every {self.poll_interval}s: {exception}',
+                  file=sys.stderr)
+            return False
+
+        try:
+            os.write(fd, trigger.encode() + b'\0')
+
+        except OSError as exception:
+            os.close(fd)
+            print(f'Could not register pressure trigger, checking pressure every {self.poll_interval}s: {exception}',
+                  file=sys.stderr)
+            return False
+
+        self._trigger = fd
+        self._poll.register(fd, select.POLLPRI)
+        return True
+
+    def close(self) -> None:
+        """Remove the kernel trigger and stop watching memory event files"""
+
+        for fd in [self._trigger, *self._event_files.values()]:
+            if fd is not None:
+                self._poll.unregister(fd)
+                os.close(fd)
+
+        self._trigger = None
+        self._event_files = dict()
+        self.notifications = False
+
+    def _read_events(self, path: str) -> int:
+        """Return the memory event count of a cgroup
+
+        Watched files are read through the descriptor being polled, which
+        acknowledges the change notification so it is not reported again.
+        """
+
+        fd = self._event_files.get(path)
+        if fd is not None:
+            return count_memory_events(os.pread(fd, 65536, 0).decode())
+
+        with open(path) as infile:
+            return count_memory_events(infile.read())
+
+    def _new_events(self) -> bool:
+        """Return whether any watched cgroup reported new memory events"""
+
+        triggered = False
+        for path, count in self._event_counts.items():
+            current = self._read_events(path)
+            if current > count:
+                triggered = True
+
+            self._event_counts[path] = current
+
+        return triggered
+
+    def _above_threshold(self) -> bool:
+        """Return whether the recent average pressure exceeds the threshold
+
+        Nodes without pressure information, for example kernels built without
+        PSI, are never considered to be under pressure.
+        """
+
+        try:
+            return read_pressure(self.path)[self.kind]['avg10'] >= self.threshold
+
+        except OSError:
+            return False
+
+    def wait(self, timeout: float) -> bool:
+        """Wait until memory pressure crosses the threshold or the timeout expires
+
+        Args:
+            timeout: Maximum number of seconds to wait
+
+        Returns:
+            Whether the wait ended because of memory pressure
+        """
+
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if self.notifications:
+                ready = dict(self._poll.poll(max(0, remaining) * 1000))
+                if ready.get(self._trigger, 0) & select.POLLERR:
+                    print(f'Pressure trigger was removed, checking pressure every {self.poll_interval}s',
+                          file=sys.stderr)
+                    self.close()
+                    continue
+
+                # Memory event files also report changes to counters that are not watched, so those are ignored
+                new_events = len(ready) > (self._trigger in ready) and self._new_events()
+                if self._trigger in ready or new_events:
+                    return True
+
+            elif self._above_threshold() or self._new_events():
+                return True
+
+            elif remaining > 0:
+                time.sleep(min(self.poll_interval, remaining))
+                continue
+
+            if time.monotonic() >= deadline:
+                return False
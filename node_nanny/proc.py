@@ -0,0 +1,764 @@
+"""The ``proc`` module reads process information directly from the ``/proc``
+filesystem.
+
+Reading ``/proc`` directly lets the application collect every value it needs
+for a process in a single pass over three small files, instead of issuing a
+separate call (and file read) for every attribute of every process.
+
+Consecutive snapshots are compared with ``diff_snapshots``, which matches
+processes by process ID and start time. The resulting ``SnapshotDiff`` lists
+the processes that started, exited, or changed in between, and is used to
+update CPU usage and per user totals incrementally and to measure how
+quickly each user is spawning new processes.
+
+On nodes with very large process tables, ``ProcReader`` can split the
+process IDs into contiguous shards that are read concurrently by a pool
+of threads or processes and merged back into a single snapshot, in the
+same order as a sequential read.
+"""
+
+import os
+from array import array
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from node_nanny.accounts import UserCache
+
+# Mapping of single letter process states to the names used by ``psutil``
+PROCESS_STATES = {
+    'R': 'running',
+    'S': 'sleeping',
+    'D': 'disk-sleep',
+    'T': 'stopped',
+    't': 'tracing-stop',
+    'Z': 'zombie',
+    'X': 'dead',
+    'x': 'dead',
+    'K': 'wake-kill',
+    'W': 'waking',
+    'P': 'parked',
+    'I': 'idle',
+}
+
+# Process states that no longer hold any resources and cannot be signalled
+EXITED_STATES = ('Z', 'X', 'x')
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+# Pools available for reading process information concurrently
+EXECUTORS = {'thread': ThreadPoolExecutor, 'process': ProcessPoolExecutor}
+
+# Minimum number of processes read by each worker when choosing the number of workers automatically, so each
+# shard outweighs the cost of returning it from a worker process (calibrate with ``bench_parallel_collect``)
+PROCESSES_PER_WORKER = 5000
+
+
+def available_cpus() -> int:
+    """Return the number of CPUs the current process is allowed to run on"""
+
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+
+    return os.cpu_count() or 1  # pragma: no cover
+
+
+class CategoryColumn:
+    """Compact column of repeated strings stored as integer codes into a list of distinct values
+
+    Supports the same read access as a list of strings, so values can be
+    indexed and iterated over without decoding the whole column.
+    """
+
+    __slots__ = ('codes', 'categories', '_lookup')
+
+    def __init__(self, values: Iterable[str] = ()) -> None:
+        """Create a column containing the given values
+
+        Args:
+            values: Initial values of the column
+        """
+
+        values = list(values)
+        self.categories: List[str] = list(dict.fromkeys(values))
+        self._lookup: Dict[str, int] = {value: code for code, value in enumerate(self.categories)}
+        self.codes = array('i', map(self._lookup.__getitem__, values))
+
+    def append(self, value: str) -> None:
+        """Add a value to the end of the column"""
+
+        try:
+            self.codes.append(self._lookup[value])
+
+        except KeyError:
+            self._lookup[value] = len(self.categories)
+            self.categories.append(value)
+            self.codes.append(self._lookup[value])
+
+    def extend(self, other: 'CategoryColumn') -> None:
+        """Add the values of another column to the end of this column
+
+        Args:
+            other: The column to copy values from
+        """
+
+        lookup = self._lookup
+        for value in other.categories:
+            if value not in lookup:
+                lookup[value] = len(self.categories)
+                self.categories.append(value)
+
+        codes = [lookup[value] for value in other.categories]
+        self.codes.extend(array('i', map(codes.__getitem__, other.codes)))
+
+    def __getitem__(self, row: int) -> str:
+        return self.categories[self.codes[row]]
+
+    def __iter__(self) -> Iterator[str]:
+        categories = self.categories
+        return (categories[code] for code in self.codes)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def to_categorical(self):
+        """Return the column as a ``pandas.Categorical`` sharing memory with the codes
+
+        Returns:
+            A ``pandas.Categorical`` instance
+        """
+
+        import numpy as np
+        from pandas import Categorical
+
+        return Categorical.from_codes(np.frombuffer(self.codes, dtype=np.intc), self.categories)
+
+
+class ProcessSnapshot:
+    """Column oriented record of all processes running at a single point in time
+
+    Numeric columns are stored as fixed width ``array`` instances and the
+    process name and status are stored as a ``CategoryColumn``, so a
+    snapshot holds a few compact buffers instead of one Python object per
+    value. Values for a given process share the same position in every
+    column. Columns can be viewed as NumPy arrays without copying.
+    """
+
+    __slots__ = (
+        'uptime', 'mem_total', 'pid', 'ppid', 'pgrp', 'session', 'uid', 'name', 'status', 'rss', 'ticks', 'start_time',
+        '_keys'
+    )
+
+    columns = ('pid', 'ppid', 'pgrp', 'session', 'uid', 'name', 'status', 'rss', 'ticks', 'start_time')
+    category_columns = ('name', 'status')
+
+    def __init__(self, uptime: float = 0, mem_total: int = 0) -> None:
+        """Create an empty snapshot
+
+        Args:
+            uptime: System uptime in seconds when the snapshot was taken
+            mem_total: Total system memory in bytes
+        """
+
+        self.uptime = uptime
+        self.mem_total = mem_total
+
+        self.pid = array('q')
+        self.ppid = array('q')
+        self.pgrp = array('q')
+        self.session = array('q')
+        self.uid = array('q')
+        self.name = CategoryColumn()
+        self.status = CategoryColumn()
+        self.rss = array('q')
+        self.ticks = array('q')
+        self.start_time = array('q')
+        self._keys: Dict[Tuple[int, int], int] = dict()
+
+    @classmethod
+    def from_columns(cls, uptime: float = 0, mem_total: int = 0, **columns: Iterable) -> 'ProcessSnapshot':
+        """Create a snapshot from complete columns of values
+
+        Args:
+            uptime: System uptime in seconds when the snapshot was taken
+            mem_total: Total system memory in bytes
+            **columns: Values of every column named in the ``columns`` attribute
+
+        Returns:
+            A ``ProcessSnapshot`` instance
+        """
+
+        snapshot = cls(uptime, mem_total)
+        for column in cls.columns:
+            if column in cls.category_columns:
+                setattr(snapshot, column, CategoryColumn(columns[column]))
+
+            else:
+                setattr(snapshot, column, array('q', columns[column]))
+
+        return snapshot
+
+    def append(self, record: Tuple) -> None:
+        """Add a single process record to the snapshot
+
+        Args:
+            record: Process values ordered to match the ``columns`` attribute
+        """
+
+        pid, ppid, pgrp, session, uid, name, status, rss, ticks, start_time = record
+        self.pid.append(pid)
+        self.ppid.append(ppid)
+        self.pgrp.append(pgrp)
+        self.session.append(session)
+        self.uid.append(uid)
+        self.name.append(name)
+        self.status.append(status)
+        self.rss.append(rss)
+        self.ticks.append(ticks)
+        self.start_time.append(start_time)
+
+    def extend(self, other: 'ProcessSnapshot') -> None:
+        """Add every process of another snapshot to the end of this snapshot
+
+        Args:
+            other: The snapshot to copy processes from
+        """
+
+        for column in self.columns:
+            getattr(self, column).extend(getattr(other, column))
+
+    def to_numpy(self) -> dict:
+        """Return every numeric column as a NumPy array sharing memory with the snapshot
+
+        The arrays are read only views, and the snapshot cannot be extended
+        while any of them are still referenced.
+
+        Returns:
+            Arrays keyed by column name
+        """
+
+        import numpy as np
+
+        return {
+            column: np.frombuffer(getattr(self, column), dtype=np.int64)
+            for column in self.columns if column not in self.category_columns
+        }
+
+    def keys(self) -> Dict[Tuple[int, int], int]:
+        """Return the position of each process keyed by process ID and start time
+
+        Process IDs may be reused, so a process is only identified uniquely
+        by its ID together with its start time. The mapping is built once
+        and reused until more processes are added to the snapshot.
+
+        Returns:
+            Snapshot positions keyed by ``(pid, start_time)``
+        """
+
+        if len(self._keys) != len(self.pid):
+            self._keys = dict(zip(zip(self.pid, self.start_time), range(len(self.pid))))
+
+        return self._keys
+
+    def __len__(self) -> int:
+        return len(self.pid)
+
+
+class SnapshotDiff(NamedTuple):
+    """Differences between two snapshots of the process table
+
+    Processes that start and exit in between the two snapshots are not
+    visible in either of them, so counts of started processes are a lower
+    bound that becomes more accurate as snapshots are taken more often.
+
+    Attributes:
+        previous: The earlier snapshot
+        current: The later snapshot
+        matches: Position of each process of ``current`` in ``previous``, or -1 if it started since
+        started: Positions in ``current`` of processes that started since ``previous``
+        exited: Positions in ``previous`` of processes that exited since
+        changed: Positions in ``current`` of processes whose owner, memory usage or CPU time changed
+        elapsed: Seconds between the two snapshots, or zero if ``previous`` is empty
+    """
+
+    previous: ProcessSnapshot
+    current: ProcessSnapshot
+    matches: array
+    started: List[int]
+    exited: List[int]
+    changed: List[int]
+    elapsed: float
+
+    def spawn_counts(self) -> Dict[int, int]:
+        """Return the number of processes started by each user
+
+        Returns:
+            Counts of started processes keyed by user ID
+        """
+
+        uid = self.current.uid
+        return Counter(uid[row] for row in self.started)
+
+    def exit_counts(self) -> Dict[int, int]:
+        """Return the number of processes of each user that exited
+
+        Returns:
+            Counts of exited processes keyed by user ID
+        """
+
+        uid = self.previous.uid
+        return Counter(uid[row] for row in self.exited)
+
+    def spawn_rates(self) -> Dict[int, float]:
+        """Return the number of processes started per second by each user
+
+        Returns:
+            Rates keyed by user ID, empty if the time between snapshots is unknown
+        """
+
+        if self.elapsed <= 0:
+            return dict()
+
+        return {uid: count / self.elapsed for uid, count in self.spawn_counts().items()}
+
+
+def diff_snapshots(previous: ProcessSnapshot, current: ProcessSnapshot) -> SnapshotDiff:
+    """Compare two snapshots of the process table
+
+    Processes are matched by process ID and start time using dictionary
+    lookups and set operations on the keys of each snapshot, so the cost
+    is linear in the number of processes.
+
+    Args:
+        previous: The earlier snapshot
+        current: The later snapshot
+
+    Returns:
+        A ``SnapshotDiff`` instance
+    """
+
+    previous_keys, current_keys = previous.keys(), current.keys()
+    matches = array('q', map(previous_keys.get, zip(current.pid, current.start_time), repeat(-1)))
+    exited = sorted(map(previous_keys.__getitem__, previous_keys.keys() - current_keys.keys()))
+
+    rss, ticks, uid = current.rss, current.ticks, current.uid
+    previous_rss, previous_ticks, previous_uid = previous.rss, previous.ticks, previous.uid
+    started, changed = [], []
+    for row, old in enumerate(matches):
+        if old < 0:
+            started.append(row)
+
+        elif rss[row] != previous_rss[old] or ticks[row] != previous_ticks[old] or uid[row] != previous_uid[old]:
+            changed.append(row)
+
+    elapsed = current.uptime - previous.uptime if len(previous) else 0
+    return SnapshotDiff(previous, current, matches, started, exited, changed, elapsed)
+
+
+class ProcReader:
+    """Reads process information from a ``/proc`` style directory
+
+    Parsing process files holds the global interpreter lock, so processes
+    are read concurrently in a pool of worker processes by default. Thread
+    pools only overlap the time spent waiting on the kernel.
+    """
+
+    def __init__(self, root: str = '/proc', workers: Optional[int] = 1, executor: str = 'process') -> None:
+        """Read process information from the given directory
+
+        Args:
+            root: Path of the ``/proc`` filesystem, or a directory mimicking it
+            workers: Number of workers reading processes concurrently, or ``None`` to choose automatically
+            executor: Read processes concurrently in a pool of ``thread`` or ``process`` workers
+        """
+
+        self.root = root
+        self._pool: Optional[Executor] = None
+        self._pool_size = 0
+        self.set_workers(workers, executor)
+
+    def set_workers(self, workers: Optional[int] = 1, executor: str = 'process') -> None:
+        """Change how many workers read processes concurrently
+
+        Args:
+            workers: Number of workers reading processes concurrently, or ``None`` to choose automatically
+            executor: Read processes concurrently in a pool of ``thread`` or ``process`` workers
+
+        Raises:
+            ValueError: If the executor is not one of ``EXECUTORS``
+        """
+
+        if executor not in EXECUTORS:
+            raise ValueError(f'Unknown executor {executor}, must be one of {tuple(EXECUTORS)}')
+
+        self.close()
+        self.workers = workers
+        self.executor = executor
+
+    def __getstate__(self) -> dict:
+        """Return the reader state without its worker pool so readers can be sent to worker processes"""
+
+        state = self.__dict__.copy()
+        state['_pool'], state['_pool_size'] = None, 0
+        return state
+
+    def worker_count(self, processes: int) -> int:
+        """Return the number of workers used to read the given number of processes
+
+        When the number of workers is chosen automatically, one worker is
+        used for every ``PROCESSES_PER_WORKER`` processes, up to the number
+        of available CPUs.
+
+        Args:
+            processes: The number of processes to read
+
+        Returns:
+            The number of workers, where one means processes are read sequentially
+        """
+
+        workers = self.workers
+        if workers is None:
+            workers = min(available_cpus(), processes // PROCESSES_PER_WORKER)
+
+        return max(1, min(workers, processes))
+
+    def _executor(self, workers: int) -> Executor:
+        """Return a pool with at least the given number of workers, reusing the existing pool where possible"""
+
+        if self._pool is None or self._pool_size < workers:
+            self.close()
+            self._pool = EXECUTORS[self.executor](max_workers=workers)
+            self._pool_size = workers
+
+        return self._pool
+
+    def close(self) -> None:
+        """Shut down any workers used to read processes concurrently"""
+
+        if self._pool is not None:
+            self._pool.shutdown()
+
+        self._pool, self._pool_size = None, 0
+
+    @staticmethod
+    def _read(path: str) -> str:
+        """Return the content of a file as a string"""
+
+        with open(path, 'rb') as infile:
+            return infile.read().decode(errors='replace')
+
+    def pids(self) -> List[int]:
+        """Return the IDs of all processes listed in the proc directory"""
+
+        return [int(name) for name in os.listdir(self.root) if name.isdigit()]
+
+    def mem_total(self) -> int:
+        """Return the total system memory in bytes"""
+
+        for line in self._read(os.path.join(self.root, 'meminfo')).splitlines():
+            if line.startswith('MemTotal:'):
+                return int(line.split()[1]) * 1024
+
+        raise ValueError('Could not determine total system memory')
+
+    def uptime(self) -> float:
+        """Return the system uptime in seconds"""
+
+        return float(self._read(os.path.join(self.root, 'uptime')).split()[0])
+
+    @staticmethod
+    def username(uid: int) -> str:
+        """Return the username for a given user ID
+
+        Usernames are resolved through the process wide ``UserCache``.
+        Following the convention used by ``psutil``, IDs without a matching
+        account resolve to the ID itself as a string.
+
+        Args:
+            uid: The user ID to resolve
+
+        Returns:
+            The corresponding username
+        """
+
+        return UserCache.username(uid)
+
+    def read_process(self, pid: int) -> Tuple:
+        """Return usage information for a single process
+
+        Args:
+            pid: The ID of the process to read
+
+        Returns:
+            A tuple of process values ordered to match ``ProcessSnapshot.columns``
+
+        Raises:
+            FileNotFoundError: If the process does not exist
+            ProcessLookupError: If the process exits while being read
+        """
+
+        proc_dir = os.path.join(self.root, str(pid))
+        stat = self._read(os.path.join(proc_dir, 'stat'))
+        statm = self._read(os.path.join(proc_dir, 'statm'))
+        status = self._read(os.path.join(proc_dir, 'status'))
+
+        # The process name may contain spaces or parentheses, so split on the last parenthesis
+        name_start = stat.find('(')
+        name_end = stat.rfind(')')
+        if name_start < 0 or name_end < 0:  # pragma: no cover
+            raise ProcessLookupError(f'Could not parse stat file for process {pid}')
+
+        name = stat[name_start + 1:name_end]
+        fields = stat[name_end + 2:].split()
+
+        uid_start = status.find('\nUid:')
+        if uid_start < 0:  # pragma: no cover
+            raise ProcessLookupError(f'Could not parse status file for process {pid}')
+
+        uid = int(status[uid_start + 5:].split(None, 1)[0])
+
+        return (
+            pid,
+            int(fields[1]),  # Parent process ID
+            int(fields[2]),  # Process group ID
+            int(fields[3]),  # Session ID
+            uid,
+            name,
+            PROCESS_STATES.get(fields[0], fields[0]),
+            int(statm.split()[1]) * PAGE_SIZE,
+            int(fields[11]) + int(fields[12]),  # User plus system CPU time
+            int(fields[19])  # Start time in clock ticks since boot
+        )
+
+    def read_owner(self, pid: int) -> Tuple[int, str]:
+        """Return the owner and state of a single process from its status file alone
+
+        Args:
+            pid: The ID of the process to read
+
+        Returns:
+            The real user ID and single letter state of the process
+
+        Raises:
+            FileNotFoundError: If the process does not exist
+            ProcessLookupError: If the process exits while being read
+        """
+
+        status = self._read(os.path.join(self.root, str(pid), 'status'))
+        state_start = status.find('\nState:')
+        uid_start = status.find('\nUid:')
+        if state_start < 0 or uid_start < 0:  # pragma: no cover
+            raise ProcessLookupError(f'Could not parse status file for process {pid}')
+
+        return int(status[uid_start + 5:].split(None, 1)[0]), status[state_start + 7:].split(None, 1)[0]
+
+    def user_pids(self, uid: int) -> List[int]:
+        """Return the IDs of all live processes owned by the given user
+
+        Only the status file of each process is read. Zombie and dead
+        processes are excluded since they no longer hold any resources.
+
+        Args:
+            uid: The ID of the user
+
+        Returns:
+            A list of process IDs
+        """
+
+        pids = []
+        for pid in self.pids():
+            try:
+                owner, state = self.read_owner(pid)
+
+            except (FileNotFoundError, ProcessLookupError):  # pragma: no cover
+                continue
+
+            if owner == uid and state not in EXITED_STATES:
+                pids.append(pid)
+
+        return pids
+
+    def snapshot(self, pids: Optional[List[int]] = None) -> ProcessSnapshot:
+        """Return a snapshot of all currently running processes
+
+        Processes are read sequentially unless ``worker_count`` selects
+        more than one worker, in which case they are read concurrently.
+
+        Args:
+            pids: Optionally restrict the snapshot to the given process IDs
+
+        Returns:
+            A ``ProcessSnapshot`` instance
+        """
+
+        snapshot = ProcessSnapshot(uptime=self.uptime(), mem_total=self.mem_total())
+        pids = self.pids() if pids is None else list(pids)
+        workers = self.worker_count(len(pids))
+        if workers == 1:
+            self._read_processes(pids, snapshot)
+            return snapshot
+
+        # Contiguous shards are merged in order, so the result matches a sequential read
+        size = -(-len(pids) // workers)
+        shards = [pids[start:start + size] for start in range(0, len(pids), size)]
+        for shard in self._executor(workers).map(self._read_processes, shards):
+            snapshot.extend(shard)
+
+        return snapshot
+
+    def _read_processes(self, pids: List[int], snapshot: Optional[ProcessSnapshot] = None) -> ProcessSnapshot:
+        """Read the given processes into a snapshot, skipping any that exit while being read"""
+
+        if snapshot is None:
+            snapshot = ProcessSnapshot()
+
+        for pid in pids:
+            try:
+                snapshot.append(self.read_process(pid))
+
+            # Some processes may exit while fetching process info
+            # Ignore test coverage since this error is pseudo-random
+            except (FileNotFoundError, ProcessLookupError):  # pragma: no cover
+                pass
+
+        return snapshot
+
+
+class CPUSampler:
+    """Calculate CPU usage from the change in CPU time between snapshots
+
+    The previously sampled snapshot is retained and processes are matched
+    against it by process ID and start time (see ``diff_snapshots``), so
+    reused process IDs are never confused with their predecessors. Only
+    the most recent snapshot is retained, so memory usage is bounded by
+    the number of running processes.
+    """
+
+    def __init__(self) -> None:
+        """Create a sampler with no prior snapshot history"""
+
+        self._previous = ProcessSnapshot()
+
+    def sample(self, snapshot: ProcessSnapshot, diff: Optional[SnapshotDiff] = None) -> array:
+        """Return the CPU usage of each process in a snapshot
+
+        Usage is calculated relative to the previously sampled snapshot.
+        Processes without a previous sample (including all processes on the
+        first call) report their average usage over the process lifetime.
+        Values are percentages of a single CPU and may exceed 100 for
+        multithreaded processes.
+
+        Args:
+            snapshot: The snapshot to calculate CPU usage for
+            diff: Comparison of the previously sampled snapshot with ``snapshot``, calculated if not given
+
+        Returns:
+            An array of CPU percentages ordered to match the snapshot
+        """
+
+        if diff is None:
+            diff = diff_snapshots(self._previous, snapshot)
+
+        uptime, elapsed = snapshot.uptime, diff.elapsed
+        previous_ticks = self._previous.ticks
+        percentages = array('d')
+        for old, ticks, start_time in zip(diff.matches, snapshot.ticks, snapshot.start_time):
+            if old >= 0 and elapsed > 0:
+                percentages.append(100 * (ticks - previous_ticks[old]) / CLOCK_TICKS / elapsed)
+                continue
+
+            lifetime = uptime - start_time / CLOCK_TICKS
+            percentages.append(100 * ticks / CLOCK_TICKS / lifetime if lifetime > 0 else 0.0)
+
+        # Replacing the previous snapshot drops any processes that have since exited
+        self._previous = snapshot
+        return percentages
+
+
+class UserAccumulator:
+    """Maintain running per user totals of memory and CPU usage across snapshots
+
+    Totals are updated incrementally using only the processes that started,
+    exited, or changed since the previous snapshot.
+    """
+
+    def __init__(self) -> None:
+        """Create an accumulator with no prior snapshot history"""
+
+        self._previous = ProcessSnapshot()
+        self._cpu: Sequence[float] = array('d')
+        self._busy: List[int] = []
+        self.rss: Dict[int, int] = dict()
+        self.cpu: Dict[int, float] = dict()
+        self.count: Dict[int, int] = dict()
+
+    def _add(self, uid: int, rss: int, cpu: float, sign: int) -> None:
+        """Add (or subtract) the usage of a single process from the user totals"""
+
+        count = self.count.get(uid, 0) + sign
+        if count <= 0:
+            # Drop users without processes so floating point residue does not accumulate
+            self.count.pop(uid, None)
+            self.rss.pop(uid, None)
+            self.cpu.pop(uid, None)
+            return
+
+        self.count[uid] = count
+        self.rss[uid] = self.rss.get(uid, 0) + sign * rss
+        self.cpu[uid] = self.cpu.get(uid, 0.0) + sign * cpu
+
+    def update(self, snapshot: ProcessSnapshot, cpu: Sequence[float], diff: Optional[SnapshotDiff] = None) -> int:
+        """Update user totals to reflect a new snapshot
+
+        Only processes listed by the snapshot comparison as started, exited,
+        or changed are visited, together with processes that used CPU time
+        during the previous interval, whose usage may have dropped to zero.
+
+        Args:
+            snapshot: The most recent process snapshot
+            cpu: CPU usage of each process ordered to match the snapshot
+            diff: Comparison of the previous snapshot with ``snapshot``, calculated if not given
+
+        Returns:
+            The number of processes that started, exited, or changed
+        """
+
+        previous, previous_cpu = self._previous, self._cpu
+        if diff is None:
+            diff = diff_snapshots(previous, snapshot)
+
+        for row in diff.exited:
+            self._add(previous.uid[row], previous.rss[row], previous_cpu[row], sign=-1)
+
+        # Without a time interval every process reports its lifetime average CPU usage, so all rows are revisited
+        if diff.elapsed > 0:
+            keys = snapshot.keys()
+            rows = set(diff.started).union(diff.changed)
+            rows.update(keys.get((previous.pid[old], previous.start_time[old]), -1) for old in self._busy)
+            rows.discard(-1)
+
+        else:
+            rows = range(len(snapshot))
+
+        changed = len(diff.exited)
+        busy = []
+        matches, uids, rss_column = diff.matches, snapshot.uid, snapshot.rss
+        previous_uid, previous_rss = previous.uid, previous.rss
+        for row in rows:
+            old, uid, rss, usage = matches[row], uids[row], rss_column[row], cpu[row]
+            if usage:
+                busy.append(row)
+
+            if old >= 0:
+                if uid == previous_uid[old] and rss == previous_rss[old] and usage == previous_cpu[old]:
+                    continue
+
+                self._add(previous_uid[old], previous_rss[old], previous_cpu[old], sign=-1)
+
+            changed += 1
+            self._add(uid, rss, usage, sign=1)
+
+        self._previous, self._cpu, self._busy = snapshot, cpu, busy
+        return changed
@@ -0,0 +1,198 @@
+"""The ``report`` module builds and prints tabular reports from the
+application database.
+
+Rows are streamed directly from SQLAlchemy results and written as they are
+formatted, so printing a report never requires loading the full result set
+(or pandas) into memory.
+"""
+
+import csv
+import json
+import sys
+from datetime import datetime
+from itertools import islice
+from typing import Any, Iterable, List, Optional, Sequence, TextIO
+
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql import Select
+
+from .orm import Notification, User, Whitelist
+
+OUTPUT_FORMATS = ('table', 'jsonl', 'csv')
+
+
+def whitelist_query(now: datetime, limit: Optional[int] = None) -> Select:
+    """Return a query for all whitelist entries that are active at the given time
+
+    Args:
+        now: Only include entries ending after this time
+        limit: Optionally return at most this many entries
+
+    Returns:
+        A select statement with ``User``, ``Node``, ``Global``, ``Start`` and ``End`` columns
+    """
+
+    query = select(
+        User.name.label('User'),
+        Whitelist.node.label('Node'),
+        Whitelist.global_whitelist.label('Global'),
+        Whitelist.start_time.label('Start'),
+        Whitelist.end_time.label('End')
+    ).select_from(User).join(Whitelist) \
+        .where(Whitelist.end_time > now) \
+        .order_by(User.name, Whitelist.node)
+
+    return query.limit(limit) if limit is not None else query
+
+
+def notification_query(
+        username: Optional[str] = None, since: Optional[datetime] = None, limit: Optional[int] = None) -> Select:
+    """Return a query for previous user notifications, newest first
+
+    Args:
+        username: Only include notifications for the given user
+        since: Only include notifications sent at or after this time
+        limit: Optionally return at most this many notifications
+
+    Returns:
+        A select statement with ``node``, ``time``, ``memory`` and ``percentage``
+        columns, plus a leading ``user`` column when ``username`` is not given
+    """
+
+    columns = [Notification.node, Notification.time, Notification.memory, Notification.percentage]
+    if username is None:
+        columns.insert(0, User.name.label('user'))
+
+    query = select(*columns).join(User).order_by(Notification.time.desc())
+    if username is not None:
+        query = query.where(User.name == username)
+
+    if since is not None:
+        query = query.where(Notification.time >= since)
+
+    return query.limit(limit) if limit is not None else query
+
+
+class RowRenderer:
+    """Write rows of tabular data to a text stream as they arrive
+
+    The ``table`` format writes fixed width columns. Column widths are
+    calculated separately for each page of rows so that only a single page
+    is ever held in memory. The ``jsonl`` and ``csv`` formats write each row
+    as soon as it is read.
+    """
+
+    def __init__(self, output_format: str = 'table', page_size: int = 50, stream: Optional[TextIO] = None) -> None:
+        """Configure how rows are rendered
+
+        Args:
+            output_format: One of ``table``, ``jsonl`` or ``csv``
+            page_size: Number of rows per page in the ``table`` format
+            stream: Text stream to write to (defaults to STDOUT)
+
+        Raises:
+            ValueError: For an unknown output format or a non-positive page size
+        """
+
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f'Unknown output format {output_format}, must be one of {OUTPUT_FORMATS}')
+
+        if page_size < 1:
+            raise ValueError('Page size must be a positive integer')
+
+        self.output_format = output_format
+        self.page_size = page_size
+        self.stream = stream
+
+    @staticmethod
+    def format_value(value: Any) -> str:
+        """Return the text representation of a single value"""
+
+        if value is None:
+            return ''
+
+        if isinstance(value, datetime):
+            return value.isoformat(sep=' ', timespec='seconds')
+
+        if isinstance(value, float):
+            return f'{value:.2f}'
+
+        return str(value)
+
+    def render(self, columns: Sequence[str], rows: Iterable[Sequence]) -> int:
+        """Write the given rows to the output stream
+
+        Args:
+            columns: Column names in the same order as the row values
+            rows: Iterable of row values
+
+        Returns:
+            The number of rows written
+        """
+
+        stream = self.stream or sys.stdout
+        writer = getattr(self, f'_write_{self.output_format}')
+        count = writer(stream, list(columns), iter(rows))
+        stream.flush()
+        return count
+
+    def _write_table(self, stream: TextIO, columns: List[str], rows: Iterable[Sequence]) -> int:
+        """Write rows as pages of fixed width text columns"""
+
+        count = 0
+        while True:
+            page = [[self.format_value(value) for value in row] for row in islice(rows, self.page_size)]
+            if not page:
+                break
+
+            if count:
+                stream.write('\n')
+
+            widths = [max(len(value) for value in values) for values in zip(columns, *page)]
+            stream.write('  '.join(name.ljust(width) for name, width in zip(columns, widths)).rstrip() + '\n')
+            stream.write('  '.join('-' * width for width in widths) + '\n')
+            for row in page:
+                stream.write('  '.join(value.ljust(width) for value, width in zip(row, widths)).rstrip() + '\n')
+
+            count += len(page)
+
+        return count
+
+    def _write_jsonl(self, stream: TextIO, columns: List[str], rows: Iterable[Sequence]) -> int:
+        """Write each row as a JSON object on a separate line"""
+
+        count = 0
+        for row in rows:
+            stream.write(json.dumps(dict(zip(columns, row)), default=self.format_value) + '\n')
+            count += 1
+
+        return count
+
+    def _write_csv(self, stream: TextIO, columns: List[str], rows: Iterable[Sequence]) -> int:
+        """Write rows as comma separated values with a header line"""
+
+        writer = csv.writer(stream, lineterminator='\n')
+        writer.writerow(columns)
+
+        count = 0
+        for row in rows:
+            writer.writerow([self.format_value(value) for value in row])
+            count += 1
+
+        return count
+
+    def render_query(self, engine: Engine, query: Select) -> int:
+        """Execute a query and stream its results to the output stream
+
+        Args:
+            engine: Database engine to execute the query with
+            query: The query to execute
+
+        Returns:
+            The number of rows written
+        """
+
+        with engine.connect() as connection:
+            result = connection.execution_options(stream_results=True).execute(query)
+            return self.render(list(result.keys()), result)
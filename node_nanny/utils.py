@@ -1,19 +1,35 @@
 """Utilities for fetching and interacting with system data."""
 
-from datetime import datetime
+from array import array
+from datetime import datetime, timedelta
 from email.message import EmailMessage
-from smtplib import SMTP
+from typing import Collection, Dict, List, Optional, Tuple
 
-import psutil
+import numpy as np
 from pandas import DataFrame, read_sql
-from sqlalchemy import select
+from sqlalchemy import insert, select
 
-from node_nanny.orm import Notification, User, DBConnection
+from node_nanny.accounts import UserCache
+from node_nanny.cgroup import CgroupReader, SliceCPUSampler, SliceSpawnCounter
+from node_nanny.history import select_resolution, usage_history_query
+from node_nanny.kill import ProcessKiller
+from node_nanny.metrics import REGISTRY, STAGE_SECONDS
+from node_nanny.orm import Notification, OutboxMessage, User, DBConnection, upsert_users
+from node_nanny.proc import CPUSampler, ProcReader, ProcessSnapshot, SnapshotDiff, UserAccumulator, diff_snapshots
+from node_nanny.report import notification_query
+
+PROCESSES = REGISTRY.gauge('node_nanny_processes', 'Number of processes in the most recent snapshot')
+PROCESSES_STARTED = REGISTRY.counter(
+    'node_nanny_processes_started_total', 'Number of new processes found by comparing consecutive snapshots')
+NOTIFICATIONS = REGISTRY.counter('node_nanny_notifications_total', 'Number of user notifications recorded')
 
 
 class UserNotifier:
     """Handles the sending and tracking of user email notifications"""
 
+    # Repeated emails to the same user within this window are suppressed
+    dedup_window: timedelta = timedelta(minutes=30)
+
     def __init__(self, username: str) -> None:
         """Manage email notifications for the given user
 
@@ -24,9 +40,17 @@ class UserNotifier:
         self._username = username
 
     def get_user_email(self) -> str:
-        """Return the email corresponding to the current user"""
+        """Return the email corresponding to the current user
+
+        Users reported by ID, for example by nodes where the account could
+        not be resolved, are looked up again through the ``UserCache``.
+        """
+
+        username = self._username
+        if username.isdigit():
+            username = UserCache.username(int(username))
 
-        return self._username + '@pitt.edu'
+        return username + '@pitt.edu'
 
     def notification_history(self) -> DataFrame:
         """Return a tabular summary of previous user notifications
@@ -35,12 +59,43 @@ class UserNotifier:
             DataFrame with user notification history
         """
 
-        query = select(
-            Notification.node, Notification.time, Notification.memory, Notification.percentage
-        ).join(User).where(User.name == self._username)
+        return read_sql(notification_query(self._username), DBConnection.engine)
+
+    def usage_history(
+            self,
+            since: Optional[datetime] = None,
+            until: Optional[datetime] = None,
+            node: Optional[str] = None,
+            resolution: Optional[int] = None
+    ) -> DataFrame:
+        """Return the recorded usage of the user over time
+
+        Args:
+            since: Only include usage recorded at or after this time
+            until: Only include usage recorded before this time
+            node: Only include usage on the given node
+            resolution: Interval length in seconds (defaults to the finest resolution covering ``since``)
+
+        Returns:
+            DataFrame with the mean CPU and peak memory usage over each interval
+        """
+
+        if resolution is None:
+            resolution = select_resolution(since, datetime.now())
 
+        query = usage_history_query(self._username, resolution, since=since, until=until, node=node)
         return read_sql(query, DBConnection.engine)
 
+    def _build_message(self) -> EmailMessage:
+        """Return the email message sent to the user when their processes are killed"""
+
+        message = EmailMessage()
+        message.set_content("This is email text")
+        message["Subject"] = "Email subject"
+        message["From"] = "from_user@dummy.domain.edu"
+        message["To"] = self.get_user_email()
+        return message
+
     def notify(self, node: str, usage: DataFrame, limit: int) -> None:
         """Notify the user their running processes have been killed
 
@@ -50,89 +105,288 @@ class UserNotifier:
             limit: The memory limit used to trigger the notification
         """
 
-        # Update the notification table in the database
+        self.notify_all(node, {self._username: usage}, limit)
+
+    @classmethod
+    def notify_all(cls, node: str, usage: Dict[str, DataFrame], limit: int) -> None:
+        """Notify multiple users their running processes have been killed
+
+        Notification records and outgoing emails for all users are written
+        in a single transaction. Emails are added to the outbox table and
+        sent separately by an ``OutboxSender``, so this method never waits
+        on the mail server. Users who were already emailed within the
+        ``dedup_window`` are not emailed again.
+
+        Args:
+            node: Hostname of node the processes were running on
+            usage: System information for the killed processes keyed by username
+            limit: The memory limit used to trigger the notifications
+        """
+
+        if not usage:
+            return
+
+        with STAGE_SECONDS.time(stage='notify'):
+            cls._notify_all(node, usage, limit)
+
+        NOTIFICATIONS.inc(len(usage))
+
+    @classmethod
+    def _notify_all(cls, node: str, usage: Dict[str, DataFrame], limit: int) -> None:
+        """Record notifications and queue emails in a single transaction (see ``notify_all``)"""
+
+        now = datetime.now()
+        recipients = {cls(name).get_user_email(): name for name in usage}
         with DBConnection.session() as session:
-            # If the user has not been notified before, create a new User record
-            user_query = select(User).where(User.name == self._username)
-            user = session.execute(user_query).scalars().first()
-            if user is None:
-                user = User(name=self._username)
-
-            notification = Notification(
-                user=user,
-                node=node,
-                time=datetime.now(),
-                percentage=usage.MEM.sum(),
-                limit=limit
-            )
-
-            session.add(user)
-            session.add(notification)
+            # Create records for any users who have not been notified before
+            upsert_users(session, list(usage))
+
+            user_ids = dict(session.execute(select(User.name, User.id).where(User.name.in_(usage))).all())
+            session.execute(insert(Notification), [
+                dict(
+                    user_id=user_ids[name],
+                    node=node,
+                    time=now,
+                    memory=int(user_usage.RSS.sum() // 1024 ** 2),
+                    percentage=user_usage.MEM.sum(),
+                    limit=limit
+                ) for name, user_usage in usage.items()
+            ])
+
+            # Skip users who were recently emailed about a previous notification
+            recent_query = select(OutboxMessage.recipient).distinct() \
+                .where(OutboxMessage.recipient.in_(recipients)) \
+                .where(OutboxMessage.created > now - cls.dedup_window)
+
+            recently_emailed = set(session.execute(recent_query).scalars())
+            messages = []
+            for recipient, name in recipients.items():
+                if recipient in recently_emailed:
+                    continue
+
+                message = cls(name)._build_message()
+                messages.append(dict(
+                    sender=message['From'],
+                    recipient=recipient,
+                    subject=message['Subject'],
+                    body=message.get_content(),
+                    created=now,
+                    next_attempt=now,
+                    attempts=0
+                ))
+
+            if messages:
+                session.execute(insert(OutboxMessage), messages)
+
             session.commit()
 
-        message = EmailMessage()
-        message.set_content("This is email text")
-        message["Subject"] = "Email subject"
-        message["From"] = "from_user@dummy.domain.edu"
-        message["To"] = self.get_user_email()
 
-        with SMTP("localhost") as smtp:
-            smtp.send_message(message)
+def top_k(values: np.ndarray, k: Optional[int] = None) -> np.ndarray:
+    """Return the positions of the largest values in descending order
+
+    Only the selected values are sorted, so the cost is linear in the
+    number of values rather than ``n log n``.
+
+    Args:
+        values: One dimensional array of values
+        k: Maximum number of positions to return (defaults to all values)
+
+    Returns:
+        An array of positions into ``values``
+    """
+
+    if k is None or k >= len(values):
+        return np.argsort(-values, kind='stable')
+
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    selected = np.argpartition(-values, k - 1)[:k]
+    return selected[np.argsort(-values[selected], kind='stable')]
 
 
 class SystemUsage:
     """Fetch current system usage information"""
 
-    @staticmethod
-    def _get_process_data(pid: int) -> dict:
-        """Return the current system usage for a single running processes
+    _reader: ProcReader = ProcReader()
+    _sampler: CPUSampler = CPUSampler()
+    _accumulator: UserAccumulator = UserAccumulator()
+    _snapshot: ProcessSnapshot = ProcessSnapshot()
+    _cpu: array = array('d')
+    _diff: SnapshotDiff = diff_snapshots(ProcessSnapshot(), ProcessSnapshot())
+    _arrays: Tuple = (None, None, None, None)
+
+    @classmethod
+    def configure(cls, proc_root: str = '/proc', workers: Optional[int] = 1, executor: str = 'process') -> None:
+        """Update the location used to read process information
+
+        Changes made here will affect the entire running application
 
         Args:
-            pid: The ID of a currently running process
+            proc_root: Path of the ``/proc`` filesystem, or a directory mimicking it
+            workers: Number of workers reading processes concurrently, or ``None`` to choose automatically
+            executor: Read processes concurrently in a pool of ``thread`` or ``process`` workers
+        """
+
+        cls._reader.close()
+        cls._reader = ProcReader(proc_root, workers, executor)
+        cls._sampler = CPUSampler()
+        cls._accumulator = UserAccumulator()
+        cls._snapshot = ProcessSnapshot()
+        cls._cpu = array('d')
+        cls._diff = diff_snapshots(cls._snapshot, cls._snapshot)
+
+    @classmethod
+    def set_workers(cls, workers: Optional[int] = 1, executor: str = 'process') -> None:
+        """Change how many workers read process information concurrently
+
+        Unlike ``configure``, the history of previous snapshots is kept.
+
+        Args:
+            workers: Number of workers reading processes concurrently, or ``None`` to choose automatically
+            executor: Read processes concurrently in a pool of ``thread`` or ``process`` workers
+        """
+
+        cls._reader.set_workers(workers, executor)
+
+    @classmethod
+    def close(cls) -> None:
+        """Shut down any workers used to read process information concurrently"""
+
+        cls._reader.close()
+
+    @classmethod
+    def cgroup_reader(cls) -> CgroupReader:
+        """Return the reader used to control user slices, defaulting to ``/sys/fs/cgroup``"""
+
+        return CgroupReader()
+
+    @classmethod
+    def killer(cls, **kwargs) -> ProcessKiller:
+        """Return a ``ProcessKiller`` reading processes from the same source as this class
+
+        Args:
+            **kwargs: Additional arguments for the ``ProcessKiller`` constructor
 
         Returns:
-            A dictionary with system usage information for the given proces ID
+            A ``ProcessKiller`` instance
+        """
 
-        Raises:
-            psutil.NoSuchProcess: If the given process ID can not be found
+        return ProcessKiller(cls._reader, **kwargs)
+
+    @classmethod
+    def latest_snapshot(cls) -> Optional[ProcessSnapshot]:
+        """Return the most recent snapshot of the whole process table
+
+        Returns:
+            The snapshot taken by the last call reading system usage
+        """
+
+        return cls._snapshot
+
+    @classmethod
+    def _refresh(cls, username: Optional[str] = None) -> None:
+        """Take a new process snapshot and update per user totals
+
+        The new snapshot is compared with the previous one once, and the
+        comparison is shared by CPU sampling, the per user totals, and the
+        per user spawn rates.
+
+        Args:
+            username: The user whose processes are required (unused, all processes are read)
         """
 
-        process = psutil.Process(pid)
-        return {
-            'PID': pid,
-            'PNAME': process.name(),
-            'USER': process.username(),
-            'STATUS': process.status(),
-            'CPU': process.cpu_percent(),
-            'MEM': process.memory_percent()
-        }
+        with STAGE_SECONDS.time(stage='snapshot'):
+            snapshot = cls._reader.snapshot()
+            diff = diff_snapshots(cls._snapshot, snapshot)
+            cpu = cls._sampler.sample(snapshot, diff)
+            cls._accumulator.update(snapshot, cpu, diff)
+            cls._snapshot, cls._cpu, cls._diff = snapshot, cpu, diff
+
+        PROCESSES.set(len(snapshot))
+        if diff.elapsed > 0:
+            PROCESSES_STARTED.inc(len(diff.started))
+
+    @classmethod
+    def _usage_frame(cls, rows: Optional[List[int]] = None) -> DataFrame:
+        """Build a ``DataFrame`` of process usage from the latest snapshot
+
+        Args:
+            rows: Optionally restrict the returned data to the given snapshot positions
+
+        Returns:
+            A ``DataFrame`` indexed by username and process ID
+        """
+
+        snapshot = cls._snapshot
+        columns = snapshot.to_numpy()
+        selection = slice(None) if rows is None else np.asarray(rows, dtype=np.intp)
+        uid = columns['uid'][selection]
+        rss = columns['rss'][selection]
+
+        # Resolve each distinct user ID once instead of once per process
+        distinct_uids, user_codes = np.unique(uid, return_inverse=True)
+        usernames = np.array([cls._reader.username(user_id) for user_id in distinct_uids.tolist()], dtype=object)
+
+        return DataFrame({
+            'USER': usernames[user_codes],
+            'PID': columns['pid'][selection],
+            'PNAME': snapshot.name.to_categorical()[selection],
+            'STATUS': snapshot.status.to_categorical()[selection],
+            'CPU': np.frombuffer(cls._cpu, dtype=float)[selection],
+            'MEM': rss / (snapshot.mem_total or 1) * 100,
+            'RSS': rss,
+        }).set_index(['USER', 'PID'])
 
     @classmethod
     def current_usage(cls) -> DataFrame:
         """Return the current system usage for all running processes
 
+        CPU usage is measured since the previous call, or over the lifetime
+        of each process when there is no previous call to compare against.
+
         Returns:
             A ``DataFrame`` of currently running processes
         """
 
-        data = []
-        for process in psutil.pids():
-            try:
-                data.append(cls._get_process_data(process))
+        cls._refresh()
+        return cls._usage_frame()
 
-            # Some subprocesses may exit while fetching process info
-            # Ignore test coverage since this error is pseudo-random
-            except psutil.NoSuchProcess:  # pragma: no cover
-                pass
+    @classmethod
+    def user_totals(cls) -> DataFrame:
+        """Return the current system usage summed over each user
+
+        Totals are maintained incrementally between calls, so only processes
+        that changed since the previous snapshot contribute to the cost of
+        aggregation. ``SPAWNS`` is the number of processes each user started
+        per second since the previous snapshot (zero on the first call).
+
+        Returns:
+            A ``DataFrame`` indexed by username with CPU, memory, process counts, and spawn rates
+        """
 
-        return DataFrame(data).set_index(['USER', 'PID'])
+        cls._refresh()
+        accumulator = cls._accumulator
+        uids = list(accumulator.count)
+        rss = np.array([accumulator.rss[uid] for uid in uids], dtype=np.int64)
+        spawn_rates = cls._diff.spawn_rates()
+
+        return DataFrame({
+            'USER': [cls._reader.username(uid) for uid in uids],
+            'CPU': np.array([accumulator.cpu[uid] for uid in uids], dtype=float),
+            'MEM': rss / (cls._snapshot.mem_total or 1) * 100,
+            'RSS': rss,
+            'PROCS': np.array([accumulator.count[uid] for uid in uids], dtype=np.int64),
+            'SPAWNS': np.array([spawn_rates.get(uid, 0.0) for uid in uids], dtype=float)
+        }).set_index('USER')
 
     @classmethod
-    def user_usage(cls, username: str) -> DataFrame:
+    def user_usage(cls, username: str, refresh: bool = True) -> DataFrame:
         """Return the current system usage for all processes tied to a given user
 
         Args:
             username: The name of the user to return usage for
+            refresh: Take a new snapshot instead of reusing the most recent one
 
         Returns:
             A ``DataFrame`` of running processes tied to the given user
@@ -141,8 +395,232 @@ class SystemUsage:
             ValueError: If no running processes are found for the given user
         """
 
-        try:
-            return cls.current_usage().loc[username]
+        if refresh:
+            cls._refresh(username)
 
-        except KeyError:
+        uid_column = cls._snapshot.uid
+        uids = {uid for uid in set(uid_column) if cls._reader.username(uid) == username}
+        rows = [row for row, uid in enumerate(uid_column) if uid in uids]
+        if not rows:
             raise ValueError(f'No running processes found for user {username}')
+
+        return cls._usage_frame(rows).loc[username]
+
+    @classmethod
+    def top_users(cls, k: Optional[int] = None, min_mem: float = 0, min_spawns: Optional[float] = None) -> DataFrame:
+        """Return the current usage of the users with the largest memory usage
+
+        Users are ranked using a partial selection over the per user totals,
+        so ranking does not require sorting every user.
+
+        Args:
+            k: Maximum number of users to return (defaults to all eligible users)
+            min_mem: Ignore users below this percentage of system memory
+            min_spawns: Also include users below ``min_mem`` starting at least this many processes per second
+
+        Returns:
+            A ``DataFrame`` in the format of ``user_totals`` ordered by decreasing memory usage
+        """
+
+        totals = cls.user_totals()
+        memory = totals.MEM.to_numpy()
+        eligible = memory >= min_mem
+        if min_spawns is not None:
+            eligible |= totals.SPAWNS.to_numpy() >= min_spawns
+
+        eligible = np.flatnonzero(eligible)
+        return totals.iloc[eligible[top_k(memory[eligible], k)]]
+
+    @classmethod
+    def top_processes(cls, usernames: Collection[str], k: int = 1) -> DataFrame:
+        """Return the processes of each user with the largest memory usage from the most recent snapshot
+
+        Processes are ranked by partial selection and only the selected
+        processes are converted into a ``DataFrame``.
+
+        Args:
+            usernames: The names of the users
+            k: Maximum number of processes to return per user
+
+        Returns:
+            A ``DataFrame`` indexed by username and process ID, ordered by user and decreasing memory usage
+
+        Raises:
+            ValueError: If no running processes are found for any of the given users
+        """
+
+        # Views of the snapshot columns and the distinct user IDs are reused until the next snapshot is taken
+        snapshot = cls._snapshot
+        if cls._arrays[0] is not snapshot:
+            columns = snapshot.to_numpy()
+            uid_array, rss_array = columns['uid'], columns['rss']
+            cls._arrays = (snapshot, uid_array, rss_array, np.unique(uid_array).tolist())
+
+        _, uid_array, rss_array, distinct_uids = cls._arrays
+        rows = []
+        for username in usernames:
+            uids = [uid for uid in distinct_uids if cls._reader.username(uid) == username]
+            user_rows = np.flatnonzero(np.isin(uid_array, uids))
+            rows.extend(user_rows[top_k(rss_array[user_rows], k)].tolist())
+
+        if not rows:
+            raise ValueError(f'No running processes found for users {list(usernames)}')
+
+        return cls._usage_frame(rows)
+
+
+class CgroupUsage(SystemUsage):
+    """Fetch current system usage information from cgroup v2 user slices
+
+    Provides the same interface as ``SystemUsage``. Per user totals are read
+    directly from each ``user-<uid>.slice`` cgroup and only count processes
+    running inside user slices. Per process information is read only for
+    processes inside the relevant slices.
+    """
+
+    _reader: ProcReader = ProcReader()
+    _cgroups: CgroupReader = CgroupReader()
+    _sampler: CPUSampler = CPUSampler()
+    _slice_sampler: SliceCPUSampler = SliceCPUSampler()
+    _slice_spawns: SliceSpawnCounter = SliceSpawnCounter()
+    _accumulator: UserAccumulator = UserAccumulator()
+    _snapshot: ProcessSnapshot = ProcessSnapshot()
+    _cpu: array = array('d')
+
+    @classmethod
+    def configure(
+            cls,
+            proc_root: str = '/proc',
+            cgroup_root: str = '/sys/fs/cgroup',
+            workers: Optional[int] = 1,
+            executor: str = 'process'
+    ) -> None:
+        """Update the locations used to read process and cgroup information
+
+        Changes made here will affect the entire running application
+
+        Args:
+            proc_root: Path of the ``/proc`` filesystem, or a directory mimicking it
+            cgroup_root: Path of the cgroup v2 filesystem, or a directory mimicking it
+            workers: Number of workers reading processes concurrently, or ``None`` to choose automatically
+            executor: Read processes concurrently in a pool of ``thread`` or ``process`` workers
+        """
+
+        super().configure(proc_root, workers, executor)
+        cls._cgroups = CgroupReader(cgroup_root)
+        cls._slice_sampler = SliceCPUSampler()
+        cls._slice_spawns = SliceSpawnCounter()
+
+    @classmethod
+    def cgroup_reader(cls) -> CgroupReader:
+        """Return the reader used to read and control user slices"""
+
+        return cls._cgroups
+
+    @classmethod
+    def killer(cls, **kwargs) -> ProcessKiller:
+        """Return a ``ProcessKiller`` that kills user slices through ``cgroup.kill`` where supported
+
+        Args:
+            **kwargs: Additional arguments for the ``ProcessKiller`` constructor
+
+        Returns:
+            A ``ProcessKiller`` instance
+        """
+
+        return ProcessKiller(cls._reader, cls._cgroups, **kwargs)
+
+    @classmethod
+    def latest_snapshot(cls) -> Optional[ProcessSnapshot]:
+        """Return ``None``, as snapshots only include processes inside user slices
+
+        Killing a user requires every process to decide which process groups
+        can be signalled as a whole, so partial snapshots are not returned.
+        """
+
+        return None
+
+    @classmethod
+    def _refresh(cls, username: Optional[str] = None) -> None:
+        """Take a new snapshot of processes running inside user slices
+
+        Args:
+            username: Optionally only read processes from the slice of the given user
+        """
+
+        uid = None
+        if username is not None:
+            uids = [uid for uid in cls._cgroups.slices() if cls._reader.username(uid) == username]
+            if not uids:
+                cls._snapshot, cls._cpu = ProcessSnapshot(), array('d')
+                return
+
+            uid = uids[0]
+
+        with STAGE_SECONDS.time(stage='snapshot'):
+            snapshot = cls._reader.snapshot(cls._cgroups.pids(uid))
+            cls._snapshot, cls._cpu = snapshot, cls._sampler.sample(snapshot)
+
+        if uid is None:
+            PROCESSES.set(len(snapshot))
+
+    @classmethod
+    def user_totals(cls) -> DataFrame:
+        """Return the current system usage summed over each user slice
+
+        Memory usage reflects the working set of each slice, which includes
+        kernel memory and counts shared pages once. Spawn rates are estimated
+        from the processes that joined each slice since the previous call.
+
+        Returns:
+            A ``DataFrame`` indexed by username with CPU, memory, process counts, and spawn rates
+        """
+
+        snapshot = cls._cgroups.snapshot()
+        working_set = np.array(snapshot.working_set, dtype=np.int64)
+        pids = [cls._cgroups.pids(uid) for uid in snapshot.uid]
+
+        return DataFrame({
+            'USER': [cls._reader.username(uid) for uid in snapshot.uid],
+            'CPU': np.array(cls._slice_sampler.sample(snapshot), dtype=float),
+            'MEM': working_set / cls._reader.mem_total() * 100,
+            'RSS': working_set,
+            'PROCS': np.array([len(members) for members in pids], dtype=np.int64),
+            'SPAWNS': np.array(cls._slice_spawns.sample(snapshot, pids), dtype=float)
+        }).set_index('USER')
+
+    @classmethod
+    def user_usage(cls, username: str, refresh: bool = True) -> DataFrame:
+        """Return the current system usage for all processes in a given user's slice
+
+        Args:
+            username: The name of the user to return usage for
+            refresh: Ignored, the user's slice is always read since totals do not rely on process snapshots
+
+        Returns:
+            A ``DataFrame`` of running processes tied to the given user
+
+        Raises:
+            ValueError: If no running processes are found for the given user
+        """
+
+        return super().user_usage(username, refresh=True)
+
+    @classmethod
+    def top_processes(cls, usernames: Collection[str], k: int = 1) -> DataFrame:
+        """Return the processes in each user's slice with the largest memory usage
+
+        Args:
+            usernames: The names of the users
+            k: Maximum number of processes to return per user
+
+        Returns:
+            A ``DataFrame`` indexed by username and process ID, ordered by user and decreasing memory usage
+
+        Raises:
+            ValueError: If no running processes are found for any of the given users
+        """
+
+        usernames = list(usernames)
+        cls._refresh(usernames[0] if len(usernames) == 1 else None)
+        return super().top_processes(usernames, k)
@@ -0,0 +1,99 @@
+"""Tests for the ``UserCache`` class."""
+
+import os
+import pwd
+from unittest import TestCase
+from unittest.mock import patch
+
+from node_nanny.accounts import UserCache
+
+
+class LookupCaching(TestCase):
+    """Test lookups are cached and counted"""
+
+    def setUp(self) -> None:
+        UserCache.configure()
+
+    def tearDown(self) -> None:
+        UserCache.configure()
+
+    def test_known_user(self) -> None:
+        """Test IDs and names resolve to the matching account"""
+
+        uid = os.getuid()
+        name = pwd.getpwuid(uid).pw_name
+        self.assertEqual(name, UserCache.username(uid))
+        self.assertEqual(uid, UserCache.uid(name))
+
+    def test_unknown_user(self) -> None:
+        """Test IDs and names without an account resolve to defaults"""
+
+        self.assertEqual('987654', UserCache.username(987654))
+        self.assertIsNone(UserCache.uid('fake_username'))
+
+    def test_repeated_lookups_cached(self) -> None:
+        """Test the name service is only queried on the first lookup"""
+
+        with patch('node_nanny.accounts.pwd.getpwuid', wraps=pwd.getpwuid) as mock_lookup:
+            for _ in range(3):
+                UserCache.username(os.getuid())
+
+        mock_lookup.assert_called_once()
+        self.assertEqual(1, UserCache.misses)
+        self.assertEqual(2, UserCache.hits)
+
+    def test_failed_lookups_cached(self) -> None:
+        """Test lookups for unknown IDs are cached and counted separately"""
+
+        with patch('node_nanny.accounts.pwd.getpwuid', side_effect=KeyError) as mock_lookup:
+            UserCache.username(987654)
+            UserCache.username(987654)
+
+        mock_lookup.assert_called_once()
+        self.assertEqual(1, UserCache.stats()['negative_hits'])
+
+    def test_reverse_lookup_cached(self) -> None:
+        """Test resolving a user ID also caches the username lookup"""
+
+        uid = os.getuid()
+        name = UserCache.username(uid)
+        with patch('node_nanny.accounts.pwd.getpwnam') as mock_lookup:
+            self.assertEqual(uid, UserCache.uid(name))
+
+        mock_lookup.assert_not_called()
+
+
+class LookupExpiry(TestCase):
+    """Test cached lookups expire after their time to live"""
+
+    def tearDown(self) -> None:
+        UserCache.configure()
+
+    def test_expired_lookup_repeated(self) -> None:
+        """Test expired entries are looked up again"""
+
+        UserCache.configure(ttl=0, negative_ttl=0)
+        with patch('node_nanny.accounts.pwd.getpwuid', wraps=pwd.getpwuid) as mock_lookup:
+            UserCache.username(os.getuid())
+            UserCache.username(os.getuid())
+
+        self.assertEqual(2, mock_lookup.call_count)
+        self.assertEqual(0, UserCache.hits)
+
+
+class Preload(TestCase):
+    """Test loading all accounts in a single request"""
+
+    def tearDown(self) -> None:
+        UserCache.configure()
+
+    def test_preloaded_lookups_hit(self) -> None:
+        """Test preloaded accounts are resolved without querying the name service"""
+
+        UserCache.configure(preload=True)
+        self.assertEqual(len(pwd.getpwall()), UserCache.stats()['preloaded'])
+        expected = pwd.getpwuid(os.getuid()).pw_name
+        with patch('node_nanny.accounts.pwd.getpwuid') as mock_lookup:
+            self.assertEqual(expected, UserCache.username(os.getuid()))
+
+        mock_lookup.assert_not_called()
@@ -0,0 +1,69 @@
+"""Tests for the ``MonitorUtility.kill`` method."""
+
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from node_nanny.app import MonitorUtility
+from node_nanny.kill import KillResult
+from node_nanny.outbox import OutboxSender
+from node_nanny.utils import SystemUsage
+from tests.fake_proc import write_process, write_system
+from tests.smtp_server import LocalSMTPServer
+
+
+class NotificationDelivery(TestCase):
+    """Test users are emailed before the kill command returns"""
+
+    def setUp(self) -> None:
+        """Create a fake process table and a local SMTP server"""
+
+        self._temp_dir = TemporaryDirectory()
+        root = Path(self._temp_dir.name)
+        write_system(root, mem_total=1024 ** 3)
+        write_process(root, 100, uid=987654, rss=512 * 1024 ** 2)
+        SystemUsage.configure(str(root))
+
+        self.server = LocalSMTPServer().__enter__()
+        self.addCleanup(self.server.__exit__)
+
+        self.app = MonitorUtility('sqlite:///:memory:')
+        self.app._sender = OutboxSender(smtp_port=self.server.port)
+
+        result = KillResult(uid=987654, method='signal', signalled=1, rounds=0, remaining=0, latency=0)
+        kill_patch = patch.object(MonitorUtility, 'terminate', return_value=result)
+        self.mock_kill = kill_patch.start()
+        self.addCleanup(kill_patch.stop)
+
+    def tearDown(self) -> None:
+        SystemUsage.configure()
+        self._temp_dir.cleanup()
+
+    def test_email_delivered(self) -> None:
+        """Test the notification email is sent without a running scan service"""
+
+        with redirect_stdout(StringIO()):
+            self.app.kill('987654')
+
+        self.assertEqual(1, len(self.server.messages))
+        self.assertEqual(0, self.app._sender.queue_depth())
+
+    def test_snapshot_reused(self) -> None:
+        """Test the kill is planned from the snapshot read for the notification"""
+
+        with redirect_stdout(StringIO()):
+            self.app.kill('987654')
+
+        self.mock_kill.assert_called_once_with('987654', 'proc', SystemUsage.latest_snapshot())
+        self.assertEqual([100], list(SystemUsage.latest_snapshot().pid))
+
+    def test_quiet_sends_nothing(self) -> None:
+        """Test no email is sent when notifications are disabled"""
+
+        with redirect_stdout(StringIO()):
+            self.app.kill('987654', quiet=True)
+
+        self.assertEqual([], self.server.messages)
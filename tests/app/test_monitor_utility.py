@@ -1,6 +1,9 @@
 """Tests for the ``MonitorUtility`` class."""
 
-from datetime import timedelta, date
+import json
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta, date
+from io import StringIO
 from pathlib import Path
 from tempfile import NamedTemporaryFile
 from unittest import TestCase
@@ -9,7 +12,7 @@ from sqlalchemy import select
 
 from node_nanny import __file__ as package_file
 from node_nanny.app import MonitorUtility
-from node_nanny.orm import User, DBConnection, Whitelist
+from node_nanny.orm import Notification, User, DBConnection, Whitelist
 
 
 class TestDBConfiguration(TestCase):
@@ -76,6 +79,31 @@ class AddUserToWhitelist(TestCase):
             duration = whitelist_record.end_time - whitelist_record.start_time
             self.assertEqual(2, duration.days)
 
+    def test_other_users_unaffected(self) -> None:
+        """Test whitelisting a user does not modify whitelist records of other users"""
+
+        app = MonitorUtility('sqlite:///:memory:')
+        app.add('user1', node='node1.domain.com', duration=timedelta(days=1))
+        app.add('user2', node='node1.domain.com', duration=timedelta(days=5))
+
+        with DBConnection.session() as session:
+            records = session.execute(select(User.name, Whitelist.node).join(Whitelist)).all()
+
+        self.assertCountEqual([('user1', 'node1.domain.com'), ('user2', 'node1.domain.com')], records)
+
+    def test_single_global_record(self) -> None:
+        """Test repeated global whitelisting updates a single record"""
+
+        app = MonitorUtility('sqlite:///:memory:')
+        app.add('test_user', _global=True)
+        app.add('test_user', node='node1.domain.com', _global=True)
+
+        with DBConnection.session() as session:
+            records = session.execute(select(Whitelist)).scalars().all()
+            self.assertEqual(1, len(records))
+            self.assertIsNone(records[0].node)
+            self.assertTrue(records[0].global_whitelist)
+
 
 class RemoveUserFromWhitelist(TestCase):
     """Test the removal of users from the whitelist"""
@@ -94,3 +122,150 @@ class RemoveUserFromWhitelist(TestCase):
         with DBConnection.session() as session:
             whitelist_record = session.execute(query).scalars().first()
             self.assertEqual(date.today(), whitelist_record.end_time.date())
+
+    def test_readded_user_restarts(self) -> None:
+        """Test re-adding a removed user starts a new whitelist period"""
+
+        username = 'test_user'
+        node = 'node1.domain.com'
+        app = MonitorUtility('sqlite:///:memory:')
+
+        app.add(username, node=node, duration=timedelta(days=100))
+        app.remove(username, node=node)
+        app.add(username, node=node, duration=timedelta(days=1))
+
+        query = select(Whitelist).join(User).where(User.name == username)
+        with DBConnection.session() as session:
+            whitelist_record = session.execute(query).scalars().one()
+            self.assertEqual(1, (whitelist_record.end_time - whitelist_record.start_time).days)
+
+
+class BulkWhitelistChanges(TestCase):
+    """Test whitelisting and removing multiple users and nodes at once"""
+
+    def setUp(self) -> None:
+        """Whitelist multiple users on multiple nodes"""
+
+        self.app = MonitorUtility('sqlite:///:memory:')
+        self.users = ['user1', 'user2', 'user3']
+        self.nodes = ['node1', 'node2']
+        with redirect_stdout(StringIO()):
+            self.app.add(self.users, node=self.nodes, duration=timedelta(days=1))
+
+    def active_entries(self) -> list:
+        """Return the user and node names of all active whitelist entries"""
+
+        query = select(User.name, Whitelist.node).join(Whitelist).where(Whitelist.end_time > datetime.now())
+        with DBConnection.session() as session:
+            return session.execute(query).all()
+
+    def test_every_pair_added(self) -> None:
+        """Test an entry is created for every combination of user and node"""
+
+        expected = [(user, node) for user in self.users for node in self.nodes]
+        self.assertCountEqual(expected, self.active_entries())
+
+    def test_throughput_reported(self) -> None:
+        """Test the number of processed pairs is reported for bulk changes"""
+
+        with redirect_stdout(StringIO()) as stdout:
+            self.app.add(self.users, node=self.nodes)
+
+        self.assertIn('Whitelisted 6 user/node pairs', stdout.getvalue())
+
+    def test_bulk_remove(self) -> None:
+        """Test entries are removed for every combination of user and node"""
+
+        with redirect_stdout(StringIO()):
+            self.app.remove(['user1', 'user2'], node=['node1', 'node2'])
+
+        self.assertCountEqual([('user3', 'node1'), ('user3', 'node2')], self.active_entries())
+
+    def test_error_on_empty_user_list(self) -> None:
+        """Test for value error when no users are given"""
+
+        with self.assertRaises(ValueError):
+            self.app.add([], node=self.nodes)
+
+        with self.assertRaises(ValueError):
+            self.app.remove([], node=self.nodes)
+
+    def test_global_remove(self) -> None:
+        """Test global removal ends entries on every node"""
+
+        self.app.remove('user1', _global=True)
+        self.assertNotIn('user1', {user for user, _ in self.active_entries()})
+
+
+class PrintWhitelist(TestCase):
+    """Test the printing of active whitelist entries"""
+
+    def setUp(self) -> None:
+        """Whitelist multiple users on a single node"""
+
+        self.app = MonitorUtility('sqlite:///:memory:')
+        with redirect_stdout(StringIO()):
+            self.app.add(['user1', 'user2', 'user3'], node='node1', duration=timedelta(days=2))
+
+    def test_end_time_printed(self) -> None:
+        """Test the printed end time reflects the whitelist duration"""
+
+        with redirect_stdout(StringIO()) as stdout:
+            self.app.whitelist(output_format='jsonl')
+
+        records = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual(['user1', 'user2', 'user3'], [record['User'] for record in records])
+
+        start = datetime.strptime(records[0]['Start'], '%Y-%m-%d %H:%M:%S')
+        end = datetime.strptime(records[0]['End'], '%Y-%m-%d %H:%M:%S')
+        self.assertEqual(2, round((end - start) / timedelta(days=1)))
+
+    def test_limit(self) -> None:
+        """Test the number of printed entries is limited"""
+
+        with redirect_stdout(StringIO()) as stdout:
+            self.app.whitelist(output_format='csv', limit=2)
+
+        self.assertEqual(3, len(stdout.getvalue().splitlines()))
+
+
+class PrintHistory(TestCase):
+    """Test the printing of notification history"""
+
+    def setUp(self) -> None:
+        """Record notifications for multiple users on different days"""
+
+        self.app = MonitorUtility('sqlite:///:memory:')
+        with DBConnection.session() as session:
+            for name, day in (('user1', 1), ('user2', 2), ('user1', 3)):
+                user = session.execute(select(User).where(User.name == name)).scalars().first() or User(name=name)
+                session.add(Notification(
+                    user=user, node='node1', time=datetime(2021, 1, day), memory=100, percentage=50, limit=20))
+
+            session.commit()
+
+    def history(self, **kwargs) -> list:
+        """Return the printed notification history as a list of dictionaries"""
+
+        with redirect_stdout(StringIO()) as stdout:
+            self.app.history(output_format='jsonl', **kwargs)
+
+        return [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+    def test_newest_first(self) -> None:
+        """Test notifications for all users are printed newest first"""
+
+        records = self.history()
+        self.assertEqual(['user1', 'user2', 'user1'], [record['user'] for record in records])
+        self.assertEqual('2021-01-03 00:00:00', records[0]['time'])
+
+    def test_user_filter(self) -> None:
+        """Test only notifications for the given user are printed"""
+
+        self.assertEqual(2, len(self.history(user='user1')))
+
+    def test_since_and_limit(self) -> None:
+        """Test notifications are filtered by time and limited in number"""
+
+        self.assertEqual(2, len(self.history(since=datetime(2021, 1, 2))))
+        self.assertEqual(1, len(self.history(since=datetime(2021, 1, 2), limit=1)))
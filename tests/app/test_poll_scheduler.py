@@ -0,0 +1,26 @@
+"""Tests for the ``PollScheduler`` class."""
+
+from unittest import TestCase
+
+from node_nanny.app import PollScheduler
+
+
+class AdaptivePolling(TestCase):
+    """Test the polling interval adapts to system activity"""
+
+    def test_backoff_while_idle(self) -> None:
+        """Test the interval grows geometrically up to the maximum while idle"""
+
+        scheduler = PollScheduler(min_interval=1, max_interval=5, backoff=2)
+        intervals = [scheduler.update(active=False) for _ in range(4)]
+        self.assertEqual([2, 4, 5, 5], intervals)
+
+    def test_reset_when_active(self) -> None:
+        """Test the interval returns to the minimum once the system is active"""
+
+        scheduler = PollScheduler(min_interval=1, max_interval=60)
+        for _ in range(10):
+            scheduler.update(active=False)
+
+        self.assertEqual(1, scheduler.update(active=True))
+
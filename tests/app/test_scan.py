@@ -0,0 +1,198 @@
+"""Tests for the ``MonitorUtility.scan`` method."""
+
+import json
+import time
+from datetime import timedelta
+from pathlib import Path
+from socket import gethostname
+from tempfile import TemporaryDirectory
+from threading import Thread
+from unittest import TestCase
+from unittest.mock import patch
+
+from sqlalchemy import select
+
+from node_nanny.app import MonitorUtility
+from node_nanny.collector import CollectorServer, UsageCollector
+from node_nanny.orm import DBConnection, Notification, UsageHistory, UsageReport, User
+from node_nanny.utils import SystemUsage
+from tests.fake_proc import write_process, write_system
+
+
+class ScanFakeProcesses(TestCase):
+    """Test scans against a fake process table"""
+
+    def setUp(self) -> None:
+        """Create a fake process table with one heavy and one light user"""
+
+        self._temp_dir = TemporaryDirectory()
+        root = Path(self._temp_dir.name)
+        write_system(root, mem_total=1024 ** 3)
+        write_process(root, 100, uid=987654, rss=512 * 1024 ** 2)  # 50% of memory
+        write_process(root, 200, uid=987655, rss=10 * 1024 ** 2)  # ~1% of memory
+        SystemUsage.configure(str(root))
+
+        self.app = MonitorUtility('sqlite:///:memory:')
+        kill_patch = patch.object(MonitorUtility, 'terminate')
+        notify_patch = patch('node_nanny.utils.UserNotifier.notify_all')
+        self.mock_kill = kill_patch.start()
+        self.mock_notify = notify_patch.start()
+        self.addCleanup(kill_patch.stop)
+        self.addCleanup(notify_patch.stop)
+
+    def tearDown(self) -> None:
+        SystemUsage.configure()
+        self._temp_dir.cleanup()
+
+    def test_offender_terminated(self) -> None:
+        """Test users over the limit are terminated and notified"""
+
+        self.app.scan(max_mem=20, min_mem=5, wait=0, iterations=1)
+        self.mock_kill.assert_called_once_with('987654', 'proc')
+        self.mock_notify.assert_called_once()
+
+    def test_surviving_offender_killed_again(self) -> None:
+        """Test users still over the limit after being killed are killed again on a later scan"""
+
+        with patch('node_nanny.app.time.sleep'):
+            self.app.scan(max_mem=20, min_mem=5, wait=0, iterations=2)
+
+        self.assertEqual(2, self.mock_kill.call_count)
+
+    def test_scan_continues_after_error(self) -> None:
+        """Test an error during one scan is logged and does not stop later scans"""
+
+        self.mock_kill.side_effect = [ProcessLookupError('process exited'), None]
+        with patch('node_nanny.app.time.sleep'), self.assertLogs('node_nanny.app', 'ERROR') as logs:
+            self.app.scan(max_mem=20, min_mem=5, wait=0, iterations=2)
+
+        self.assertEqual(2, self.mock_kill.call_count)
+        self.assertIn('ProcessLookupError', logs.output[0])
+
+    def test_keyboard_interrupt_stops_scan(self) -> None:
+        """Test interrupting a scan still exits the scan loop"""
+
+        self.mock_kill.side_effect = KeyboardInterrupt
+        with self.assertRaises(KeyboardInterrupt):
+            self.app.scan(max_mem=20, min_mem=5, wait=0, iterations=3)
+
+        self.mock_kill.assert_called_once()
+
+    def test_grace_period_respected(self) -> None:
+        """Test users are not terminated before the grace period expires"""
+
+        with patch('node_nanny.app.time.sleep'):
+            self.app.scan(max_mem=20, min_mem=5, wait=3600, iterations=3)
+
+        self.mock_kill.assert_not_called()
+
+    def test_whitelisted_user_ignored(self) -> None:
+        """Test whitelisted users are not terminated"""
+
+        self.app.add('987654', node=gethostname(), duration=timedelta(days=1))
+        self.app.scan(max_mem=20, min_mem=5, wait=0, iterations=1)
+        self.mock_kill.assert_not_called()
+
+    def test_usage_reported_to_collector(self) -> None:
+        """Test usage and terminations are pushed to a collector when one is given"""
+
+        collector = UsageCollector()
+        server = CollectorServer(('127.0.0.1', 0), collector)
+        collector.start()
+        Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        try:
+            self.app.scan(
+                max_mem=20, min_mem=5, wait=0, iterations=1, collector=f'http://127.0.0.1:{server.server_port}')
+
+        finally:
+            server.shutdown()
+            server.server_close()
+            collector.stop()
+
+        with DBConnection.session() as session:
+            reported = session.execute(select(User.name).join(UsageReport)).scalars().all()
+            notified = session.execute(select(User.name).join(Notification)).scalars().all()
+
+        # The light user is below the minimum memory usage and is not reported
+        self.assertEqual(['987654'], reported)
+        self.assertEqual(['987654'], notified)
+
+    def test_usage_history_recorded(self) -> None:
+        """Test the usage of users above the minimum memory usage is recorded"""
+
+        self.app.scan(max_mem=90, min_mem=5, wait=0, iterations=1)
+        with DBConnection.session() as session:
+            recorded = session.execute(select(User.name, UsageHistory.resolution).join(UsageHistory)).all()
+
+        self.assertCountEqual([('987654', 10), ('987654', 60), ('987654', 3600)], recorded)
+
+    def test_usage_history_disabled(self) -> None:
+        """Test no usage history is recorded when disabled"""
+
+        self.app.scan(max_mem=90, min_mem=5, wait=0, iterations=1, record_history=False)
+        with DBConnection.session() as session:
+            self.assertIsNone(session.execute(select(UsageHistory.id)).first())
+
+    def test_rules_applied(self) -> None:
+        """Test actions from a rules file are applied before users reach the kill limit"""
+
+        rules = Path(self._temp_dir.name) / 'rules.json'
+        rules.write_text(json.dumps({'rules': [
+            {'name': 'soft-limit', 'action': 'throttle', 'when': {'MEM': {'min': 30}}, 'memory_high': 0.9}
+        ]}))
+
+        with patch('node_nanny.policy.PolicyActions.apply') as mock_apply:
+            self.app.scan(max_mem=90, min_mem=5, wait=0, iterations=1, rules=str(rules))
+
+        self.mock_kill.assert_not_called()
+        mock_apply.assert_called_once()
+        decision = mock_apply.call_args[0][0]
+        self.assertEqual(('987654', 'throttle', False), (decision.user, decision.rule.action, decision.release))
+
+    def test_top_users_only(self) -> None:
+        """Test only the heaviest users are considered when the number of users is limited"""
+
+        self.app.scan(max_mem=0.5, min_mem=0, wait=0, iterations=1, top=1)
+        self.mock_kill.assert_called_once_with('987654', 'proc')
+
+    def test_metrics_written(self) -> None:
+        """Test scan metrics are written to the metrics file"""
+
+        path = Path(self._temp_dir.name) / 'node_nanny.prom'
+        self.app.scan(max_mem=20, min_mem=5, wait=0, iterations=1, metrics_file=str(path))
+
+        metrics = path.read_text()
+        self.assertIn('node_nanny_stage_seconds_count{stage="scan"}', metrics)
+        self.assertIn('node_nanny_processes 2', metrics.splitlines())
+        self.assertIn('node_nanny_outbox_queue_depth', metrics)
+        self.assertIn('node_nanny_user_cache_hits', metrics)
+
+    def test_pressure_ends_idle_wait(self) -> None:
+        """Test memory pressure starts the next scan before the idle interval expires"""
+
+        pressure = Path(self._temp_dir.name) / 'memory'
+        pressure.write_text('some avg10=50.00 avg60=0.00 avg300=0.00 total=0\n')
+
+        start = time.monotonic()
+        with patch('node_nanny.app.PollScheduler.update', return_value=3600):
+            self.app.scan(max_mem=90, min_mem=5, wait=0, iterations=2, psi=str(pressure))
+
+        self.assertLess(time.monotonic() - start, 60)
+
+    def test_fork_storm_reniced(self) -> None:
+        """Test users starting processes too quickly are reniced even below the lower memory limit"""
+
+        root = Path(self._temp_dir.name)
+
+        def fork_storm(seconds: float) -> None:
+            write_system(root, mem_total=1024 ** 3, uptime=1010)
+            for pid in range(300, 400):
+                write_process(root, pid, uid=987655, rss=1024, start_time=100_000)
+
+        with patch('node_nanny.app.time.sleep', side_effect=fork_storm), \
+                patch('node_nanny.policy.PolicyActions.apply') as mock_apply:
+            self.app.scan(max_mem=90, min_mem=5, wait=0, iterations=2, max_spawn_rate=5)
+
+        mock_apply.assert_called_once()
+        decision = mock_apply.call_args[0][0]
+        self.assertEqual(('987655', 'renice', False), (decision.user, decision.rule.action, decision.release))
@@ -0,0 +1,63 @@
+"""Tests for the ``WhitelistCache`` class."""
+
+from datetime import datetime, timedelta
+from unittest import TestCase
+
+from sqlalchemy import update
+
+from node_nanny.app import MonitorUtility, WhitelistCache
+from node_nanny.orm import DBConnection, Whitelist
+
+
+class CacheMembership(TestCase):
+    """Test whitelist membership checks against the cache"""
+
+    def setUp(self) -> None:
+        """Whitelist users on different nodes using a temporary database"""
+
+        self.app = MonitorUtility('sqlite:///:memory:')
+        self.app.add('node_user', node='node1')
+        self.app.add('other_node_user', node='node2')
+        self.app.add('global_user', _global=True)
+
+        self.cache = WhitelistCache('node1')
+        self.cache.refresh()
+
+    def test_node_and_global_entries(self) -> None:
+        """Test the cache includes node specific and global entries for the current node"""
+
+        self.assertIn('node_user', self.cache)
+        self.assertIn('global_user', self.cache)
+        self.assertNotIn('other_node_user', self.cache)
+
+    def test_unchanged_whitelist_not_reloaded(self) -> None:
+        """Test entries are not reloaded unless the whitelist revision changes"""
+
+        self.assertFalse(self.cache.refresh())
+
+    def test_changes_invalidate_cache(self) -> None:
+        """Test adding and removing users invalidates the cache"""
+
+        self.app.add('new_user', node='node1')
+        self.assertTrue(self.cache.refresh())
+        self.assertIn('new_user', self.cache)
+
+        self.app.remove('node_user', node='node1')
+        self.assertTrue(self.cache.refresh())
+        self.assertNotIn('node_user', self.cache)
+
+    def test_entries_expire_without_reload(self) -> None:
+        """Test entries age out of the cache once their end time passes"""
+
+        with DBConnection.session() as session:
+            session.execute(
+                update(Whitelist)
+                .where(Whitelist.node == 'node1')
+                .values(end_time=datetime.now() + timedelta(minutes=1))
+            )
+            session.commit()
+
+        self.cache.reload()
+        self.cache._expire(datetime.now() + timedelta(minutes=2))
+        self.assertNotIn('node_user', self.cache)
+        self.assertIn('global_user', self.cache)
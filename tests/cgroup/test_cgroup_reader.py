@@ -0,0 +1,109 @@
+"""Tests for the ``CgroupReader`` and ``SliceCPUSampler`` classes."""
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from node_nanny.cgroup import CgroupReader, SliceCPUSampler, SliceSnapshot, SliceSpawnCounter
+from tests.fake_cgroup import write_slice
+
+
+class ReadFakeCgroupDirectory(TestCase):
+    """Test the parsing of user slices from a fake cgroup directory"""
+
+    def setUp(self) -> None:
+        """Populate a fake cgroup directory with two user slices"""
+
+        self._temp_dir = TemporaryDirectory()
+        self.root = Path(self._temp_dir.name)
+        write_slice(self.root, 1001, memory=100, inactive_file=40, cpu_usec=5, pids=[10, 11])
+        write_slice(self.root, 1002, memory=50, pids=[20])
+        (self.root / 'user.slice' / 'not-a-user.slice').mkdir()
+
+        self.reader = CgroupReader(str(self.root))
+
+    def tearDown(self) -> None:
+        self._temp_dir.cleanup()
+
+    def test_slices(self) -> None:
+        """Test only user slices are discovered"""
+
+        self.assertCountEqual([1001, 1002], self.reader.slices())
+
+    def test_working_set_excludes_inactive_file(self) -> None:
+        """Test inactive page cache is excluded from the working set"""
+
+        self.assertEqual((1001, 100, 60, 5), self.reader.read_slice(1001))
+
+    def test_snapshot(self) -> None:
+        """Test snapshots include a record for every user slice"""
+
+        snapshot = self.reader.snapshot()
+        self.assertCountEqual([1001, 1002], snapshot.uid)
+
+    def test_pids(self) -> None:
+        """Test process IDs are collected from nested cgroups"""
+
+        self.assertCountEqual([10, 11, 20], self.reader.pids())
+        self.assertCountEqual([20], self.reader.pids(1002))
+
+    def test_kill(self) -> None:
+        """Test slices are killed by writing to ``cgroup.kill`` only where the interface exists"""
+
+        kill_file = self.root / 'user.slice' / 'user-1001.slice' / 'cgroup.kill'
+        kill_file.write_text('0')
+
+        self.assertTrue(self.reader.kill(1001))
+        self.assertEqual('1', kill_file.read_text())
+        self.assertFalse(self.reader.kill(1002))
+        self.assertFalse((self.root / 'user.slice' / 'user-1002.slice' / 'cgroup.kill').exists())
+
+    def test_missing_user_slice(self) -> None:
+        """Test an empty mapping is returned when there is no user slice directory"""
+
+        self.assertEqual(dict(), CgroupReader(str(self.root / 'missing')).slices())
+
+
+class SliceSampling(TestCase):
+    """Test CPU usage is calculated from the change between slice snapshots"""
+
+    @staticmethod
+    def build_snapshot(timestamp: float, cpu_usec: int) -> SliceSnapshot:
+        """Return a snapshot with a single slice using the given CPU time"""
+
+        snapshot = SliceSnapshot(timestamp)
+        snapshot.append((1001, 0, 0, cpu_usec))
+        return snapshot
+
+    def test_delta_between_samples(self) -> None:
+        """Test usage is calculated from CPU time deltas"""
+
+        sampler = SliceCPUSampler()
+        self.assertEqual([0.0], sampler.sample(self.build_snapshot(10, 0)))
+        self.assertEqual([200.0], sampler.sample(self.build_snapshot(11, 2_000_000)))
+
+    def test_counter_reset(self) -> None:
+        """Test recreated slices with reset counters report zero usage"""
+
+        sampler = SliceCPUSampler()
+        sampler.sample(self.build_snapshot(10, 5_000_000))
+        self.assertEqual([0.0], sampler.sample(self.build_snapshot(11, 1_000)))
+
+
+class SliceSpawns(TestCase):
+    """Test spawn rates are calculated from the processes joining each slice"""
+
+    @staticmethod
+    def build_snapshot(timestamp: float) -> SliceSnapshot:
+        """Return a snapshot with a single slice"""
+
+        snapshot = SliceSnapshot(timestamp)
+        snapshot.append((1001, 0, 0, 0))
+        return snapshot
+
+    def test_new_processes_counted(self) -> None:
+        """Test only processes that joined the slice since the previous sample are counted"""
+
+        counter = SliceSpawnCounter()
+        self.assertEqual([0.0], counter.sample(self.build_snapshot(10), [[100, 101]]))
+        self.assertEqual([1.5], counter.sample(self.build_snapshot(12), [[101, 102, 103, 104]]))
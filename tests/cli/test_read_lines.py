@@ -0,0 +1,34 @@
+"""Tests for the ``read_lines`` argument type."""
+
+from argparse import ArgumentTypeError
+from tempfile import NamedTemporaryFile
+from unittest import TestCase
+
+from node_nanny.cli import read_lines
+
+
+class ReadLines(TestCase):
+    """Test the reading of user and node lists from files"""
+
+    def test_blank_lines_and_comments_ignored(self) -> None:
+        """Test blank lines and comments are excluded from the returned values"""
+
+        with NamedTemporaryFile('w') as temp:
+            temp.write('# Workshop users\nuser1\n\n  user2  # instructor\n')
+            temp.flush()
+            self.assertEqual(['user1', 'user2'], read_lines(temp.name))
+
+    def test_error_on_missing_file(self) -> None:
+        """Test an ``ArgumentTypeError`` is raised for files that cannot be read"""
+
+        with self.assertRaises(ArgumentTypeError):
+            read_lines('/this/file/does/not/exist')
+
+    def test_error_on_empty_file(self) -> None:
+        """Test an ``ArgumentTypeError`` is raised for files containing only comments and blank lines"""
+
+        with NamedTemporaryFile('w') as temp:
+            temp.write('# Workshop users\n\n   \n')
+            temp.flush()
+            with self.assertRaises(ArgumentTypeError):
+                read_lines(temp.name)
@@ -0,0 +1,50 @@
+"""Tests guarding the start up cost of the command line interface."""
+
+import subprocess
+import sys
+from pathlib import Path
+from unittest import TestCase
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+
+# Dependencies that should only be loaded by the sub-commands that use them
+HEAVY_MODULES = ('numpy', 'pandas', 'psutil', 'sqlalchemy')
+
+
+def loaded_modules(code: str) -> set:
+    """Return the heavy modules loaded after executing the given code in a fresh interpreter"""
+
+    code += f'\nimport sys\nprint("\\nLOADED:", *(m for m in {HEAVY_MODULES} if m in sys.modules))'
+    result = subprocess.run(
+        [sys.executable, '-c', code], cwd=PROJECT_ROOT, check=True, stdout=subprocess.PIPE, universal_newlines=True)
+
+    return set(result.stdout.rsplit('LOADED:', 1)[1].split())
+
+
+class LazyImports(TestCase):
+    """Test heavy dependencies are not loaded unless needed"""
+
+    def test_cli_import(self) -> None:
+        """Test importing the command line interface does not load heavy dependencies"""
+
+        self.assertEqual(set(), loaded_modules('import node_nanny.cli'))
+
+    def test_help_text(self) -> None:
+        """Test printing help text does not load heavy dependencies"""
+
+        code = (
+            'import sys\n'
+            'sys.argv = ["usage_monitor.py", "add", "--help"]\n'
+            'from node_nanny.cli import CLIParser\n'
+            'try:\n'
+            '    CLIParser(prog="usage_monitor.py").execute()\n'
+            'except SystemExit:\n'
+            '    pass\n'
+        )
+
+        self.assertEqual(set(), loaded_modules(code))
+
+    def test_whitelist_commands(self) -> None:
+        """Test the application module does not load data analysis dependencies"""
+
+        self.assertEqual({'sqlalchemy'}, loaded_modules('import node_nanny.app'))
@@ -0,0 +1,100 @@
+"""Tests for the ``CollectorServer`` and ``CollectorAgent`` classes."""
+
+import json
+import time
+from http.client import HTTPConnection
+from threading import Thread
+from unittest import TestCase
+
+from sqlalchemy import select
+
+from node_nanny.collector import CollectorAgent, CollectorServer, UsageCollector
+from node_nanny.orm import DBConnection, Notification, UsageReport, User
+
+
+class AgentReports(TestCase):
+    """Test agents reporting to a running collector server"""
+
+    def setUp(self) -> None:
+        """Start a collector server on a free port"""
+
+        DBConnection.configure('sqlite:///:memory:')
+        self.collector = UsageCollector()
+        self.server = CollectorServer(('127.0.0.1', 0), self.collector)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+
+        self.collector.start()
+        Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.collector.stop()
+
+    def test_usage_and_events_written(self) -> None:
+        """Test reported usage and events are written to the database"""
+
+        agent = CollectorAgent(self.url, node='node1')
+        agent.add_event('user1', memory=2048, percentage=60, limit=20)
+        self.assertTrue(agent.report([dict(user='user1', cpu=50, memory=2048, percentage=60, processes=4)]))
+        self.assertTrue(agent.report([dict(user='user1', cpu=25, memory=1024, percentage=30, processes=2)]))
+        agent.close()
+        self.collector.stop()
+
+        with DBConnection.session() as session:
+            usage = session.execute(select(UsageReport.node, UsageReport.memory).order_by(UsageReport.id)).all()
+            events = session.execute(select(User.name, Notification.limit).join(User)).all()
+
+        self.assertEqual([('node1', 2048), ('node1', 1024)], usage)
+        self.assertEqual([('user1', 20)], events)
+
+    def test_events_retained_while_unreachable(self) -> None:
+        """Test events are kept for the next report when the collector cannot be reached"""
+
+        agent = CollectorAgent('http://127.0.0.1:1', node='node1', timeout=0.5)
+        agent.add_event('user1', memory=2048, percentage=60, limit=20)
+        self.assertFalse(agent.report([]))
+        self.assertEqual(1, len(agent._events))
+        self.assertEqual(1, agent.failed)
+
+    def test_background_reports(self) -> None:
+        """Test queued reports are sent by the background thread before the agent stops"""
+
+        agent = CollectorAgent(self.url, node='node1')
+        agent.start()
+        agent.add_event('user1', memory=2048, percentage=60, limit=20)
+        self.assertTrue(agent.submit([dict(user='user1', cpu=50, memory=2048, percentage=60, processes=4)]))
+        agent.stop()
+        self.collector.stop()
+
+        self.assertEqual(1, agent.sent)
+        with DBConnection.session() as session:
+            self.assertEqual(['user1'], session.execute(select(User.name).join(Notification)).scalars().all())
+
+    def test_submit_does_not_wait_for_collector(self) -> None:
+        """Test queuing a report returns immediately while the collector is unreachable"""
+
+        agent = CollectorAgent('http://127.0.0.1:1', node='node1', timeout=0.5, max_pending_reports=1)
+        start = time.perf_counter()
+        self.assertTrue(agent.submit([]))
+        self.assertFalse(agent.submit([]))
+        self.assertLess(time.perf_counter() - start, 0.1)
+        self.assertEqual(1, agent.dropped)
+
+    def test_invalid_report_rejected(self) -> None:
+        """Test malformed reports receive a client error response"""
+
+        connection = HTTPConnection('127.0.0.1', self.server.server_port, timeout=5)
+        connection.request('POST', '/report', b'{"node": "node1"}')
+        self.assertEqual(400, connection.getresponse().status)
+        connection.close()
+
+    def test_metrics(self) -> None:
+        """Test collector statistics are served as JSON"""
+
+        connection = HTTPConnection('127.0.0.1', self.server.server_port, timeout=5)
+        connection.request('GET', '/metrics')
+        response = connection.getresponse()
+        self.assertEqual(200, response.status)
+        self.assertIn('queue_depth', json.loads(response.read()))
+        connection.close()
@@ -0,0 +1,115 @@
+"""Tests for the ``UsageCollector`` class."""
+
+import time
+from datetime import datetime, timedelta
+from unittest import TestCase
+
+from sqlalchemy import func, select
+
+from node_nanny.collector import UsageCollector, parse_report
+from node_nanny.orm import DBConnection, Notification, UsageReport, User
+
+
+def make_report(node: str, users: int = 2, events: int = 0) -> dict:
+    """Return a parsed usage report for the given number of users"""
+
+    return parse_report(dict(
+        node=node,
+        time=time.time(),
+        usage=[dict(user=f'user{i}', cpu=1.5, memory=100, percentage=2.5, processes=3) for i in range(users)],
+        events=[dict(user=f'user{i}', memory=100, percentage=2.5, limit=20) for i in range(events)]
+    ))
+
+
+class ParseReport(TestCase):
+    """Test the validation of incoming usage reports"""
+
+    def test_values_converted(self) -> None:
+        """Test usage values are converted to their column types"""
+
+        report = parse_report(dict(node='node1', time=0, usage=[
+            dict(user='user1', cpu='1.5', memory='100', percentage=2, processes=3)]))
+
+        self.assertEqual([('user1', 1.5, 100, 2.0, 3)], report['usage'])
+        self.assertEqual([], report['events'])
+
+    def test_error_on_missing_values(self) -> None:
+        """Test a ``ValueError`` is raised for incomplete reports"""
+
+        with self.assertRaises(ValueError):
+            parse_report(dict(node='node1', time=0, usage=[dict(user='user1')]))
+
+        with self.assertRaises(ValueError):
+            parse_report(['not', 'a', 'report'])
+
+
+class WriteReports(TestCase):
+    """Test the writing of queued reports to the database"""
+
+    def setUp(self) -> None:
+        """Connect to a temporary testing database"""
+
+        DBConnection.configure('sqlite:///:memory:')
+        self.collector = UsageCollector(batch_size=10)
+
+    def count(self, column) -> int:
+        """Return the number of rows in the table of the given column"""
+
+        with DBConnection.session() as session:
+            return session.execute(select(func.count(column))).scalar()
+
+    def test_batch_written(self) -> None:
+        """Test usage records and events from every report are written"""
+
+        self.collector.write([make_report('node1', events=1), make_report('node2', events=2)])
+        self.assertEqual(4, self.count(UsageReport.id))
+        self.assertEqual(3, self.count(Notification.id))
+        self.assertEqual(2, self.count(User.id))
+
+    def test_background_writes(self) -> None:
+        """Test queued reports are written in batches once the collector is stopped"""
+
+        self.collector.start()
+        for i in range(25):
+            self.assertTrue(self.collector.submit(make_report(f'node{i}')))
+
+        self.collector.stop()
+        self.assertEqual(50, self.count(UsageReport.id))
+        self.assertEqual(25, self.collector.written)
+        self.assertGreaterEqual(self.collector.batches, 3)
+
+    def test_full_queue_rejected(self) -> None:
+        """Test reports are rejected instead of blocking when the queue is full"""
+
+        collector = UsageCollector(max_queue=1)
+        self.assertTrue(collector.submit(make_report('node1')))
+        self.assertFalse(collector.submit(make_report('node2')))
+        self.assertEqual(1, collector.metrics()['rejected'])
+
+
+class PruneReports(TestCase):
+    """Test usage reports are deleted once they are older than the retention period"""
+
+    def setUp(self) -> None:
+        """Write one expired and one recent report"""
+
+        DBConnection.configure('sqlite:///:memory:')
+        self.collector = UsageCollector(retention=timedelta(days=1))
+        expired = make_report('node1')
+        expired['time'] = datetime.now() - timedelta(days=2)
+        self.collector.write([expired, make_report('node2')])
+
+    def test_expired_reports_deleted(self) -> None:
+        """Test only reports outside the retention period are deleted"""
+
+        self.assertEqual(2, self.collector.prune(datetime.now()))
+        query = select(UsageReport.node).distinct()
+        with DBConnection.session() as session:
+            self.assertEqual(['node2'], session.execute(query).scalars().all())
+
+    def test_pruned_by_writer_thread(self) -> None:
+        """Test the background writer prunes expired reports"""
+
+        self.collector.start()
+        self.collector.stop()
+        self.assertEqual(2, self.collector.metrics()['pruned'])
@@ -0,0 +1,37 @@
+"""Helpers for building fake cgroup v2 directories used by the test suite."""
+
+from pathlib import Path
+from typing import Iterable
+
+
+def write_slice(
+        root: Path,
+        uid: int,
+        memory: int = 1024 ** 2,
+        inactive_file: int = 0,
+        cpu_usec: int = 0,
+        pids: Iterable[int] = ()
+) -> None:
+    """Write the files describing a single user slice in a fake cgroup directory
+
+    Args:
+        root: The fake cgroup directory
+        uid: The ID of the user owning the slice
+        memory: Total memory charged to the slice in bytes
+        inactive_file: Inactive page cache charged to the slice in bytes
+        cpu_usec: Total CPU time used by the slice in microseconds
+        pids: IDs of processes running inside a session scope of the slice
+    """
+
+    slice_dir = root / 'user.slice' / f'user-{uid}.slice'
+    scope_dir = slice_dir / 'session-1.scope'
+    scope_dir.mkdir(parents=True, exist_ok=True)
+
+    (slice_dir / 'memory.current').write_text(f'{memory}\n')
+    (slice_dir / 'memory.stat').write_text(
+        f'anon {memory - inactive_file}\nfile {inactive_file}\ninactive_file {inactive_file}\n')
+    (slice_dir / 'cpu.stat').write_text(f'usage_usec {cpu_usec}\nuser_usec {cpu_usec}\nsystem_usec 0\n')
+    (slice_dir / 'cgroup.procs').write_text('')
+    (slice_dir / 'memory.high').write_text('max\n')
+    (slice_dir / 'cpu.max').write_text('max 100000\n')
+    (scope_dir / 'cgroup.procs').write_text(''.join(f'{pid}\n' for pid in pids))
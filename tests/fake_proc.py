@@ -0,0 +1,68 @@
+"""Helpers for building fake ``/proc`` directories used by the test suite."""
+
+import os
+from pathlib import Path
+
+from node_nanny.proc import PAGE_SIZE
+
+
+def write_system(root: Path, mem_total: int = 16 * 1024 ** 3, uptime: float = 1000.0) -> None:
+    """Write the system wide files of a fake proc directory
+
+    Args:
+        root: The fake proc directory
+        mem_total: Total system memory in bytes
+        uptime: System uptime in seconds
+    """
+
+    root.mkdir(parents=True, exist_ok=True)
+    (root / 'meminfo').write_text(f'MemTotal:       {mem_total // 1024} kB\nMemFree:        1024 kB\n')
+    (root / 'uptime').write_text(f'{uptime:.2f} 12345.67\n')
+
+
+def write_process(
+        root: Path,
+        pid: int,
+        uid: int = os.getuid(),
+        name: str = 'python',
+        state: str = 'S',
+        rss: int = 1024 ** 2,
+        utime: int = 0,
+        stime: int = 0,
+        start_time: int = 100,
+        ppid: int = 1,
+        pgrp: int = None,
+        session: int = None
+) -> None:
+    """Write the files describing a single process in a fake proc directory
+
+    Args:
+        root: The fake proc directory
+        pid: The process ID
+        uid: The ID of the user owning the process
+        name: The process name
+        state: Single letter process state
+        rss: Resident memory in bytes
+        utime: User CPU time in clock ticks
+        stime: System CPU time in clock ticks
+        start_time: Process start time in clock ticks since boot
+        ppid: The parent process ID
+        pgrp: The process group ID (defaults to the process ID)
+        session: The session ID (defaults to the process ID)
+    """
+
+    pgrp = pid if pgrp is None else pgrp
+    session = pid if session is None else session
+    pages = rss // PAGE_SIZE
+
+    proc_dir = root / str(pid)
+    proc_dir.mkdir(parents=True, exist_ok=True)
+    (proc_dir / 'stat').write_text(
+        f'{pid} ({name}) {state} {ppid} {pgrp} {session} 0 -1 4194560 100 0 0 0 '
+        f'{utime} {stime} 0 0 20 0 1 0 {start_time} 1000000 {pages} 18446744073709551615\n'
+    )
+    (proc_dir / 'statm').write_text(f'{pages * 2} {pages} 10 1 0 {pages} 0\n')
+    (proc_dir / 'status').write_text(
+        f'Name:\t{name}\nState:\t{state}\nPid:\t{pid}\nPPid:\t{ppid}\n'
+        f'Uid:\t{uid}\t{uid}\t{uid}\t{uid}\nGid:\t{uid}\t{uid}\t{uid}\t{uid}\n'
+    )
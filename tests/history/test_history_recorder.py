@@ -0,0 +1,80 @@
+"""Tests for the ``HistoryRecorder`` class and usage history queries."""
+
+from datetime import datetime, timedelta
+from unittest import TestCase
+
+from sqlalchemy import func, select
+
+from node_nanny.history import RETENTION, HistoryRecorder, select_resolution
+from node_nanny.orm import DBConnection, UsageHistory
+from node_nanny.utils import UserNotifier
+
+START = datetime.fromtimestamp(3600 * 400000)
+
+
+class RecordHistory(TestCase):
+    """Test usage history is written to and pruned from the database"""
+
+    def setUp(self) -> None:
+        """Connect to a temporary testing database"""
+
+        DBConnection.configure('sqlite:///:memory:')
+        self.recorder = HistoryRecorder('node1', retention={10: timedelta(minutes=1), 60: timedelta(hours=1)})
+
+    @staticmethod
+    def count(resolution: int) -> int:
+        """Return the number of stored records at the given resolution"""
+
+        query = select(func.count(UsageHistory.id)).where(UsageHistory.resolution == resolution)
+        with DBConnection.session() as session:
+            return session.execute(query).scalar()
+
+    def test_completed_intervals_written(self) -> None:
+        """Test only completed intervals are written until the recorder is flushed"""
+
+        for seconds in range(0, 30, 2):
+            self.recorder.record([('user1', 10.0, 100, 1.0)], START + timedelta(seconds=seconds))
+
+        self.assertEqual(2, self.count(10))
+        self.assertEqual(0, self.count(60))
+
+        self.recorder.flush()
+        self.assertEqual(3, self.count(10))
+        self.assertEqual(1, self.count(60))
+
+    def test_expired_records_pruned(self) -> None:
+        """Test records older than the retention period of their resolution are deleted"""
+
+        self.recorder.record([('user1', 10.0, 100, 1.0)], START)
+        self.recorder.flush()
+
+        self.assertEqual(1, self.recorder.prune(START + timedelta(minutes=5)))
+        self.assertEqual(0, self.count(10))
+        self.assertEqual(1, self.count(60))
+
+    def test_query_by_user(self) -> None:
+        """Test the recorded series is returned for a single user at the requested resolution"""
+
+        for seconds in range(0, 30, 5):
+            usage = [('user1', 10.0, 100 + seconds, 1.0), ('user2', 5.0, 10, 0.1)]
+            self.recorder.record(usage, START + timedelta(seconds=seconds))
+
+        self.recorder.flush()
+        history = UserNotifier('user1').usage_history(resolution=10)
+        self.assertEqual([105, 115, 125], history.memory.tolist())
+        self.assertEqual(['node1'] * 3, history.node.tolist())
+
+        history = UserNotifier('user1').usage_history(resolution=10, since=START + timedelta(seconds=10))
+        self.assertEqual(2, len(history))
+
+
+class SelectResolution(TestCase):
+    """Test the automatic selection of a resolution covering a time period"""
+
+    def test_finest_covering_resolution(self) -> None:
+        """Test the finest resolution retained for the requested period is used"""
+
+        now = datetime.now()
+        self.assertEqual(10, select_resolution(now - timedelta(hours=1), now))
+        self.assertEqual(60, select_resolution(now - timedelta(days=7), now))
+        self.assertEqual(max(RETENTION), select_resolution(None, now))
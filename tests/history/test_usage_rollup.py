@@ -0,0 +1,48 @@
+"""Tests for the ``UsageRollup`` class."""
+
+from datetime import datetime, timedelta
+from unittest import TestCase
+
+from node_nanny.history import UsageRollup
+
+START = datetime.fromtimestamp(3600 * 400000)
+
+
+class Downsampling(TestCase):
+    """Test usage samples are summarized into fixed width intervals"""
+
+    def setUp(self) -> None:
+        """Add samples spanning two 10 second intervals"""
+
+        self.rollup = UsageRollup('node1', resolutions=(10, 60))
+        self.completed = []
+        for seconds, memory in ((0, 100), (4, 300), (8, 200), (12, 50)):
+            usage = [('user1', float(memory), memory, memory / 10)]
+            self.completed.extend(self.rollup.add(usage, START + timedelta(seconds=seconds)))
+
+    def test_completed_interval_summarized(self) -> None:
+        """Test a completed interval reports mean CPU and peak memory"""
+
+        self.assertEqual(1, len(self.completed))
+        record = self.completed[0]
+        self.assertEqual(
+            ('user1', 'node1', 10, START), (record['name'], record['node'], record['resolution'], record['time']))
+        self.assertEqual(3, record['samples'])
+        self.assertEqual(200, record['cpu'])
+        self.assertEqual(300, record['memory'])
+        self.assertEqual(30, record['percentage'])
+
+    def test_flush_closes_open_intervals(self) -> None:
+        """Test flushing returns the incomplete interval at every resolution"""
+
+        records = {record['resolution']: record for record in self.rollup.flush()}
+        self.assertEqual({10, 60}, set(records))
+        self.assertEqual(1, records[10]['samples'])
+        self.assertEqual(4, records[60]['samples'])
+        self.assertEqual([], self.rollup.flush())
+
+    def test_absent_users_closed(self) -> None:
+        """Test intervals are completed for users missing from later samples"""
+
+        completed = self.rollup.add([], START + timedelta(seconds=25))
+        self.assertEqual([('user1', 10)], [(record['name'], record['resolution']) for record in completed])
@@ -0,0 +1,172 @@
+"""Tests for the ``ProcessKiller`` class."""
+
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from node_nanny.kill import ProcessKiller, process_tree, resolve_uid
+from node_nanny.proc import ProcReader, ProcessSnapshot
+from tests.fake_proc import write_process, write_system
+
+# Forks a binary tree of sleeping processes three levels deep, then prints every process ID in the tree
+TREE_SCRIPT = textwrap.dedent('''
+    import os, time
+    read_fd, write_fd = os.pipe()
+
+    def grow(depth):
+        for _ in range(2 if depth else 0):
+            if os.fork() == 0:
+                grow(depth - 1)
+                os.write(write_fd, f'{os.getpid()}\\n'.encode())
+                time.sleep(60)
+                os._exit(0)
+
+    grow(3)
+    os.write(write_fd, f'{os.getpid()}\\n'.encode())
+    output = b''
+    while output.count(b'\\n') < 15:
+        output += os.read(read_fd, 4096)
+
+    print(*output.decode().split(), flush=True)
+    time.sleep(60)
+''')
+
+# Continuously forks new processes until terminated
+FORK_STORM_SCRIPT = textwrap.dedent('''
+    import os, time
+    print('ready', flush=True)
+    while True:
+        if os.fork() == 0:
+            time.sleep(60)
+            os._exit(0)
+
+        time.sleep(0.001)
+''')
+
+
+def alive(pid: int) -> bool:
+    """Return whether a process exists and has not exited"""
+
+    try:
+        return ProcReader().read_owner(pid)[1] not in ('Z', 'X', 'x')
+
+    except (FileNotFoundError, ProcessLookupError):
+        return False
+
+
+class KillProcessTree(TestCase):
+    """Test the termination of real process trees
+
+    Each tree runs in its own session, which is used to restrict the kill
+    to the spawned processes instead of every process owned by the test user.
+    """
+
+    def spawn(self, script: str) -> subprocess.Popen:
+        """Run a Python script in a new session"""
+
+        process = subprocess.Popen(
+            [sys.executable, '-c', script], stdout=subprocess.PIPE, start_new_session=True, universal_newlines=True)
+
+        self.addCleanup(process.wait)
+        self.addCleanup(lambda: ProcessKiller().kill(os.getuid(), session=process.pid))
+        return process
+
+    def test_tree_terminated(self) -> None:
+        """Test every process in a forked tree is terminated"""
+
+        process = self.spawn(TREE_SCRIPT)
+        pids = [int(pid) for pid in process.stdout.readline().split()]
+        self.assertEqual(15, len(pids))
+
+        result = ProcessKiller().kill(os.getuid(), session=process.pid)
+        self.assertEqual(15, result.signalled)
+        self.assertEqual(0, result.remaining)
+        self.assertEqual([], [pid for pid in pids if alive(pid)])
+
+    def test_fork_storm_terminated(self) -> None:
+        """Test processes forked while the kill is in progress are also terminated"""
+
+        process = self.spawn(FORK_STORM_SCRIPT)
+        self.assertEqual('ready', process.stdout.readline().strip())
+
+        result = ProcessKiller(timeout=10).kill(os.getuid(), session=process.pid)
+        self.assertEqual(0, result.remaining)
+        self.assertEqual('signal', result.method)
+        self.assertGreater(result.signalled, 0)
+        self.assertFalse(alive(process.pid))
+
+
+class ProcessTreeOrder(TestCase):
+    """Test the ordering of processes from a snapshot"""
+
+    def test_parents_before_children(self) -> None:
+        """Test every process is listed after its parent"""
+
+        snapshot = ProcessSnapshot()
+        for pid, ppid in ((30, 20), (20, 10), (10, 1), (40, 10), (50, 1)):
+            snapshot.append((pid, ppid, pid, pid, 0, 'python', 'sleeping', 0, 0, 0))
+
+        ordered = process_tree(snapshot, {10, 20, 30, 40})
+        self.assertCountEqual([10, 20, 30, 40], ordered)
+        self.assertLess(ordered.index(10), ordered.index(20))
+        self.assertLess(ordered.index(20), ordered.index(30))
+        self.assertLess(ordered.index(10), ordered.index(40))
+
+
+class PlanSignals(TestCase):
+    """Test planning signals from a fake process table"""
+
+    def test_groups_and_individual_processes(self) -> None:
+        """Test groups shared with other users or exited processes are signalled individually"""
+
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            write_system(root)
+            write_process(root, 100, uid=987654, pgrp=100)
+            write_process(root, 101, uid=987654, pgrp=100, ppid=100)
+            write_process(root, 200, uid=987654, pgrp=200)
+            write_process(root, 201, uid=987655, pgrp=200)
+            write_process(root, 300, uid=987654, pgrp=300, state='Z')
+
+            plan = ProcessKiller(ProcReader(temp_dir)).plan(987654)
+
+        self.assertEqual([100, 300], sorted(plan.groups))
+        self.assertEqual([200], plan.individual)
+        self.assertEqual(3, plan.targets)
+
+    def test_given_snapshot_reused(self) -> None:
+        """Test the process table is not read again when a snapshot is given"""
+
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            write_system(root)
+            write_process(root, 100, uid=987654, pgrp=100)
+            reader = ProcReader(temp_dir)
+            snapshot = reader.snapshot()
+
+            with patch.object(reader, 'snapshot') as mock_snapshot:
+                plan = ProcessKiller(reader).plan(987654, snapshot=snapshot)
+
+        mock_snapshot.assert_not_called()
+        self.assertEqual([100], plan.groups)
+
+
+class ResolveUID(TestCase):
+    """Test the conversion of usernames to user IDs"""
+
+    def test_known_and_numeric_users(self) -> None:
+        """Test account names and numeric IDs are resolved"""
+
+        self.assertEqual(0, resolve_uid('root'))
+        self.assertEqual(987654, resolve_uid('987654'))
+
+    def test_error_on_unknown_user(self) -> None:
+        """Test a ``ValueError`` is raised for unknown usernames"""
+
+        with self.assertRaises(ValueError):
+            resolve_uid('not_a_real_user_name')
@@ -0,0 +1,55 @@
+"""Tests for the ``MetricsExporter`` class."""
+
+from http.client import HTTPConnection
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from node_nanny.metrics import MetricsExporter, MetricsRegistry
+
+
+class ExportMetrics(TestCase):
+    """Test metrics are exported over HTTP and to a file"""
+
+    def setUp(self) -> None:
+        self.registry = MetricsRegistry()
+        self.registry.counter('scans_total', 'Scans').inc()
+
+    def test_http_endpoint(self) -> None:
+        """Test metrics are served from the metrics path"""
+
+        exporter = MetricsExporter(port=0, registry=self.registry)
+        exporter.start()
+        try:
+            connection = HTTPConnection(exporter.host, exporter.server.server_port, timeout=5)
+            connection.request('GET', '/metrics')
+            response = connection.getresponse()
+            self.assertEqual(200, response.status)
+            self.assertIn('scans_total 1', response.read().decode().splitlines())
+
+            connection.request('GET', '/other')
+            self.assertEqual(404, connection.getresponse().status)
+            connection.close()
+
+        finally:
+            exporter.stop()
+
+    def test_file_written_on_stop(self) -> None:
+        """Test the metrics file is written when the exporter stops"""
+
+        with TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / 'node_nanny.prom'
+            exporter = MetricsExporter(path=str(path), interval=3600, registry=self.registry)
+            exporter.start()
+            exporter.stop()
+            self.assertIn('scans_total 1', path.read_text().splitlines())
+
+    def test_callbacks_registered_while_running(self) -> None:
+        """Test callback statistics are only exported while the exporter is running"""
+
+        exporter = MetricsExporter(callbacks={'outbox': lambda: {'sent': 3}}, registry=self.registry)
+        exporter.start()
+        self.assertIn('outbox_sent 3', self.registry.render().splitlines())
+
+        exporter.stop()
+        self.assertNotIn('outbox_sent 3', self.registry.render().splitlines())
@@ -0,0 +1,101 @@
+"""Tests for the ``MetricsRegistry`` class and the metrics it contains."""
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from node_nanny.metrics import MetricsRegistry
+
+
+class RenderMetrics(TestCase):
+    """Test metrics are rendered in the Prometheus text format"""
+
+    def setUp(self) -> None:
+        self.registry = MetricsRegistry()
+
+    def test_counter(self) -> None:
+        """Test counters are summed for each combination of labels"""
+
+        counter = self.registry.counter('kills_total', 'Kills', ('method',))
+        counter.inc(method='signal')
+        counter.inc(2, method='signal')
+        counter.inc(method='cgroup')
+
+        lines = self.registry.render().splitlines()
+        self.assertIn('# TYPE kills_total counter', lines)
+        self.assertIn('kills_total{method="signal"} 3', lines)
+        self.assertIn('kills_total{method="cgroup"} 1', lines)
+
+    def test_gauge(self) -> None:
+        """Test gauges report the most recent value"""
+
+        gauge = self.registry.gauge('processes', 'Processes')
+        gauge.set(10)
+        gauge.set(4)
+        self.assertIn('processes 4', self.registry.render().splitlines())
+
+    def test_histogram(self) -> None:
+        """Test histogram buckets are cumulative and include a sum and count"""
+
+        histogram = self.registry.histogram('latency_seconds', 'Latency', ('stage',), buckets=(0.1, 1))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, stage='scan')
+
+        lines = self.registry.render().splitlines()
+        self.assertIn('latency_seconds_bucket{stage="scan",le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{stage="scan",le="1"} 2', lines)
+        self.assertIn('latency_seconds_bucket{stage="scan",le="+Inf"} 3', lines)
+        self.assertIn('latency_seconds_sum{stage="scan"} 5.55', lines)
+        self.assertIn('latency_seconds_count{stage="scan"} 3', lines)
+
+    def test_timer(self) -> None:
+        """Test timers record one observation each time they are used"""
+
+        histogram = self.registry.histogram('latency_seconds', 'Latency')
+        for _ in range(3):
+            with histogram.time():
+                pass
+
+        self.assertEqual(3, histogram.count())
+
+    def test_existing_metric_reused(self) -> None:
+        """Test registering a metric twice returns the original metric"""
+
+        first = self.registry.counter('scans_total', 'Scans')
+        self.assertIs(first, self.registry.counter('scans_total', 'Scans'))
+
+    def test_callback(self) -> None:
+        """Test statistics returned by callbacks are exported as gauges"""
+
+        self.registry.register_callback('outbox', lambda: {'queue_depth': 7, 'sent': 2})
+        lines = self.registry.render().splitlines()
+        self.assertIn('outbox_queue_depth 7', lines)
+        self.assertIn('outbox_sent 2', lines)
+
+        self.registry.unregister_callback('outbox')
+        self.assertNotIn('outbox_sent 2', self.registry.render().splitlines())
+
+    def test_failed_callback_skipped(self) -> None:
+        """Test other metrics are still exported when a callback fails"""
+
+        def fail() -> dict:
+            raise RuntimeError('database unavailable')
+
+        self.registry.gauge('processes', 'Processes').set(1)
+        self.registry.register_callback('outbox', fail)
+        self.assertIn('processes 1', self.registry.render().splitlines())
+
+
+class WriteTextfile(TestCase):
+    """Test metrics are written to a file for the textfile collector"""
+
+    def test_file_replaced(self) -> None:
+        """Test the file contains the rendered metrics and no temporary files remain"""
+
+        registry = MetricsRegistry()
+        registry.counter('scans_total', 'Scans').inc()
+        with TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / 'node_nanny.prom'
+            registry.write_textfile(str(path))
+            self.assertEqual(registry.render(), path.read_text())
+            self.assertEqual(['node_nanny.prom'], [file.name for file in Path(temp_dir).iterdir()])
@@ -1,9 +1,13 @@
 """Tests for the ``DNConnection`` class"""
 
 from tempfile import NamedTemporaryFile
+from threading import Thread
 from unittest import TestCase
+from unittest.mock import patch
 
-from node_nanny.orm import DBConnection
+from sqlalchemy import create_engine, inspect, text
+
+from node_nanny.orm import DBConnection, SCHEMA_VERSION, SerializedSession
 
 
 class DBConfiguration(TestCase):
@@ -35,3 +39,106 @@ class DBConfiguration(TestCase):
         self.assertEqual(
             DBConnection.engine, DBConnection.session.kw['bind'],
             '`DBConnection.session` bound to incorrect engine')
+
+
+class SharedMemoryConnection(TestCase):
+    """Test sessions on an in memory database do not interleave between threads"""
+
+    def setUp(self) -> None:
+        DBConnection.configure('sqlite:///:memory:')
+
+    def test_sessions_serialized(self) -> None:
+        """Test a session opened in another thread waits until the current session is closed"""
+
+        events = []
+
+        def other_thread() -> None:
+            with DBConnection.session():
+                events.append('other')
+
+        with DBConnection.session() as session:
+            self.assertIsInstance(session, SerializedSession)
+            thread = Thread(target=other_thread)
+            thread.start()
+            thread.join(0.2)
+            events.append('current')
+
+        thread.join()
+        self.assertEqual(['current', 'other'], events)
+
+    def test_file_sessions_not_serialized(self) -> None:
+        """Test databases with a connection per thread use regular sessions"""
+
+        with NamedTemporaryFile(suffix='.db') as temp:
+            DBConnection.configure(f'sqlite:///{temp.name}')
+            with DBConnection.session() as session:
+                self.assertNotIsInstance(session, SerializedSession)
+
+
+class SchemaMigration(TestCase):
+    """Test existing databases are upgraded when a connection is configured"""
+
+    def test_missing_indexes_created(self) -> None:
+        """Test indexes are added to tables created without them"""
+
+        with NamedTemporaryFile(suffix='.db') as temp:
+            url = f'sqlite:///{temp.name}'
+
+            # Mimic a database created before any indexes were defined
+            engine = create_engine(url)
+            with engine.begin() as connection:
+                connection.execute(text(
+                    'CREATE TABLE notification (id INTEGER PRIMARY KEY, user_id INTEGER, time DATETIME, '
+                    'memory INTEGER, percentage INTEGER, node VARCHAR, "limit" INTEGER)'
+                ))
+
+            DBConnection.configure(url)
+            index_names = {index['name'] for index in inspect(DBConnection.engine).get_indexes('notification')}
+            self.assertIn('ix_notification_user_time', index_names)
+
+    def test_duplicate_whitelist_entries_removed(self) -> None:
+        """Test duplicate whitelist entries are removed before adding unique indexes"""
+
+        with NamedTemporaryFile(suffix='.db') as temp:
+            url = f'sqlite:///{temp.name}'
+
+            # Mimic a database where the same user was whitelisted on a node more than once
+            engine = create_engine(url)
+            with engine.begin() as connection:
+                connection.execute(text(
+                    'CREATE TABLE whitelist (id INTEGER PRIMARY KEY, user_id INTEGER, node VARCHAR, '
+                    'start_time DATETIME NOT NULL, end_time DATETIME NOT NULL, global_whitelist BOOLEAN NOT NULL)'
+                ))
+                connection.execute(text(
+                    "INSERT INTO whitelist VALUES "
+                    "(1, 1, 'node1', '2022-01-01', '2022-02-01', 0), "
+                    "(2, 1, 'node1', '2022-03-01', '2022-04-01', 0), "
+                    "(3, 1, 'node2', '2022-03-01', '2022-04-01', 0)"
+                ))
+
+            DBConnection.configure(url)
+            with DBConnection.engine.connect() as connection:
+                remaining = connection.execute(text('SELECT id FROM whitelist ORDER BY id')).scalars().all()
+
+            self.assertEqual([2, 3], remaining)
+
+
+class SchemaVersionCheck(TestCase):
+    """Test schema creation is skipped for databases already at the current version"""
+
+    def test_version_recorded(self) -> None:
+        """Test the current schema version is recorded for new databases"""
+
+        DBConnection.configure('sqlite:///:memory:')
+        self.assertEqual(SCHEMA_VERSION, DBConnection.schema_version())
+
+    def test_current_schema_not_migrated(self) -> None:
+        """Test databases at the current schema version are not migrated again"""
+
+        with NamedTemporaryFile(suffix='.db') as temp:
+            url = f'sqlite:///{temp.name}'
+            DBConnection.configure(url)
+
+            with patch.object(DBConnection, 'migrate') as mock_migrate:
+                DBConnection.configure(url)
+                mock_migrate.assert_not_called()
@@ -0,0 +1,110 @@
+"""Tests for the ``OutboxSender`` class."""
+
+from datetime import datetime, timedelta
+from socket import socket
+from unittest import TestCase
+
+from sqlalchemy import select
+
+from node_nanny.orm import DBConnection, OutboxMessage
+from node_nanny.outbox import OutboxSender
+from tests.smtp_server import LocalSMTPServer
+
+
+def queue_messages(*recipients: str) -> None:
+    """Add a message to the outbox for each of the given recipients"""
+
+    now = datetime.now()
+    with DBConnection.session() as session:
+        for recipient in recipients:
+            session.add(OutboxMessage(
+                sender='sender@domain.com',
+                recipient=recipient,
+                subject='subject',
+                body='body',
+                created=now,
+                next_attempt=now
+            ))
+
+        session.commit()
+
+
+class SuccessfulDelivery(TestCase):
+    """Test messages are delivered through a local SMTP server"""
+
+    def setUp(self) -> None:
+        """Queue messages and start a local SMTP server"""
+
+        DBConnection.configure('sqlite:///:memory:')
+        queue_messages('user1@domain.com', 'user2@domain.com')
+
+        self.server = LocalSMTPServer().__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.sender = OutboxSender(smtp_port=self.server.port)
+
+    def test_single_connection(self) -> None:
+        """Test all due messages are sent over a single SMTP connection"""
+
+        self.assertEqual(2, self.sender.send_pending())
+        self.assertEqual(1, self.server.connections)
+        self.assertCountEqual(
+            ['user1@domain.com', 'user2@domain.com'],
+            [message['To'] for message in self.server.messages])
+
+    def test_messages_marked_sent(self) -> None:
+        """Test sent messages are removed from the queue"""
+
+        self.assertEqual(2, self.sender.queue_depth())
+        self.sender.send_pending()
+        self.assertEqual(0, self.sender.queue_depth())
+        self.assertEqual(2, self.sender.metrics()['sent'])
+
+    def test_background_thread(self) -> None:
+        """Test messages are sent by the background thread"""
+
+        self.sender.start()
+        self.sender.stop(timeout=5)
+        self.assertEqual(2, len(self.server.messages))
+
+
+class FailedDelivery(TestCase):
+    """Test failed deliveries are retried with backoff"""
+
+    def setUp(self) -> None:
+        """Queue a message and point the sender at a closed port"""
+
+        DBConnection.configure('sqlite:///:memory:')
+        queue_messages('user1@domain.com')
+
+        with socket() as sock:
+            sock.bind(('localhost', 0))
+            closed_port = sock.getsockname()[1]
+
+        self.sender = OutboxSender(smtp_port=closed_port, max_attempts=2, retry_delay=timedelta(seconds=60))
+
+    def test_retry_scheduled(self) -> None:
+        """Test failed messages are rescheduled with an increasing delay"""
+
+        self.assertEqual(0, self.sender.send_pending())
+        with DBConnection.session() as session:
+            message = session.execute(select(OutboxMessage)).scalars().first()
+            self.assertEqual(1, message.attempts)
+            self.assertIsNotNone(message.error)
+            self.assertGreater(message.next_attempt, datetime.now() + timedelta(seconds=50))
+
+        # The message is not due yet, so it stays queued without being attempted again
+        self.assertTrue(self.sender.flush(timeout=1))
+        self.assertEqual(1, self.sender.queue_depth())
+
+    def test_abandoned_after_max_attempts(self) -> None:
+        """Test messages are dropped from the queue after the maximum number of attempts"""
+
+        for _ in range(2):
+            with DBConnection.session() as session:
+                session.execute(OutboxMessage.__table__.update().values(next_attempt=datetime.now()))
+                session.commit()
+
+            self.sender.send_pending()
+
+        self.assertEqual(0, self.sender.queue_depth())
+        self.assertEqual(1, self.sender.metrics()['failed'])
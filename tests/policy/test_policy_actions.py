@@ -0,0 +1,84 @@
+"""Tests for the ``PolicyActions`` class."""
+
+import subprocess
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from pandas import DataFrame
+
+from node_nanny.cgroup import CgroupReader
+from node_nanny.policy import Decision, PolicyActions, Rule
+from node_nanny.proc import ProcReader
+from tests.fake_cgroup import write_slice
+
+
+class ThrottleUserSlice(TestCase):
+    """Test throttling users through the control files of their cgroup slice"""
+
+    def setUp(self) -> None:
+        """Create a fake cgroup directory with a single user slice"""
+
+        self._temp_dir = TemporaryDirectory()
+        self.slice_dir = Path(self._temp_dir.name) / 'user.slice' / 'user-987654.slice'
+        write_slice(Path(self._temp_dir.name), 987654)
+
+        self.actions = PolicyActions(None, CgroupReader(self._temp_dir.name))
+        self.rule = Rule(
+            'throttle', 'throttle', {'MEM': (10, float('inf'))}, options={'memory_high': 0.5, 'cpu_max': 150})
+        self.usage = DataFrame({'USER': ['987654'], 'RSS': [1024 ** 3]}).set_index('USER')
+
+    def tearDown(self) -> None:
+        self._temp_dir.cleanup()
+
+    def test_limits_applied_and_released(self) -> None:
+        """Test memory and CPU limits are set relative to current usage and removed on release"""
+
+        self.actions.apply(Decision('987654', self.rule), self.usage)
+        self.assertEqual(str(1024 ** 3 // 2), (self.slice_dir / 'memory.high').read_text())
+        self.assertEqual('150000 100000', (self.slice_dir / 'cpu.max').read_text())
+
+        self.actions.apply(Decision('987654', self.rule, release=True), self.usage)
+        self.assertEqual('max', (self.slice_dir / 'memory.high').read_text())
+        self.assertEqual('max 100000', (self.slice_dir / 'cpu.max').read_text())
+
+
+class StopTopOffender(TestCase):
+    """Test suspending and resuming the largest process of a user"""
+
+    def test_stop_and_resume(self) -> None:
+        """Test the process with the largest memory usage is stopped and later resumed"""
+
+        process = subprocess.Popen(['sleep', '30'])
+        self.addCleanup(process.wait)
+        self.addCleanup(process.kill)
+
+        class FakeUsage:
+            """Usage source reporting the sleeping process as the user's largest process"""
+
+            @staticmethod
+            def top_processes(users: list, k: int = 1) -> DataFrame:
+                return DataFrame({'USER': users, 'PID': [process.pid], 'RSS': [1024]}).set_index(['USER', 'PID'])
+
+        actions = PolicyActions(FakeUsage)
+        rule = Rule('stop', 'stop', {'MEM': (15, float('inf'))})
+        reader = ProcReader()
+
+        actions.apply(Decision('root', rule), DataFrame())
+        self.assertEqual('T', self.wait_for_state(reader, process.pid, 'T'))
+
+        actions.apply(Decision('root', rule, release=True), DataFrame())
+        self.assertNotEqual('T', self.wait_for_state(reader, process.pid, 'S'))
+
+    @staticmethod
+    def wait_for_state(reader: ProcReader, pid: int, state: str) -> str:
+        """Return the state of a process, waiting briefly for it to reach the given state"""
+
+        for _ in range(100):
+            current = reader.read_owner(pid)[1]
+            if current == state:
+                break
+
+            subprocess.run(['sleep', '0.01'])
+
+        return current
@@ -0,0 +1,133 @@
+"""Tests for the ``PolicyEngine`` class and rule definitions."""
+
+import json
+from tempfile import NamedTemporaryFile
+from unittest import TestCase
+
+import numpy as np
+from pandas import DataFrame
+
+from node_nanny.policy import PolicyEngine, Rule, load_rules
+
+
+def usage(**mem: float) -> DataFrame:
+    """Return per user usage with the given memory percentages"""
+
+    return DataFrame({
+        'USER': list(mem),
+        'CPU': [10.0] * len(mem),
+        'MEM': list(mem.values()),
+        'RSS': [int(value * 1024 ** 2) for value in mem.values()],
+        'PROCS': [1] * len(mem)
+    }).set_index('USER')
+
+
+class RuleDefinitions(TestCase):
+    """Test rules are read from rule file definitions"""
+
+    def test_rules_file(self) -> None:
+        """Test bounds, grace periods and action options are parsed"""
+
+        definition = {'rules': [
+            {'name': 'slow', 'action': 'renice', 'when': {'CPU': {'min': 400}}, 'wait': 30, 'nice': 5},
+            {'name': 'cap', 'action': 'throttle', 'when': {'MEM': {'min': 10, 'max': 20}}}
+        ]}
+
+        with NamedTemporaryFile('w', suffix='.json') as temp:
+            json.dump(definition, temp)
+            temp.flush()
+            slow, cap = load_rules(temp.name)
+
+        self.assertEqual(Rule('slow', 'renice', {'CPU': (400, np.inf)}, 30, {'nice': 5}), slow)
+        self.assertEqual({'MEM': (10, 20)}, cap.bounds)
+
+    def test_error_on_invalid_rules(self) -> None:
+        """Test a ``ValueError`` is raised for unknown actions, unknown columns and missing values"""
+
+        with self.assertRaises(ValueError):
+            Rule.from_dict({'name': 'bad', 'action': 'explode', 'when': {}})
+
+        with self.assertRaises(ValueError):
+            Rule.from_dict({'name': 'bad', 'action': 'kill', 'when': {'DISK': {'min': 1}}})
+
+        with self.assertRaises(ValueError):
+            Rule.from_dict({'name': 'bad', 'action': 'kill'})
+
+
+class EvaluateRules(TestCase):
+    """Test the evaluation of compiled rules against per user usage"""
+
+    def setUp(self) -> None:
+        """Define graduated rules for throttling, stopping and killing users"""
+
+        self.engine = PolicyEngine([
+            Rule('kill', 'kill', {'MEM': (20, np.inf)}, wait=10),
+            Rule('throttle', 'throttle', {'MEM': (10, np.inf)}),
+            Rule('stop', 'stop', {'MEM': (15, np.inf)}, wait=5),
+        ])
+
+    @staticmethod
+    def actions(decisions) -> list:
+        """Return decisions as tuples of user, action and release"""
+
+        return [(decision.user, decision.rule.action, decision.release) for decision in decisions]
+
+    def test_matches(self) -> None:
+        """Test every rule is evaluated for every user, with rules ordered by severity"""
+
+        matches = self.engine.evaluate(usage(light=5, medium=12, heavy=25))
+        self.assertEqual(['throttle', 'stop', 'kill'], [rule.action for rule in self.engine.rules])
+        np.testing.assert_array_equal([[False] * 3, [True, False, False], [True] * 3], matches)
+
+    def test_graduated_actions(self) -> None:
+        """Test actions are taken once each as their grace periods expire"""
+
+        self.assertEqual([('heavy', 'throttle', False)], self.actions(self.engine.update(usage(heavy=25), now=0)))
+        self.assertEqual(5, self.engine.time_remaining(now=0))
+        self.assertEqual([], self.actions(self.engine.update(usage(heavy=25), now=1)))
+        self.assertEqual([('heavy', 'stop', False)], self.actions(self.engine.update(usage(heavy=25), now=5)))
+        self.assertEqual([('heavy', 'kill', False)], self.actions(self.engine.update(usage(heavy=25), now=10)))
+
+        # The kill is re-armed with a new grace period in case the user remains over the limit
+        self.assertEqual(10, self.engine.time_remaining(now=10))
+
+    def test_kill_supersedes_other_actions(self) -> None:
+        """Test no other action is taken when a kill is due"""
+
+        engine = PolicyEngine([
+            Rule('kill', 'kill', {'MEM': (20, np.inf)}), Rule('stop', 'stop', {'MEM': (15, np.inf)})])
+        self.assertEqual([('heavy', 'kill', False)], self.actions(engine.update(usage(heavy=25), now=0)))
+
+    def test_actions_released(self) -> None:
+        """Test actions are reverted when users drop below a rule or disappear, restarting grace periods"""
+
+        self.engine.update(usage(user1=12, user2=12), now=0)
+        decisions = self.engine.update(usage(user1=5), now=1)
+        self.assertCountEqual([('user1', 'throttle', True), ('user2', 'throttle', True)], self.actions(decisions))
+
+        self.engine.update(usage(user1=16), now=2)
+        self.assertEqual([], self.actions(self.engine.update(usage(user1=16), now=6)))
+        self.assertEqual([('user1', 'stop', False)], self.actions(self.engine.update(usage(user1=16), now=7)))
+
+    def test_spawn_rate_rule(self) -> None:
+        """Test scans add a rule renicing users that start processes too quickly"""
+
+        engine = PolicyEngine.from_scan(max_mem=90, wait=0, max_spawn_rate=50)
+        spawning = usage(light=1, busy=1).assign(SPAWNS=[0.0, 100.0])
+        self.assertEqual([('busy', 'renice', False)], self.actions(engine.update(spawning, now=0)))
+
+    def test_missing_columns_are_zero(self) -> None:
+        """Test usage without spawn rates never matches spawn rate rules"""
+
+        engine = PolicyEngine.from_scan(max_mem=20, wait=0, max_spawn_rate=10)
+        self.assertEqual([('heavy', 'kill', False)], self.actions(engine.update(usage(light=1, heavy=25), now=0)))
+
+    def test_kill_repeated_while_over_limit(self) -> None:
+        """Test users still over the limit after a kill are killed again once a new grace period expires"""
+
+        engine = PolicyEngine.from_scan(max_mem=20, wait=5)
+        kills = [
+            now for now in (0, 5, 10, 20, 30)
+            if self.actions(engine.update(usage(heavy=50), now=now)) == [('heavy', 'kill', False)]
+        ]
+        self.assertEqual([5, 10, 20, 30], kills)
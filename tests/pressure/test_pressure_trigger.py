@@ -0,0 +1,118 @@
+"""Tests for the ``PressureTrigger`` class."""
+
+import os
+import time
+from contextlib import redirect_stderr
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from threading import Timer
+from unittest import TestCase, skipUnless
+
+from node_nanny.pressure import PressureTrigger, count_memory_events, read_pressure
+
+
+def write_pressure(path: Path, some: float, full: float = 0) -> None:
+    """Write a fake memory pressure file with the given ``avg10`` values"""
+
+    path.write_text(
+        f'some avg10={some:.2f} avg60=0.00 avg300=0.00 total=0\n'
+        f'full avg10={full:.2f} avg60=0.00 avg300=0.00 total=0\n'
+    )
+
+
+class ParseFiles(TestCase):
+    """Test parsing pressure and memory event files"""
+
+    def test_read_pressure(self) -> None:
+        """Test values are keyed by line and field"""
+
+        with TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / 'memory'
+            write_pressure(path, 12.5, 3)
+            pressure = read_pressure(str(path))
+
+        self.assertEqual(12.5, pressure['some']['avg10'])
+        self.assertEqual(3, pressure['full']['avg10'])
+
+    def test_count_memory_events(self) -> None:
+        """Test only events indicating memory shortage are counted"""
+
+        content = 'low 100\nhigh 2\nmax 3\noom 1\noom_kill 1\noom_group_kill 0\n'
+        self.assertEqual(7, count_memory_events(content))
+
+
+class FakePressureFile(TestCase):
+    """Test the trigger falls back to checking a fake pressure file on an interval"""
+
+    def setUp(self) -> None:
+        self._temp_dir = TemporaryDirectory()
+        self.pressure = Path(self._temp_dir.name) / 'memory'
+        self.events = Path(self._temp_dir.name) / 'memory.events'
+        write_pressure(self.pressure, 0)
+        self.events.write_text('low 0\nhigh 0\nmax 0\noom 0\noom_kill 0\n')
+
+        self.trigger = PressureTrigger(str(self.pressure), threshold=10, events=[str(self.events)], poll_interval=0.01)
+        self.assertFalse(self.trigger.open())
+
+    def tearDown(self) -> None:
+        self.trigger.close()
+        self._temp_dir.cleanup()
+
+    def test_fake_file_not_overwritten(self) -> None:
+        """Test no trigger is written to a regular file"""
+
+        self.assertIn('some avg10=0.00', self.pressure.read_text())
+
+    def test_timeout_without_pressure(self) -> None:
+        """Test the wait ends at the timeout when there is no pressure"""
+
+        start = time.monotonic()
+        self.assertFalse(self.trigger.wait(0.05))
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+
+    def test_wake_on_pressure(self) -> None:
+        """Test the wait ends early once pressure crosses the threshold"""
+
+        Timer(0.05, write_pressure, (self.pressure, 25)).start()
+        start = time.monotonic()
+        self.assertTrue(self.trigger.wait(10))
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_wake_on_memory_events(self) -> None:
+        """Test the wait ends early when a cgroup reports new memory events"""
+
+        self.events.write_text('low 0\nhigh 4\nmax 0\noom 0\noom_kill 0\n')
+        self.assertTrue(self.trigger.wait(10))
+        self.assertFalse(self.trigger.wait(0.02))
+
+
+class MissingPressureFile(TestCase):
+    """Test the trigger falls back to a timer on nodes without pressure information"""
+
+    def test_timer_fallback(self) -> None:
+        """Test a missing pressure file or event file does not prevent waiting"""
+
+        with TemporaryDirectory() as temp_dir, redirect_stderr(StringIO()):
+            trigger = PressureTrigger(
+                f'{temp_dir}/memory', events=[f'{temp_dir}/memory.events'], poll_interval=0.01)
+
+            self.assertFalse(trigger.open())
+            self.assertFalse(trigger.wait(0.05))
+            trigger.close()
+
+
+@skipUnless(os.path.exists('/proc/pressure/memory'), 'Memory pressure information is not available')
+class KernelPressureFile(TestCase):
+    """Test waiting on the pressure file of the running kernel"""
+
+    def test_wait(self) -> None:
+        """Test the trigger either registers with the kernel or falls back to polling"""
+
+        trigger = PressureTrigger(threshold=100, poll_interval=0.01)
+        try:
+            trigger.open()
+            self.assertFalse(trigger.wait(0.05))
+
+        finally:
+            trigger.close()
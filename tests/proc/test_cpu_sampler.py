@@ -0,0 +1,52 @@
+"""Tests for the ``CPUSampler`` class."""
+
+from unittest import TestCase
+
+from node_nanny.proc import CLOCK_TICKS, CPUSampler, ProcessSnapshot
+
+
+def build_snapshot(uptime: float, *processes: tuple) -> ProcessSnapshot:
+    """Return a snapshot containing the given ``(pid, start_time, ticks)`` values"""
+
+    snapshot = ProcessSnapshot(uptime=uptime, mem_total=1024)
+    for pid, start_time, ticks in processes:
+        snapshot.append((pid, 1, pid, pid, 0, 'python', 'running', 0, ticks, start_time))
+
+    return snapshot
+
+
+class DeltaSampling(TestCase):
+    """Test CPU usage is calculated from the change between snapshots"""
+
+    def test_first_sample_uses_lifetime_average(self) -> None:
+        """Test processes without history report their lifetime average"""
+
+        sampler = CPUSampler()
+        snapshot = build_snapshot(20, (1, 10 * CLOCK_TICKS, 5 * CLOCK_TICKS))
+        self.assertAlmostEqual(50, sampler.sample(snapshot)[0])
+
+    def test_delta_between_samples(self) -> None:
+        """Test usage is calculated from tick deltas between two snapshots"""
+
+        sampler = CPUSampler()
+        sampler.sample(build_snapshot(100, (1, 0, 0)))
+        usage = sampler.sample(build_snapshot(102, (1, 0, 3 * CLOCK_TICKS)))
+        self.assertAlmostEqual(150, usage[0])
+
+    def test_reused_pid_not_confused(self) -> None:
+        """Test a reused process ID with a new start time is treated as a new process"""
+
+        sampler = CPUSampler()
+        sampler.sample(build_snapshot(100, (1, 0, 50 * CLOCK_TICKS)))
+
+        # A new process with the same ID started one second before the second snapshot
+        usage = sampler.sample(build_snapshot(110, (1, 109 * CLOCK_TICKS, CLOCK_TICKS // 2)))
+        self.assertAlmostEqual(50, usage[0])
+
+    def test_exited_processes_pruned(self) -> None:
+        """Test history is only retained for processes in the latest snapshot"""
+
+        sampler = CPUSampler()
+        sampler.sample(build_snapshot(100, (1, 0, 0), (2, 0, 0)))
+        sampler.sample(build_snapshot(101, (2, 0, 0)))
+        self.assertEqual([(2, 0)], list(sampler._previous.keys()))
@@ -0,0 +1,145 @@
+"""Tests for the ``ProcReader`` class."""
+
+import os
+import pwd
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from node_nanny.proc import PROCESSES_PER_WORKER, ProcReader
+from tests.fake_proc import write_process, write_system
+
+
+class ReadFakeProcDirectory(TestCase):
+    """Test the parsing of process data from a fake proc directory"""
+
+    def setUp(self) -> None:
+        """Populate a fake proc directory with two processes"""
+
+        self._temp_dir = TemporaryDirectory()
+        self.root = Path(self._temp_dir.name)
+        write_system(self.root, mem_total=8 * 1024 ** 3, uptime=500)
+        write_process(self.root, 10, uid=0, name='init', rss=2 * 1024 ** 2, utime=5, stime=3)
+        write_process(self.root, 20, uid=0, name='my (odd) name', state='R', ppid=10, start_time=250)
+
+        self.reader = ProcReader(str(self.root))
+
+    def tearDown(self) -> None:
+        self._temp_dir.cleanup()
+
+    def test_pids(self) -> None:
+        """Test only numeric directory names are returned as process IDs"""
+
+        self.assertCountEqual([10, 20], self.reader.pids())
+
+    def test_system_values(self) -> None:
+        """Test system memory and uptime are read from the proc directory"""
+
+        self.assertEqual(8 * 1024 ** 3, self.reader.mem_total())
+        self.assertEqual(500, self.reader.uptime())
+
+    def test_read_process(self) -> None:
+        """Test process values are parsed from the stat, statm and status files"""
+
+        pid, ppid, pgrp, session, uid, name, status, rss, ticks, start_time = self.reader.read_process(20)
+        self.assertEqual((20, 10, 20, 20, 0), (pid, ppid, pgrp, session, uid))
+        self.assertEqual('my (odd) name', name)
+        self.assertEqual('running', status)
+        self.assertEqual(1024 ** 2, rss)
+        self.assertEqual(250, start_time)
+
+    def test_snapshot_columns(self) -> None:
+        """Test snapshot columns are aligned by process"""
+
+        snapshot = self.reader.snapshot()
+        self.assertEqual(2, len(snapshot))
+
+        index = snapshot.pid.index(10)
+        self.assertEqual('init', snapshot.name[index])
+        self.assertEqual(8, snapshot.ticks[index])
+        self.assertEqual(2 * 1024 ** 2, snapshot.rss[index])
+
+    def test_user_pids(self) -> None:
+        """Test live processes are found by owner from the status file alone"""
+
+        write_process(self.root, 30, uid=1001)
+        write_process(self.root, 40, uid=1001, state='Z')
+        self.assertEqual((1001, 'Z'), self.reader.read_owner(40))
+        self.assertEqual([30], self.reader.user_pids(1001))
+
+    def test_missing_process(self) -> None:
+        """Test a ``FileNotFoundError`` is raised for missing processes"""
+
+        with self.assertRaises(FileNotFoundError):
+            self.reader.read_process(30)
+
+
+class UsernameLookup(TestCase):
+    """Test the resolution of user IDs into usernames"""
+
+    def test_known_user(self) -> None:
+        """Test user IDs resolve to the matching account name"""
+
+        uid = os.getuid()
+        self.assertEqual(pwd.getpwuid(uid).pw_name, ProcReader().username(uid))
+
+    def test_unknown_user(self) -> None:
+        """Test user IDs without an account resolve to the ID as a string"""
+
+        self.assertEqual('987654', ProcReader().username(987654))
+
+
+class ParallelRead(TestCase):
+    """Test processes read concurrently are merged into the same snapshot as a sequential read"""
+
+    def setUp(self) -> None:
+        """Populate a fake proc directory with processes of several users and names"""
+
+        self._temp_dir = TemporaryDirectory()
+        self.root = Path(self._temp_dir.name)
+        write_system(self.root)
+        for pid in range(10, 30):
+            write_process(self.root, pid, uid=1000 + pid % 3, name=('python', 'bash', 'R')[pid % 4 % 3])
+
+        self.expected = ProcReader(str(self.root)).snapshot()
+
+    def tearDown(self) -> None:
+        self._temp_dir.cleanup()
+
+    def assert_matches_sequential(self, reader: ProcReader) -> None:
+        """Assert a reader returns the same snapshot as a sequential read"""
+
+        try:
+            snapshot = reader.snapshot()
+
+        finally:
+            reader.close()
+
+        for column in snapshot.columns:
+            self.assertEqual(list(getattr(self.expected, column)), list(getattr(snapshot, column)), column)
+
+    def test_thread_pool(self) -> None:
+        """Test processes read by a pool of threads"""
+
+        self.assert_matches_sequential(ProcReader(str(self.root), workers=3, executor='thread'))
+
+    def test_process_pool(self) -> None:
+        """Test processes read by a pool of worker processes"""
+
+        self.assert_matches_sequential(ProcReader(str(self.root), workers=3, executor='process'))
+
+    def test_automatic_worker_count(self) -> None:
+        """Test one worker is used per ``PROCESSES_PER_WORKER`` processes, limited by the available CPUs"""
+
+        reader = ProcReader(str(self.root), workers=None)
+        with patch('node_nanny.proc.available_cpus', return_value=4):
+            self.assertEqual(1, reader.worker_count(PROCESSES_PER_WORKER - 1))
+            self.assertEqual(2, reader.worker_count(2 * PROCESSES_PER_WORKER))
+            self.assertEqual(4, reader.worker_count(100 * PROCESSES_PER_WORKER))
+
+    def test_error_on_unknown_executor(self) -> None:
+        """Test a ``ValueError`` is raised for unknown pool types"""
+
+        with self.assertRaises(ValueError):
+            ProcReader(str(self.root), executor='cluster')
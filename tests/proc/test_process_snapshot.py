@@ -0,0 +1,108 @@
+"""Tests for the ``ProcessSnapshot`` and ``CategoryColumn`` classes."""
+
+from array import array
+from unittest import TestCase
+
+import numpy as np
+
+from node_nanny.proc import CategoryColumn, ProcessSnapshot
+
+RECORDS = (
+    (10, 1, 10, 10, 1000, 'python', 'running', 4096, 5, 100),
+    (11, 10, 10, 10, 1000, 'python', 'sleeping', 8192, 0, 101),
+    (12, 1, 12, 12, 1001, 'bash', 'sleeping', 2048, 1, 102),
+)
+
+
+def build_snapshot() -> ProcessSnapshot:
+    """Return a snapshot containing the records in ``RECORDS``"""
+
+    snapshot = ProcessSnapshot(uptime=10, mem_total=1024 ** 2)
+    for record in RECORDS:
+        snapshot.append(record)
+
+    return snapshot
+
+
+class CategoryEncoding(TestCase):
+    """Test repeated values are stored once and decoded on access"""
+
+    def setUp(self) -> None:
+        self.column = CategoryColumn(['python', 'bash', 'python'])
+
+    def test_distinct_values_stored_once(self) -> None:
+        """Test each distinct value is stored as a single category"""
+
+        self.assertEqual(['python', 'bash'], self.column.categories)
+        self.assertEqual(array('i', [0, 1, 0]), self.column.codes)
+
+    def test_values_decoded(self) -> None:
+        """Test indexing and iteration return the original values"""
+
+        self.assertEqual('bash', self.column[1])
+        self.assertEqual(['python', 'bash', 'python'], list(self.column))
+        self.assertEqual(3, len(self.column))
+
+    def test_append_reuses_categories(self) -> None:
+        """Test appended values only add a category when they are new"""
+
+        self.column.append('bash')
+        self.column.append('R')
+        self.assertEqual(['python', 'bash', 'R'], self.column.categories)
+        self.assertEqual(['python', 'bash', 'python', 'bash', 'R'], list(self.column))
+
+    def test_extend_merges_categories(self) -> None:
+        """Test extending a column remaps codes onto the existing categories"""
+
+        self.column.extend(CategoryColumn(['R', 'bash']))
+        self.assertEqual(['python', 'bash', 'R'], self.column.categories)
+        self.assertEqual(['python', 'bash', 'python', 'R', 'bash'], list(self.column))
+
+    def test_categorical_conversion(self) -> None:
+        """Test conversion to pandas preserves values and categories"""
+
+        categorical = self.column.to_categorical()
+        self.assertEqual(['python', 'bash', 'python'], list(categorical))
+        self.assertEqual(['python', 'bash'], list(categorical.categories))
+
+
+class ColumnStorage(TestCase):
+    """Test snapshot columns are stored compactly and converted without copying"""
+
+    def test_numeric_columns_are_arrays(self) -> None:
+        """Test numeric columns use fixed width arrays"""
+
+        snapshot = build_snapshot()
+        for column in ('pid', 'ppid', 'pgrp', 'session', 'uid', 'rss', 'ticks', 'start_time'):
+            self.assertIsInstance(getattr(snapshot, column), array)
+
+    def test_no_instance_dictionary(self) -> None:
+        """Test snapshots do not allocate a per instance attribute dictionary"""
+
+        self.assertFalse(hasattr(build_snapshot(), '__dict__'))
+
+    def test_records_preserved(self) -> None:
+        """Test appended records can be read back column by column"""
+
+        snapshot = build_snapshot()
+        self.assertEqual(len(RECORDS), len(snapshot))
+        for row, record in enumerate(RECORDS):
+            self.assertEqual(record, tuple(getattr(snapshot, column)[row] for column in snapshot.columns))
+
+    def test_from_columns_matches_append(self) -> None:
+        """Test building a snapshot from columns is equivalent to appending records"""
+
+        columns = dict(zip(ProcessSnapshot.columns, zip(*RECORDS)))
+        snapshot = ProcessSnapshot.from_columns(uptime=10, mem_total=1024 ** 2, **columns)
+        expected = build_snapshot()
+        for column in ProcessSnapshot.columns:
+            self.assertEqual(list(getattr(expected, column)), list(getattr(snapshot, column)))
+
+    def test_numpy_views_share_memory(self) -> None:
+        """Test NumPy arrays are views of the snapshot columns rather than copies"""
+
+        snapshot = build_snapshot()
+        columns = snapshot.to_numpy()
+        np.testing.assert_array_equal([4096, 8192, 2048], columns['rss'])
+        self.assertFalse(columns['rss'].flags.owndata)
+        self.assertNotIn('name', columns)
@@ -0,0 +1,55 @@
+"""Tests for the ``diff_snapshots`` function and the ``SnapshotDiff`` class."""
+
+from unittest import TestCase
+
+from node_nanny.proc import ProcessSnapshot, diff_snapshots
+
+
+def build_snapshot(uptime: float, *processes: tuple) -> ProcessSnapshot:
+    """Return a snapshot containing the given ``(pid, start_time, uid, rss)`` values"""
+
+    snapshot = ProcessSnapshot(uptime=uptime, mem_total=1024)
+    for pid, start_time, uid, rss in processes:
+        snapshot.append((pid, 1, pid, pid, uid, 'python', 'running', rss, 0, start_time))
+
+    return snapshot
+
+
+class CompareSnapshots(TestCase):
+    """Test processes are classified by comparing two snapshots"""
+
+    def setUp(self) -> None:
+        self.previous = build_snapshot(100, (1, 0, 1000, 10), (2, 0, 1000, 10), (3, 0, 1001, 10))
+        self.current = build_snapshot(
+            102, (2, 0, 1000, 20), (3, 0, 1001, 10), (4, 150, 1000, 10), (5, 150, 1000, 10), (6, 150, 1001, 10))
+        self.diff = diff_snapshots(self.previous, self.current)
+
+    def test_processes_classified(self) -> None:
+        """Test started, exited and changed processes are identified by position"""
+
+        self.assertEqual([2, 3, 4], self.diff.started)
+        self.assertEqual([0], self.diff.exited)
+        self.assertEqual([0], self.diff.changed)
+        self.assertEqual([1, 2, -1, -1, -1], list(self.diff.matches))
+
+    def test_reused_pid_not_matched(self) -> None:
+        """Test a reused process ID with a new start time is treated as a new process"""
+
+        current = build_snapshot(102, (1, 150, 1000, 10))
+        diff = diff_snapshots(self.previous, current)
+        self.assertEqual([0], diff.started)
+        self.assertEqual([0, 1, 2], diff.exited)
+
+    def test_spawn_rates(self) -> None:
+        """Test started and exited processes are counted per user"""
+
+        self.assertEqual({1000: 2, 1001: 1}, self.diff.spawn_counts())
+        self.assertEqual({1000: 1}, self.diff.exit_counts())
+        self.assertEqual({1000: 1.0, 1001: 0.5}, self.diff.spawn_rates())
+
+    def test_no_rates_without_history(self) -> None:
+        """Test spawn rates are unknown when there is no previous snapshot"""
+
+        diff = diff_snapshots(ProcessSnapshot(), self.current)
+        self.assertEqual(list(range(len(self.current))), diff.started)
+        self.assertEqual({}, diff.spawn_rates())
@@ -0,0 +1,97 @@
+"""Tests for the ``UserAccumulator`` class."""
+
+import random
+from collections import defaultdict
+from unittest import TestCase
+
+from node_nanny.proc import CPUSampler, ProcessSnapshot, UserAccumulator, diff_snapshots
+
+
+def build_snapshot(*processes: tuple, uptime: float = 100) -> ProcessSnapshot:
+    """Return a snapshot containing the given ``(pid, uid, rss)`` or ``(pid, uid, rss, ticks)`` values"""
+
+    snapshot = ProcessSnapshot(uptime=uptime, mem_total=1024)
+    for pid, uid, rss, *ticks in processes:
+        snapshot.append((pid, 1, pid, pid, uid, 'python', 'running', rss, ticks[0] if ticks else 0, 0))
+
+    return snapshot
+
+
+class IncrementalTotals(TestCase):
+    """Test per user totals are updated incrementally between snapshots"""
+
+    def test_initial_totals(self) -> None:
+        """Test totals are summed over each user in the first snapshot"""
+
+        accumulator = UserAccumulator()
+        snapshot = build_snapshot((1, 100, 10), (2, 100, 20), (3, 200, 5))
+        changed = accumulator.update(snapshot, [1.0, 2.0, 3.0])
+
+        self.assertEqual(3, changed)
+        self.assertEqual({100: 30, 200: 5}, accumulator.rss)
+        self.assertEqual({100: 3.0, 200: 3.0}, accumulator.cpu)
+        self.assertEqual({100: 2, 200: 1}, accumulator.count)
+
+    def test_only_changes_counted(self) -> None:
+        """Test unchanged processes do not count towards the number of changes"""
+
+        accumulator = UserAccumulator()
+        accumulator.update(build_snapshot((1, 100, 10), (2, 100, 20)), [0, 0])
+        changed = accumulator.update(build_snapshot((1, 100, 10), (2, 100, 50)), [0, 0])
+
+        self.assertEqual(1, changed)
+        self.assertEqual({100: 60}, accumulator.rss)
+
+    def test_exited_processes_removed(self) -> None:
+        """Test exited processes are subtracted and idle users are dropped"""
+
+        accumulator = UserAccumulator()
+        accumulator.update(build_snapshot((1, 100, 10), (2, 200, 20)), [0, 0])
+        changed = accumulator.update(build_snapshot((1, 100, 10), (3, 100, 5)), [0, 0])
+
+        self.assertEqual(2, changed)
+        self.assertEqual({100: 15}, accumulator.rss)
+        self.assertNotIn(200, accumulator.count)
+
+    def test_idle_process_cpu_reset(self) -> None:
+        """Test the CPU usage of a process that stopped using CPU time drops to zero"""
+
+        sampler, accumulator = CPUSampler(), UserAccumulator()
+        for uptime, ticks in ((100, 0), (101, 100), (102, 100)):
+            snapshot = build_snapshot((1, 100, 10, ticks), (2, 100, 10, 0), uptime=uptime)
+            diff = diff_snapshots(sampler._previous, snapshot)
+            accumulator.update(snapshot, sampler.sample(snapshot, diff), diff)
+
+        self.assertEqual({100: 0.0}, accumulator.cpu)
+
+    def test_matches_full_recalculation(self) -> None:
+        """Test incremental totals equal totals summed over every process of each snapshot"""
+
+        rng = random.Random(42)
+        processes = {pid: [rng.randint(1, 5), rng.randint(1, 100), 0] for pid in range(1, 200)}
+        sampler, accumulator = CPUSampler(), UserAccumulator()
+        for uptime in range(100, 120):
+            for pid in rng.sample(sorted(processes), 20):
+                processes[pid][1] = rng.randint(1, 100)
+                processes[pid][2] += rng.choice((0, 0, 50))
+
+            for pid in rng.sample(sorted(processes), 5):
+                del processes[pid]
+
+            for pid in range(max(processes) + 1, max(processes) + 6):
+                processes[pid] = [rng.randint(1, 5), rng.randint(1, 100), 0]
+
+            snapshot = build_snapshot(*((pid, *values) for pid, values in processes.items()), uptime=uptime)
+            diff = diff_snapshots(sampler._previous, snapshot)
+            cpu = sampler.sample(snapshot, diff)
+            accumulator.update(snapshot, cpu, diff)
+
+            rss, usage = defaultdict(int), defaultdict(float)
+            for uid, process_rss, process_cpu in zip(snapshot.uid, snapshot.rss, cpu):
+                rss[uid] += process_rss
+                usage[uid] += process_cpu
+
+            self.assertEqual(dict(rss), accumulator.rss)
+            self.assertEqual(sorted(usage), sorted(accumulator.cpu))
+            for uid, total in usage.items():
+                self.assertAlmostEqual(total, accumulator.cpu[uid])
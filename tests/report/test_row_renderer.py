@@ -0,0 +1,87 @@
+"""Tests for the ``RowRenderer`` class."""
+
+import json
+from datetime import datetime
+from io import StringIO
+from unittest import TestCase
+
+from node_nanny.report import RowRenderer
+
+COLUMNS = ('User', 'Start', 'Global')
+ROWS = [
+    ('alice', datetime(2021, 3, 4, 5, 6, 7, 891011), False),
+    ('bartholomew', datetime(2021, 3, 5), True),
+    ('carol', None, False),
+]
+
+
+def render(output_format: str, rows=ROWS, page_size: int = 50) -> str:
+    """Return the text written when rendering the given rows"""
+
+    stream = StringIO()
+    RowRenderer(output_format, page_size=page_size, stream=stream).render(COLUMNS, rows)
+    return stream.getvalue()
+
+
+class TableFormat(TestCase):
+    """Test the rendering of fixed width text tables"""
+
+    def test_columns_aligned(self) -> None:
+        """Test every line of a page places each column at the same offset"""
+
+        lines = render('table').splitlines()
+        self.assertEqual(5, len(lines))
+        self.assertEqual('User         Start                Global', lines[0])
+        self.assertEqual('alice        2021-03-04 05:06:07  False', lines[2])
+        self.assertEqual('carol                             False', lines[4])
+
+    def test_pages_sized_independently(self) -> None:
+        """Test column widths are calculated separately for each page"""
+
+        pages = render('table', page_size=1).split('\n\n')
+        self.assertEqual(3, len(pages))
+        self.assertTrue(pages[0].startswith('User   Start'))
+        self.assertTrue(pages[1].startswith('User         Start'))
+
+    def test_rows_consumed_lazily(self) -> None:
+        """Test rows are not read beyond the current page before it is written"""
+
+        stream = StringIO()
+        renderer = RowRenderer('table', page_size=1, stream=stream)
+
+        def rows():
+            yield ROWS[0]
+            self.assertIn('alice', stream.getvalue())
+            yield ROWS[1]
+
+        self.assertEqual(2, renderer.render(COLUMNS, rows()))
+
+    def test_empty_result(self) -> None:
+        """Test nothing is written when there are no rows"""
+
+        self.assertEqual('', render('table', rows=[]))
+
+
+class StreamingFormats(TestCase):
+    """Test the rendering of JSON lines and CSV output"""
+
+    def test_jsonl(self) -> None:
+        """Test each row is written as a JSON object keyed by column name"""
+
+        records = [json.loads(line) for line in render('jsonl').splitlines()]
+        self.assertEqual(
+            {'User': 'alice', 'Start': '2021-03-04 05:06:07', 'Global': False}, records[0])
+        self.assertIsNone(records[2]['Start'])
+
+    def test_csv(self) -> None:
+        """Test rows are written after a single header line"""
+
+        lines = render('csv').splitlines()
+        self.assertEqual(['User,Start,Global', 'alice,2021-03-04 05:06:07,False'], lines[:2])
+        self.assertEqual(4, len(lines))
+
+    def test_error_on_unknown_format(self) -> None:
+        """Test a ``ValueError`` is raised for unsupported output formats"""
+
+        with self.assertRaises(ValueError):
+            RowRenderer('xml')
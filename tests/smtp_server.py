@@ -0,0 +1,72 @@
+"""A minimal local SMTP server used as a stand in for a real mail server."""
+
+from email import message_from_bytes
+from email.message import Message
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+from threading import Thread
+from typing import List
+
+
+class _SMTPHandler(StreamRequestHandler):
+    """Handle a single SMTP client connection"""
+
+    def _reply(self, line: str) -> None:
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self) -> None:
+        server: LocalSMTPServer = self.server
+        server.connections += 1
+        self._reply('220 localhost ESMTP test server')
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+
+            command = line.decode().strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self._reply('250 localhost')
+
+            elif command == 'DATA':
+                self._reply('354 End data with <CR><LF>.<CR><LF>')
+                data = b''
+                for data_line in iter(self.rfile.readline, b'.\r\n'):
+                    data += data_line
+
+                server.messages.append(message_from_bytes(data))
+                self._reply('250 OK')
+
+            elif command == 'QUIT':
+                self._reply('221 Bye')
+                return
+
+            else:
+                self._reply('250 OK')
+
+
+class LocalSMTPServer(ThreadingTCPServer):
+    """SMTP server running in a background thread that records received messages"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self) -> None:
+        """Bind the server to a free port on the local host"""
+
+        super().__init__(('localhost', 0), _SMTPHandler)
+        self.connections = 0
+        self.messages: List[Message] = []
+
+    @property
+    def port(self) -> int:
+        """The port the server is listening on"""
+
+        return self.server_address[1]
+
+    def __enter__(self) -> 'LocalSMTPServer':
+        Thread(target=self.serve_forever, args=(0.05,), daemon=True).start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+        self.server_close()
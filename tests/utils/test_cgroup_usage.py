@@ -0,0 +1,54 @@
+"""Tests for the fetching of system usage information by the ``CgroupUsage``
+class.
+"""
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from node_nanny.utils import CgroupUsage
+from tests.fake_cgroup import write_slice
+from tests.fake_proc import write_process, write_system
+
+
+class FakeCgroupUsage(TestCase):
+    """Test usage information is built from fake cgroup and proc directories"""
+
+    def setUp(self) -> None:
+        """Point the ``CgroupUsage`` class at fake cgroup and proc directories"""
+
+        self._temp_dir = TemporaryDirectory()
+        proc_root = Path(self._temp_dir.name) / 'proc'
+        cgroup_root = Path(self._temp_dir.name) / 'cgroup'
+
+        write_system(proc_root, mem_total=1024 ** 3)
+        write_process(proc_root, 100, uid=0, rss=256 * 1024 ** 2)
+        write_process(proc_root, 200, uid=0, rss=128 * 1024 ** 2)
+        write_process(proc_root, 300, uid=0, rss=128 * 1024 ** 2)  # Outside of any user slice
+        write_slice(cgroup_root, 0, memory=512 * 1024 ** 2, inactive_file=256 * 1024 ** 2, pids=[100, 200])
+
+        CgroupUsage.configure(str(proc_root), str(cgroup_root))
+
+    def tearDown(self) -> None:
+        CgroupUsage.configure()
+        self._temp_dir.cleanup()
+
+    def test_user_totals_from_slice(self) -> None:
+        """Test per user totals are read from the user slice"""
+
+        totals = CgroupUsage.user_totals()
+        self.assertEqual(['root'], totals.index.tolist())
+        self.assertEqual(25, totals.MEM['root'])
+        self.assertEqual(2, totals.PROCS['root'])
+
+    def test_user_usage_limited_to_slice(self) -> None:
+        """Test per process usage only includes processes inside the user slice"""
+
+        usage = CgroupUsage.user_usage('root')
+        self.assertCountEqual([100, 200], usage.index.tolist())
+
+    def test_error_on_missing_slice(self) -> None:
+        """Test a ``ValueError`` is raised for users without a slice"""
+
+        with self.assertRaises(ValueError):
+            CgroupUsage.user_usage('fake_username')
@@ -0,0 +1,58 @@
+"""Test batched user notifications via the ``UserNotifier.notify_all`` method."""
+
+from unittest import TestCase
+
+import pandas as pd
+from sqlalchemy import func, select
+
+from node_nanny.orm import DBConnection, Notification, OutboxMessage, User
+from node_nanny.utils import UserNotifier
+
+
+class BatchedNotifications(TestCase):
+    """Test notifications for multiple users are written and sent together"""
+
+    def setUp(self) -> None:
+        """Notify multiple users using a temporary database"""
+
+        DBConnection.configure('sqlite:///:memory:')
+
+        # Create a record for one of the users ahead of time
+        with DBConnection.session() as session:
+            session.add(User(name='user1'))
+            session.commit()
+
+        self.usage = pd.DataFrame({'MEM': [10.0, 15.0], 'RSS': [1024 ** 3, 1024 ** 3]})
+        self.users = ['user1', 'user2', 'user3']
+        UserNotifier.notify_all('node1', {user: self.usage for user in self.users}, limit=20)
+
+    def test_records_written(self) -> None:
+        """Test a notification record is created for every user"""
+
+        query = select(User.name, Notification.memory, Notification.percentage).join(Notification)
+        with DBConnection.session() as session:
+            records = session.execute(query).all()
+
+        self.assertCountEqual([(user, 2048, 25) for user in self.users], records)
+
+    def test_users_not_duplicated(self) -> None:
+        """Test existing user records are reused"""
+
+        with DBConnection.session() as session:
+            self.assertEqual(3, session.execute(select(func.count(User.id))).scalar())
+
+    def test_emails_queued(self) -> None:
+        """Test an email is added to the outbox for every user"""
+
+        with DBConnection.session() as session:
+            recipients = session.execute(select(OutboxMessage.recipient)).scalars().all()
+
+        self.assertCountEqual([UserNotifier(user).get_user_email() for user in self.users], recipients)
+
+    def test_repeat_emails_suppressed(self) -> None:
+        """Test users are not emailed twice within the deduplication window"""
+
+        UserNotifier.notify_all('node1', {'user1': self.usage, 'user4': self.usage}, limit=20)
+        with DBConnection.session() as session:
+            self.assertEqual(4, session.execute(select(func.count(OutboxMessage.id))).scalar())
+            self.assertEqual(5, session.execute(select(func.count(Notification.id))).scalar())
@@ -4,12 +4,15 @@ class.
 
 import os
 import pwd
+from pathlib import Path
+from tempfile import TemporaryDirectory
 from unittest import TestCase
 
 import psutil
 from pandas.api.types import is_float_dtype
 
 from node_nanny.utils import SystemUsage
+from tests.fake_proc import write_process, write_system
 
 
 class CurrentUsage(TestCase):
@@ -76,3 +79,42 @@ class UserUsage(TestCase):
             self.assertEqual(
                 test_user, psutil.Process(test_pid).username(),
                 f'PID {test_pid} does not match user {test_user}')
+
+
+class FakeProcUsage(TestCase):
+    """Test usage information is built from a configurable proc directory"""
+
+    def setUp(self) -> None:
+        """Point the ``SystemUsage`` class at a fake proc directory"""
+
+        self._temp_dir = TemporaryDirectory()
+        root = Path(self._temp_dir.name)
+        write_system(root, mem_total=1024 ** 3)
+        write_process(root, 100, uid=0, rss=256 * 1024 ** 2)
+        write_process(root, 200, uid=0, rss=128 * 1024 ** 2)
+        SystemUsage.configure(str(root))
+
+    def tearDown(self) -> None:
+        SystemUsage.configure()
+        self._temp_dir.cleanup()
+
+    def test_processes_match_directory(self) -> None:
+        """Test the returned data includes every process in the proc directory"""
+
+        usage = SystemUsage.current_usage()
+        self.assertCountEqual([('root', 100), ('root', 200)], usage.index.tolist())
+
+    def test_memory_percentage(self) -> None:
+        """Test memory usage is reported as a percentage of total system memory"""
+
+        usage = SystemUsage.user_usage('root')
+        self.assertEqual(25, usage.MEM[100])
+        self.assertEqual(12.5, usage.MEM[200])
+
+    def test_user_totals(self) -> None:
+        """Test per user totals match the sum over each user's processes"""
+
+        totals = SystemUsage.user_totals()
+        self.assertEqual(['root'], totals.index.tolist())
+        self.assertEqual(37.5, totals.MEM['root'])
+        self.assertEqual(2, totals.PROCS['root'])
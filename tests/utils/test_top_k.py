@@ -0,0 +1,73 @@
+"""Tests for the selection of the heaviest users and processes."""
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+import numpy as np
+
+from node_nanny.utils import SystemUsage, top_k
+from tests.fake_proc import write_process, write_system
+
+
+class TopKPositions(TestCase):
+    """Test the ``top_k`` function"""
+
+    def test_matches_full_sort(self) -> None:
+        """Test the selected positions match the start of a full descending sort"""
+
+        values = np.random.default_rng(42).random(1_000)
+        expected = np.argsort(-values)
+        for k in (1, 10, 999, 1_000, 5_000):
+            np.testing.assert_array_equal(expected[:k], top_k(values, k))
+
+    def test_all_values_by_default(self) -> None:
+        """Test every position is returned when no limit is given"""
+
+        np.testing.assert_array_equal([1, 2, 0], top_k(np.array([1., 3., 2.])))
+
+    def test_empty_selection(self) -> None:
+        """Test no positions are returned for empty input or a zero limit"""
+
+        self.assertEqual(0, len(top_k(np.array([]), 3)))
+        self.assertEqual(0, len(top_k(np.array([1., 2.]), 0)))
+
+
+class TopUsersAndProcesses(TestCase):
+    """Test ranking users and processes from a fake proc directory"""
+
+    def setUp(self) -> None:
+        """Create a fake process table with three users of increasing memory usage"""
+
+        self._temp_dir = TemporaryDirectory()
+        root = Path(self._temp_dir.name)
+        write_system(root, mem_total=1024 ** 3)
+        for uid, rss in ((987654, 10), (987655, 100), (987656, 300)):
+            write_process(root, uid - 987000, uid=uid, rss=rss * 1024 ** 2)
+            write_process(root, uid - 986000, uid=uid, rss=rss * 1024 ** 2 // 2)
+
+        SystemUsage.configure(str(root))
+
+    def tearDown(self) -> None:
+        SystemUsage.configure()
+        self._temp_dir.cleanup()
+
+    def test_top_users(self) -> None:
+        """Test the heaviest users above the memory threshold are returned in descending order"""
+
+        self.assertEqual(['987656', '987655'], SystemUsage.top_users(2).index.tolist())
+        self.assertEqual(['987656', '987655'], SystemUsage.top_users(min_mem=5).index.tolist())
+        self.assertEqual(['987656'], SystemUsage.top_users(5, min_mem=30).index.tolist())
+
+    def test_top_processes(self) -> None:
+        """Test the largest processes of a user are returned in descending order"""
+
+        SystemUsage.user_totals()
+        processes = SystemUsage.top_processes(['987656', '987655'], 1)
+        self.assertEqual([('987656', 656), ('987655', 655)], processes.index.tolist())
+
+        processes = SystemUsage.top_processes(['987656'], 5)
+        self.assertEqual([('987656', 656), ('987656', 1656)], processes.index.tolist())
+
+        with self.assertRaises(ValueError):
+            SystemUsage.top_processes(['fake_username'])
@@ -1,5 +1,7 @@
 """Test user notifications via the ``UserNotifier`` class."""
 
+import os
+import pwd
 from datetime import datetime
 from unittest import TestCase
 
@@ -49,3 +51,18 @@ class GetNotificationHistory(TestCase):
         returned_df = UserNotifier(username).notification_history()
         expected_df = pd.DataFrame(data=[data])
         pd.testing.assert_frame_equal(expected_df, returned_df, check_like=True)
+
+
+class GetUserEmail(TestCase):
+    """Tests for the resolution of user email addresses"""
+
+    def test_email_from_username(self) -> None:
+        """Test the email address is derived from the username"""
+
+        self.assertEqual('sam@pitt.edu', UserNotifier('sam').get_user_email())
+
+    def test_email_from_user_id(self) -> None:
+        """Test users reported by ID are resolved to their account name"""
+
+        username = pwd.getpwuid(os.getuid()).pw_name
+        self.assertEqual(f'{username}@pitt.edu', UserNotifier(str(os.getuid())).get_user_email())